@@ -0,0 +1,130 @@
+import math
+from statistics import NormalDist
+from typing import Any, Dict, Optional, Tuple
+
+# --- FILAS M/M/c (ERLANG-C) ---
+# Taxas em pacientes por minuto; tempos em minutos.
+
+def erlang_c(c: int, carga: float) -> float:
+    """Probabilidade de esperar numa fila M/M/c com carga oferecida a = λ/μ (1.0 se instável)."""
+    if c <= 0 or carga >= c: return 1.0
+    if carga <= 0: return 0.0
+    # Recorrência de Erlang-B (numericamente estável para c grande)
+    b = 1.0
+    for k in range(1, c + 1):
+        b = carga * b / (k + carga * b)
+    return c * b / (c - carga * (1.0 - b))
+
+def mmc_espera_media(lam: float, mu: float, c: int) -> float:
+    if lam <= 0: return 0.0
+    if c * mu <= lam: return math.inf
+    return erlang_c(c, lam / mu) / (c * mu - lam)
+
+def mmc_quantil_espera(lam: float, mu: float, c: int, q: float = 0.95) -> float:
+    """Quantil q do tempo de espera: P(W > t) = C(c, a) · exp(-(cμ - λ) t)."""
+    if lam <= 0: return 0.0
+    if c * mu <= lam: return math.inf
+    prob_espera = erlang_c(c, lam / mu)
+    if prob_espera <= 1.0 - q: return 0.0
+    return math.log(prob_espera / (1.0 - q)) / (c * mu - lam)
+
+def min_servidores_sla(lam: float, mu: float, sla: float, q: float = 0.95, c_max: int = 10000) -> Optional[int]:
+    """Menor c tal que o quantil q da espera numa M/M/c seja <= sla (None se exceder c_max)."""
+    if lam <= 0: return 0
+    c = max(1, int(math.floor(lam / mu)) + 1)
+    while c <= c_max:
+        if mmc_quantil_espera(lam, mu, c, q) <= sla: return c
+        c += 1
+    return None
+
+
+# --- M/G/c (APROXIMAÇÃO DE ALLEN–CUNNEEN) ---
+
+def cv2_servico(distribuicao: str) -> float:
+    """Coeficiente de variação ao quadrado do tempo de consulta (as mesmas distribuições de gera_tempo_consulta)."""
+    if distribuicao in ("exponential", "exponencial"): return 1.0
+    if distribuicao == "normal": return 0.2 ** 2
+    if distribuicao in ("uniform", "uniforme"): return 1.0 / 12.0
+    raise ValueError("Distribuição inválida")
+
+def quantil_servico(media: float, distribuicao: str, q: float) -> float:
+    if distribuicao in ("exponential", "exponencial"): return -media * math.log(1.0 - q)
+    if distribuicao == "normal":
+        z = NormalDist().inv_cdf(q)
+        return max(0.1, media * (1.0 + 0.2 * z))
+    if distribuicao in ("uniform", "uniforme"): return media * (0.5 + q)
+    raise ValueError("Distribuição inválida")
+
+def mgc_espera(lam: float, mu: float, c: int, cv2: float = 1.0, q: float = 0.95) -> Tuple[float, float, float, float]:
+    """(prob. de esperar, média, quantil q e variância da espera) numa M/G/c.
+
+    Allen–Cunneen: Wq ≈ Wq(M/M/c) · (1 + cv²)/2; a espera condicional (dado esperar) é tratada
+    como exponencial com essa média, o que dá o quantil e a variância."""
+    if lam <= 0: return 0.0, 0.0, 0.0, 0.0
+    if c * mu <= lam: return 1.0, math.inf, math.inf, math.inf
+    prob_espera = erlang_c(c, lam / mu)
+    media_cond = (1.0 + cv2) / 2.0 / (c * mu - lam)
+    media = prob_espera * media_cond
+    quantil = media_cond * math.log(prob_espera / (1.0 - q)) if prob_espera > 1.0 - q else 0.0
+    variancia = 2.0 * prob_espera * media_cond ** 2 - media ** 2
+    return prob_espera, media, quantil, variancia
+
+def estimativa_aplicavel(procura: Optional[Dict[str, float]] = None, **params) -> bool:
+    """True se o modelo é exatamente uma fila M/G/c: chegadas homogéneas e todos os médicos a servir todos os pacientes.
+
+    O motor só junta todos os pacientes numa fila partilhada por todos os médicos quando estes são todos
+    generalistas (clinica_geral). Médicos todos de outra especialidade só contam como M/G/c se toda a
+    procura (fração por especialidade, ex.: capacidade.procura_por_especialidade) for dessa especialidade."""
+    if params.get("arrival_pattern", "homogeneous") == "nonhomogeneous": return False
+    medicos = params.get("doctor_specialties") or {}
+    especialidades = {medicos.get(str(i), "clinica_geral") for i in range(int(params.get("num_doctors", 3)))}
+    if len(especialidades) != 1: return False
+    esp = especialidades.pop()
+    if esp == "clinica_geral": return True
+    return procura is not None and {e for e, p in procura.items() if p > 0} <= {esp}
+
+def estimar_estatisticas(num_pacientes: Optional[int] = None, procura: Optional[Dict[str, float]] = None,
+                         **params) -> Dict[str, Any]:
+    """Estimativa analítica (regime estacionário) com as mesmas chaves de calcular_estatisticas.
+
+    Recebe os parâmetros de SimulacaoClinica (lambda_rate, num_doctors, service_distribution,
+    mean_service_time, simulation_time, doctor_specialties) e, opcionalmente, a procura por
+    especialidade do dataset (ver estimativa_aplicavel). fila_max não tem equivalente analítico (None)."""
+    lam_h = float(params.get("lambda_rate", 10)); c = int(params.get("num_doctors", 3))
+    media_serv = float(params.get("mean_service_time", 15)); distribuicao = params.get("service_distribution", "exponential")
+    duracao = float(params.get("simulation_time", 480))
+    especialidades = params.get("doctor_specialties") or {}
+
+    if not media_serv > 0: raise ValueError("mean_service_time inválido (tem de ser > 0)")
+    lam = lam_h / 60.0; mu = 1.0 / media_serv; cv2 = cv2_servico(distribuicao)
+    _, espera, p95, var_espera = mgc_espera(lam, mu, c, cv2, 0.95)
+    rho = min(1.0, lam / (c * mu)) if c > 0 else 1.0
+
+    chegadas = lam * duracao
+    if num_pacientes is not None: chegadas = min(chegadas, num_pacientes)
+    atendidos = int(round(min(chegadas, c * mu * duracao) if rho >= 1.0 else chegadas))
+
+    stats_por_medico = {}
+    for i in range(c):
+        stats_por_medico[i] = {
+            "id": i, "especialidade": especialidades.get(str(i), "clinica_geral"),
+            "num_atendidos": round(atendidos / c, 1) if c else 0, "tempo_ocioso": (1.0 - rho) * duracao,
+            "ocupacao_percent": 100.0 * rho, "media_consulta": media_serv,
+            "p90_consulta": quantil_servico(media_serv, distribuicao, 0.9),
+        }
+
+    return {
+        "tempo_medio_espera": espera,
+        "tempo_p95_espera": p95,
+        "variancia_tempo_espera": var_espera,
+        "tempo_medio_consulta": media_serv,
+        "variancia_tempo_consulta": cv2 * media_serv ** 2,
+        "tempo_medio_na_clinica": espera + media_serv,
+        "fila_media": lam * espera,  # Lei de Little
+        "fila_max": None,
+        "ocupacao_media_medicos": 100.0 * rho,
+        "doentes_atendidos": atendidos,
+        "stats_por_medico": stats_por_medico,
+        "modelo": "M/M/c (Erlang-C)" if cv2 == 1.0 else "M/G/c (Allen–Cunneen)",
+        "aplicavel": estimativa_aplicavel(procura, **params),
+    }
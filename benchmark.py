@@ -0,0 +1,268 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: sem pico de RSS
+    resource = None
+
+from simulacao import SimulacaoClinica, carregar_pacientes_json, calcular_estatisticas, DOENCA_TO_ESP
+
+TAMANHOS = [1_000, 10_000, 100_000, 1_000_000]
+MEDICOS = [1, 10, 100, 500]
+TAMANHOS_RAPIDO = [1_000, 10_000]
+MEDICOS_RAPIDO = [1, 10, 100]
+OCUPACAO_ALVO = 0.9      # λ escolhido para ρ = λ·E[S] / c ≈ 0.9 (filas sem explodir)
+TEMPO_CONSULTA = 15.0
+MEDICOS_CURVA_PACIENTES = 10
+
+# --- DATASETS SINTÉTICOS ---
+
+_NOMES = ["Ana", "João", "Maria", "José", "Inês", "Luís", "Beatriz", "Rui", "Conceição", "Tiago"]
+_APELIDOS = ["Silva", "Santos", "Ferreira", "Pereira", "Gonçalves", "Costa", "Araújo", "Sousa"]
+_DISTRITOS = ["Lisboa", "Porto", "Braga", "Faro", "Coimbra", "Évora", "Aveiro", "Viseu"]
+_PROFISSOES = ["engenheiro", "professor", "enfermeiro", "estudante", "reformado", "advogado"]
+_RELIGIOES = [None, "católica", "testemunhas de jeová", "muçulmana", "judaica"]
+_DESPORTOS = ["futebol", "natação", "ciclismo", "corrida", "ténis"]
+
+def gerar_dataset(ficheiro: str, n: int, seed: int = 0):
+    """Escreve um array JSON com n pacientes sintéticos (mesmo esquema do pessoas.json), em streaming."""
+    rng = random.Random(seed)
+    sintomas = list(DOENCA_TO_ESP) + ["dor de cabeça", "cansaço", "check-up"]
+    with open(ficheiro, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(n):
+            p = {"nome": f"{rng.choice(_NOMES)} {rng.choice(_APELIDOS)} {i}", "idade": rng.randrange(0, 100),
+                 "sexo": rng.choice(["masculino", "feminino", "outro"]), "profissao": rng.choice(_PROFISSOES),
+                 "religiao": rng.choice(_RELIGIOES), "atributos": {"fumador": rng.random() < 0.2},
+                 "desportos": rng.sample(_DESPORTOS, rng.randrange(0, 3)),
+                 "descrição": " ".join(rng.sample(sintomas, 2)), "id": f"BM{i}",
+                 "morada": {"distrito": rng.choice(_DISTRITOS)}}
+            f.write(("," if i else "") + json.dumps(p, ensure_ascii=False) + "\n")
+        f.write("]\n")
+
+def parametros_carga(n: int, num_doctors: int) -> Dict[str, Any]:
+    """λ para a ocupação alvo com c médicos e horizonte com ~n chegadas esperadas."""
+    lam = OCUPACAO_ALVO * num_doctors * 60.0 / TEMPO_CONSULTA
+    return {"lambda_rate": lam, "num_doctors": num_doctors, "mean_service_time": TEMPO_CONSULTA,
+            "service_distribution": "exponential", "simulation_time": max(1, int(round(n * 60.0 / lam)))}
+
+# --- MEDIÇÕES (cada caso corre num processo novo: o pico de RSS é só desse caso) ---
+
+def _rss_pico_mb() -> Optional[float]:
+    if resource is None: return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1 << 20) if sys.platform == "darwin" else pico / 1024  # bytes no macOS, KiB no Linux
+
+def _carregar(ficheiro: str, seed: int, usar_cache: bool = True):
+    random.seed(seed)
+    with contextlib.redirect_stdout(open(os.devnull, "w")) as nulo:
+        try: return carregar_pacientes_json(ficheiro, colunar=True, usar_cache=usar_cache)
+        finally: nulo.close()
+
+def _preparar(ficheiro: str, n: int, seed: int):
+    # JSON + cache colunar (.cache/) gravados uma vez; os casos seguintes mapeiam a cache
+    if not os.path.exists(ficheiro): gerar_dataset(ficheiro, n, seed)
+    _carregar(ficheiro, seed)
+
+def _medir_carregar(ficheiro: str, seed: int, usar_cache: bool):
+    pacientes = _carregar(ficheiro, seed, usar_cache=usar_cache)
+    return {"pacientes": len(pacientes)}
+
+def _simulacao(ficheiro: str, seed: int, params: Dict[str, Any], stats_mode: str) -> SimulacaoClinica:
+    return SimulacaoClinica(pacientes=_carregar(ficheiro, seed), seed=seed, stats_mode=stats_mode,
+                            record_events=False, **params)
+
+def _medir_run(sim: SimulacaoClinica):
+    with contextlib.redirect_stdout(open(os.devnull, "w")) as nulo:
+        try: sim.run()
+        finally: nulo.close()
+    chegadas = int(sim._chegadas_t.size)
+    return {"eventos": chegadas + sim.doentes_atendidos, "chegadas": chegadas, "atendidos": sim.doentes_atendidos,
+            "modo_estatisticas": "exact" if sim.estatisticas_exatas else "online"}
+
+def _medir_estatisticas(sim: SimulacaoClinica):
+    calcular_estatisticas(sim)
+    return {"pacientes": sim.doentes_atendidos}
+
+def _cronometrar(medir: Callable[[], Dict[str, Any]], preparar: Callable[[], Any] = None,
+                 repeticoes: int = 1, com_tracemalloc: bool = True) -> Dict[str, Any]:
+    """Tempo de parede (melhor de `repeticoes`) e, numa passagem à parte, o pico do tracemalloc."""
+    tempos = []; contagens = {}
+    for _ in range(repeticoes):
+        args = preparar() if preparar else None
+        t0 = time.perf_counter()
+        contagens = medir(args) if preparar else medir()
+        tempos.append(time.perf_counter() - t0)
+        del args
+    resultado = {"tempo_s": min(tempos), "tempos_s": tempos, "contagens": contagens, "rss_pico_mb": _rss_pico_mb()}
+    if com_tracemalloc:
+        # O tracemalloc atrasa o Python: fica fora das medições de tempo
+        args = preparar() if preparar else None
+        tracemalloc.start()
+        try:
+            medir(args) if preparar else medir()
+            resultado["tracemalloc_pico_mb"] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+        finally:
+            tracemalloc.stop()
+    return resultado
+
+def _executar_caso(caso: Dict[str, Any], repeticoes: int, com_tracemalloc: bool) -> Dict[str, Any]:
+    # Corre no processo filho
+    tipo = caso["tipo"]; ficheiro = caso["ficheiro"]; seed = caso["seed"]
+    if tipo == "carregar":
+        return _cronometrar(lambda: _medir_carregar(ficheiro, seed, caso["usar_cache"]),
+                            repeticoes=repeticoes, com_tracemalloc=com_tracemalloc)
+    if tipo == "run":
+        return _cronometrar(_medir_run, lambda: _simulacao(ficheiro, seed, caso["params"], caso["stats_mode"]),
+                            repeticoes=repeticoes, com_tracemalloc=com_tracemalloc)
+    if tipo == "estatisticas":
+        def preparar():
+            sim = _simulacao(ficheiro, seed, caso["params"], caso["stats_mode"]); _medir_run(sim); return sim
+        return _cronometrar(_medir_estatisticas, preparar, repeticoes=repeticoes, com_tracemalloc=com_tracemalloc)
+    raise ValueError(f"tipo de caso desconhecido: {tipo}")
+
+# --- SUITE ---
+
+def casos_suite(ficheiros: Dict[int, str], tamanhos: List[int], medicos: List[int], seed: int = 0) -> List[Dict[str, Any]]:
+    """Curvas de escala: carregamento e run() em função de n; run() em função de c; estatísticas exatas em função de n."""
+    casos = []
+    for n in tamanhos:
+        for usar_cache in (False, True):
+            casos.append({"nome": "carregar_json" if not usar_cache else "carregar_cache", "tipo": "carregar",
+                          "n": n, "usar_cache": usar_cache})
+    for n in tamanhos:
+        casos.append({"nome": "run_pacientes", "tipo": "run", "n": n, "stats_mode": "auto",
+                      "params": parametros_carga(n, MEDICOS_CURVA_PACIENTES)})
+    n_medicos = max(tamanhos)
+    for c in medicos:
+        casos.append({"nome": "run_medicos", "tipo": "run", "n": n_medicos, "stats_mode": "auto",
+                      "params": parametros_carga(n_medicos, c)})
+    for n in tamanhos:
+        casos.append({"nome": "calcular_estatisticas", "tipo": "estatisticas", "n": n, "stats_mode": "exact",
+                      "params": parametros_carga(n, MEDICOS_CURVA_PACIENTES)})
+    for caso in casos: caso["ficheiro"] = ficheiros[caso["n"]]; caso["seed"] = seed
+    return casos
+
+def chave_caso(caso: Dict[str, Any]) -> str:
+    params = caso.get("params") or {}
+    return f"{caso['nome']}[n={caso['n']},c={params.get('num_doctors', '-')}]"
+
+def _metadados() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"commit": commit, "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "numpy": np.__version__, "plataforma": platform.platform(),
+            "cpus": os.cpu_count()}
+
+def correr_suite(tamanhos: List[int] = TAMANHOS, medicos: List[int] = MEDICOS, repeticoes: int = 1,
+                 com_tracemalloc: bool = True, diretorio: Optional[str] = None, seed: int = 0,
+                 filtro: Optional[str] = None) -> Dict[str, Any]:
+    """Corre a suite e devolve {"meta": ..., "casos": [...]} (o formato gravado em JSON)."""
+    temporario = diretorio is None
+    diretorio = diretorio or tempfile.mkdtemp(prefix="benchmark_clinica_")
+    os.makedirs(diretorio, exist_ok=True)
+    ctx = get_context("spawn")
+    resultados = []
+    try:
+        ficheiros = {n: os.path.join(diretorio, f"pacientes_{n}.json") for n in tamanhos}
+        casos = [c for c in casos_suite(ficheiros, tamanhos, medicos, seed) if not filtro or filtro in c["nome"]]
+        for n in sorted({c["n"] for c in casos}):
+            print(f"⏳ A preparar dataset sintético de {n} pacientes...")
+            with ProcessPoolExecutor(1, mp_context=ctx) as ex: ex.submit(_preparar, ficheiros[n], n, seed).result()
+
+        # Um processo por caso: o RSS de pico e as caches de um caso não contaminam os seguintes
+        with ProcessPoolExecutor(1, mp_context=ctx, max_tasks_per_child=1) as ex:
+            for caso in casos:
+                medida = ex.submit(_executar_caso, caso, repeticoes, com_tracemalloc).result()
+                contagens = medida["contagens"]
+                unidade = "eventos" if "eventos" in contagens else "pacientes"
+                medida[f"{unidade}_por_s"] = contagens[unidade] / medida["tempo_s"] if medida["tempo_s"] > 0 else None
+                registo = {"chave": chave_caso(caso), "nome": caso["nome"], "n": caso["n"],
+                           "params": caso.get("params"), "stats_mode": caso.get("stats_mode"), **medida}
+                resultados.append(registo)
+                print(f"✅ {registo['chave']}: {medida['tempo_s']:.3f} s, "
+                      f"{medida[f'{unidade}_por_s'] or 0:,.0f} {unidade}/s, RSS {medida['rss_pico_mb'] or 0:.0f} MB")
+    finally:
+        if temporario: shutil.rmtree(diretorio, ignore_errors=True)
+    return {"meta": _metadados(), "casos": resultados}
+
+def comparar(base: Dict[str, Any], atual: Dict[str, Any], tolerancia: float = 0.2) -> List[Dict[str, Any]]:
+    """Razão de tempos atual/base por caso; regressao=True acima de 1 + tolerancia."""
+    anteriores = {c["chave"]: c for c in base.get("casos", [])}
+    linhas = []
+    for c in atual.get("casos", []):
+        b = anteriores.get(c["chave"])
+        if b is None or not b.get("tempo_s"): continue
+        razao = c["tempo_s"] / b["tempo_s"]
+        linhas.append({"chave": c["chave"], "base_s": b["tempo_s"], "atual_s": c["tempo_s"], "razao": razao,
+                       "regressao": razao > 1 + tolerancia})
+    return linhas
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks do simulador (sem interface gráfica nem rede).")
+    parser.add_argument("--rapido", action="store_true", help=f"Só {TAMANHOS_RAPIDO} pacientes e {MEDICOS_RAPIDO} médicos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", help="Números de pacientes (curvas em n).")
+    parser.add_argument("--medicos", type=int, nargs="+", help="Números de médicos (curva em c, com o maior n).")
+    parser.add_argument("--repeticoes", type=int, default=1, help="Repetições por caso (conta o melhor tempo).")
+    parser.add_argument("--sem-tracemalloc", action="store_true", help="Não mede o pico do tracemalloc (passagem extra).")
+    parser.add_argument("--filtro", type=str, help="Só os casos cujo nome contém este texto (ex.: run).")
+    parser.add_argument("--diretorio", type=str, help="Onde guardar os datasets sintéticos (reutilizados entre execuções).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=os.path.join("benchmarks", "benchmark.json"),
+                        help='Ficheiro JSON de resultados ("-" para o stdout).')
+    parser.add_argument("--comparar", type=str, help="JSON de uma execução anterior (ex.: de outro commit).")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Abrandamento aceite na comparação (0.2 = 20%%).")
+    args = parser.parse_args(argv)
+
+    tamanhos = args.tamanhos or (TAMANHOS_RAPIDO if args.rapido else TAMANHOS)
+    medicos = args.medicos or (MEDICOS_RAPIDO if args.rapido else MEDICOS)
+    base = None
+    if args.comparar:
+        # Lida antes de correr: --output pode ser o mesmo ficheiro
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+    saida_stdout = args.output == "-"
+    with contextlib.redirect_stdout(sys.stderr) if saida_stdout else contextlib.nullcontext():
+        resultado = correr_suite(tamanhos, medicos, repeticoes=args.repeticoes, com_tracemalloc=not args.sem_tracemalloc,
+                                 diretorio=args.diretorio, seed=args.seed, filtro=args.filtro)
+    if saida_stdout:
+        json.dump(resultado, sys.stdout, ensure_ascii=False, indent=2); sys.stdout.write("\n")
+    else:
+        pasta = os.path.dirname(args.output)
+        if pasta: os.makedirs(pasta, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2); f.write("\n")
+        print(f"✅ Resultados gravados em {args.output}")
+
+    if base is None: return 0
+    regressoes = 0
+    for linha in comparar(base, resultado, args.tolerancia):
+        marca = "❌" if linha["regressao"] else "✅"
+        regressoes += linha["regressao"]
+        print(f"{marca} {linha['chave']}: {linha['base_s']:.3f} s -> {linha['atual_s']:.3f} s (x{linha['razao']:.2f})", file=sys.stderr)
+    print(f"{'⚠️' if regressoes else '✅'} {regressoes} regressão(ões) acima de {args.tolerancia:.0%} "
+          f"(base: commit {base.get('meta', {}).get('commit')})", file=sys.stderr)
+    return 1 if regressoes else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import os
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+import numpy as np
+
+from simulacao import ArmazemPacientes, ESPECIALIDADES, FALLBACK_ESP
+from analitico import min_servidores_sla
+from replicacoes import PoolSimulacoes, parametros_simulacao, agregar_replicacoes, _iniciar_worker, _correr_replicacao
+
+Alocacao = Tuple[Tuple[str, int], ...]
+
+def procura_por_especialidade(pacientes) -> Dict[str, float]:
+    """Fração dos pacientes do dataset que pede cada especialidade (pela triagem)."""
+    if isinstance(pacientes, ArmazemPacientes):
+        codigos = np.asarray(pacientes.triagens[:, 1])
+    else:
+        codigos = np.array([p.triagem()[1] for p in pacientes], dtype=np.int64)
+    if codigos.size == 0: return {}
+    contagens = np.bincount(codigos)
+    return {ESPECIALIDADES.valor(k): float(n) / codigos.size for k, n in enumerate(contagens) if n > 0}
+
+def taxa_pico(config: Dict[str, Any]) -> float:
+    """Taxa de chegada (por hora) usada no dimensionamento: λ, ou o pico do perfil não homogéneo."""
+    if config.get("arrival_pattern") == "nonhomogeneous":
+        perfil = config.get("arrival_profile") or [(0, 120, 5.0), (120, 300, 15.0), (300, 420, 25.0), (420, 0, 10.0)]
+        return max(float(lam) for _, _, lam in perfil)
+    return float(config.get("lambda_rate", 10))
+
+def especialidades_medicos(alocacao: Dict[str, int]) -> Dict[str, str]:
+    """doctor_specialties para uma alocação: especialistas primeiro (preferidos à chegada), generalistas no fim."""
+    ordem = sorted(e for e in alocacao if e != FALLBACK_ESP) + [FALLBACK_ESP]
+    medicos = [esp for esp in ordem for _ in range(alocacao.get(esp, 0))]
+    return {str(i): esp for i, esp in enumerate(medicos)}
+
+def semente_erlang(config: Dict[str, Any], procura: Dict[str, float], sla: float, quantil: float = 0.95) -> Dict[str, int]:
+    """Médicos por especialidade se cada especialidade fosse uma M/M/c independente a cumprir o SLA."""
+    lam = taxa_pico(config) / 60.0; mu = 1.0 / float(config.get("mean_service_time", 15))
+    alocacao = {esp: (min_servidores_sla(lam * p, mu, sla, quantil) or 0) for esp, p in procura.items()}
+    alocacao.setdefault(FALLBACK_ESP, 0)
+    if sum(alocacao.values()) == 0: alocacao[FALLBACK_ESP] = 1
+    return alocacao
+
+class OtimizadorCapacidade:
+    """Procura a alocação de médicos mais barata que cumpre um SLA de espera (p95 <= sla).
+
+    1. Semente: Erlang-C por especialidade (sem partilha entre filas, logo folgada).
+    2. Confirmação por replicações em paralelo; descida gulosa (retira um médico de cada
+       vez) a partir de uma alocação viável, ou subida gulosa até a encontrar. As alocações
+       já avaliadas ficam em cache.
+
+    A poda do espaço de procura vem da semente e da vizinhança: com k especialidades e até m
+    médicos em cada uma há (m+1)^k alocações, mas cada passo só simula as k vizinhas da atual
+    (±1 médico numa especialidade), a partir de uma semente analítica já perto do ótimo, e
+    a procura pára no primeiro passo sem melhoria. Tipicamente são simuladas poucas dezenas
+    de alocações em vez da grelha inteira.
+
+    3. Poda heurística opcional (podar_erlang=True): não simula alocações com menos médicos
+       do que a M/M/c conjunta (todas as filas partilhadas) precisa para o SLA no pico. É um
+       limite de regime estacionário, não um limite inferior garantido: num horizonte finito
+       que começa vazio, com chegadas não homogéneas ou com o nº de chegadas limitado pelo
+       dataset, alocações menores podem cumprir o SLA. Por isso vem desligada e a semente
+       nunca é podada."""
+
+    def __init__(self, config: Dict[str, Any], pacientes, sla: float = 20.0, quantil: float = 0.95,
+                 replicacoes: int = 5, seed_base: int = 0, processos: Optional[int] = None,
+                 custos: Optional[Dict[str, float]] = None, conservador: bool = False, podar_erlang: bool = False,
+                 max_iteracoes: int = 100, ao_progresso: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.config = config; self.pacientes = pacientes
+        self.sla = float(sla); self.quantil = quantil
+        self.replicacoes = replicacoes; self.seed_base = seed_base
+        self.processos = processos or os.cpu_count() or 1
+        self.custos = custos or {}
+        self.conservador = conservador
+        self.max_iteracoes = max_iteracoes
+        self.ao_progresso = ao_progresso
+
+        self.procura = procura_por_especialidade(pacientes)
+        self.params_base = parametros_simulacao(config)
+        lam = taxa_pico(config) / 60.0; mu = 1.0 / float(config.get("mean_service_time", 15))
+        self.podar_erlang = podar_erlang
+        self.minimo_total = min_servidores_sla(lam, mu, self.sla, quantil) or 0
+        self.avaliacoes: Dict[Alocacao, Dict[str, Any]] = {}
+        self._pool: Optional[PoolSimulacoes] = None
+
+    def custo(self, alocacao: Dict[str, int]) -> float:
+        return sum(n * self.custos.get(esp, 1.0) for esp, n in alocacao.items())
+
+    def _chave(self, alocacao: Dict[str, int]) -> Alocacao:
+        return tuple(sorted((e, n) for e, n in alocacao.items() if n > 0))
+
+    def podada(self, alocacao: Dict[str, int]) -> bool:
+        # Heurística (ver a docstring da classe): só com podar_erlang
+        return self.podar_erlang and sum(alocacao.values()) < max(1, self.minimo_total)
+
+    def _params(self, alocacao: Dict[str, int]) -> Dict[str, Any]:
+        especialidades = especialidades_medicos(alocacao)
+        params = dict(self.params_base)
+        params["num_doctors"] = len(especialidades); params["doctor_specialties"] = especialidades
+        return params
+
+    def avaliar(self, alocacoes: List[Dict[str, int]], podar: bool = True) -> List[Dict[str, Any]]:
+        """Avalia várias alocações de uma vez (todas as replicações submetidas ao pool em conjunto).
+
+        As alocações podadas (ver podada) ficam com None, exceto com podar=False."""
+        novas = {}
+        for a in alocacoes:
+            chave = self._chave(a)
+            if chave not in self.avaliacoes and chave not in novas and not (podar and self.podada(a)): novas[chave] = a
+        seeds = [self.seed_base + i for i in range(self.replicacoes)]
+        tarefas = [(chave, self._params(a), s) for chave, a in novas.items() for s in seeds]
+        if self._pool is not None:
+            saidas = [f.result() for f in [self._pool.submeter(p, s) for _, p, s in tarefas]]
+        else:
+            saidas = [_correr_replicacao(p, s) for _, p, s in tarefas]
+
+        for chave, a in novas.items():
+            resultados = [r for (c, _, _), r in zip(tarefas, saidas) if c == chave]
+            p95 = agregar_replicacoes(resultados)["tempo_p95_espera"]
+            valor = p95["ic95"][1] if self.conservador and len(resultados) > 1 else p95["media"]
+            avaliacao = {"alocacao": dict(a), "custo": self.custo(a), "p95_espera": p95["media"],
+                         "ic95": p95["ic95"], "viavel": valor <= self.sla}
+            self.avaliacoes[chave] = avaliacao
+            if self.ao_progresso: self.ao_progresso("avaliacao", avaliacao)
+        return [self.avaliacoes.get(self._chave(a)) for a in alocacoes]
+
+    def _vizinhos(self, alocacao: Dict[str, int], delta: int) -> List[Dict[str, int]]:
+        vizinhos = []
+        for esp in sorted(alocacao):
+            if alocacao[esp] + delta < 0: continue
+            v = dict(alocacao); v[esp] += delta
+            if sum(v.values()) > 0: vizinhos.append(v)
+        return vizinhos
+
+    def otimizar(self) -> Dict[str, Any]:
+        atual = semente_erlang(self.config, self.procura, self.sla, self.quantil)
+        semente = dict(atual)
+        usar_pool = self.processos > 1
+        if usar_pool: self._pool = PoolSimulacoes(self.pacientes, processos=self.processos)
+        else: _iniciar_worker(None, self.pacientes)
+        try:
+            aval = self.avaliar([atual], podar=False)[0]
+            iteracoes = 0
+            # Subida: acrescenta o médico que mais reduz o p95 até a alocação ser viável
+            while (aval is None or not aval["viavel"]) and iteracoes < self.max_iteracoes:
+                iteracoes += 1
+                candidatos = [a for a in self.avaliar(self._vizinhos(atual, +1)) if a is not None]
+                if not candidatos: break
+                melhor = min(candidatos, key=lambda a: (a["p95_espera"], a["custo"]))
+                atual, aval = dict(melhor["alocacao"]), melhor
+            # Descida: retira o médico cuja saída mais poupa e mantém o SLA
+            while aval is not None and aval["viavel"] and iteracoes < self.max_iteracoes:
+                iteracoes += 1
+                viaveis = [a for a in self.avaliar(self._vizinhos(atual, -1)) if a is not None and a["viavel"]]
+                if not viaveis: break
+                melhor = min(viaveis, key=lambda a: (a["custo"], a["p95_espera"]))
+                atual, aval = dict(melhor["alocacao"]), melhor
+        finally:
+            if self._pool is not None: self._pool.fechar(); self._pool = None
+
+        alocacao = {e: n for e, n in atual.items() if n > 0}
+        return {
+            "sla_p95_espera": self.sla, "viavel": bool(aval and aval["viavel"]),
+            "alocacao": alocacao, "num_doctors": sum(alocacao.values()), "custo": self.custo(alocacao),
+            "doctor_specialties": especialidades_medicos(alocacao),
+            "p95_espera": aval["p95_espera"] if aval else None, "ic95": aval["ic95"] if aval else None,
+            "semente_erlang": semente, "minimo_erlang_conjunto": self.minimo_total,
+            "procura": self.procura, "iteracoes": iteracoes,
+            "avaliacoes": sorted(self.avaliacoes.values(), key=lambda a: (a["custo"], a["p95_espera"])),
+        }
+
+def otimizar_capacidade(config: Dict[str, Any], pacientes, sla: float = 20.0, **kwargs) -> Dict[str, Any]:
+    """Atalho para OtimizadorCapacidade(config, pacientes, sla, ...).otimizar()."""
+    return OtimizadorCapacidade(config, pacientes, sla=sla, **kwargs).otimizar()
@@ -0,0 +1,130 @@
+import multiprocessing
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+import replicacoes
+from replicacoes import PoolSimulacoes
+from simulacao import SimulacaoClinica, FluxoSnapshots, IndiceConsultas, TabelaCodigos, calcular_estatisticas
+
+SEPARADOR_NOMES = "\x1f"
+
+
+# --- RESULTADO COMPACTO (worker -> interface) ---
+
+def empacotar_resultado(sim: SimulacaoClinica, stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Resultados de uma simulação em arrays (buffers binários no pickle) em vez de listas de objetos Python.
+
+    Os distritos seguem como códigos de uma TabelaCodigos e os nomes do índice de consultas numa só string."""
+    distritos = TabelaCodigos()
+    cod_distritos = np.fromiter((distritos.codigo(d) for d in sim.distritos_pacientes), dtype=np.int32,
+                                count=len(sim.distritos_pacientes))
+    indice = sim.indice_consultas or IndiceConsultas(sim.num_doctors)
+    return {
+        "num_doctors": sim.num_doctors, "simulation_time": sim.simulation_time, "num_pacientes": len(sim.pacientes),
+        "doctor_specialties": dict(sim.doctor_specialties),
+        "doentes_atendidos": sim.doentes_atendidos, "stats": stats, "stats_geral": sim.stats_geral,
+        "fila_sizes": np.asarray(sim.fila_sizes, dtype=np.int32),
+        "ocupacao_medicos": np.asarray(sim.ocupacao_medicos, dtype=np.float64),
+        "tempos_espera": np.asarray(sim.tempos_espera, dtype=np.float64),
+        "tempos_consulta": np.asarray(sim.tempos_consulta, dtype=np.float64),
+        "tempos_clinica": np.asarray(sim.tempos_clinica, dtype=np.float64),
+        "distritos": (distritos.valores, cod_distritos),
+        "consultas": [(indice.inicios[m], indice.fins[m], SEPARADOR_NOMES.join(indice.nomes[m])) for m in range(len(indice))],
+    }
+
+class ResultadoSimulacao:
+    """Simulação corrida noutro processo, com os atributos que a interface lê de SimulacaoClinica."""
+
+    def __init__(self, pacote: Dict[str, Any]):
+        self.num_doctors = pacote["num_doctors"]; self.simulation_time = pacote["simulation_time"]
+        self.doctor_specialties = pacote["doctor_specialties"]
+        # Só o tamanho do dataset (a interface apenas testa se houve pacientes)
+        self.pacientes = pacote["num_pacientes"]
+        self.doentes_atendidos = pacote["doentes_atendidos"]
+        self.stats = pacote["stats"]; self.stats_geral = pacote["stats_geral"]
+        self.stats_por_medico = self.stats.get("stats_por_medico", {})
+        self.fila_sizes = pacote["fila_sizes"].tolist(); self.ocupacao_medicos = pacote["ocupacao_medicos"].tolist()
+        self.tempos_espera = pacote["tempos_espera"].tolist(); self.tempos_consulta = pacote["tempos_consulta"].tolist()
+        self.tempos_clinica = pacote["tempos_clinica"].tolist()
+        valores, codigos = pacote["distritos"]
+        self.distritos_pacientes = [valores[c] for c in codigos.tolist()]
+
+        self.indice_consultas = IndiceConsultas(self.num_doctors)
+        for m, (inicios, fins, nomes) in enumerate(pacote["consultas"]):
+            self.indice_consultas.inicios[m] = inicios; self.indice_consultas.fins[m] = fins
+            self.indice_consultas.nomes[m] = nomes.split(SEPARADOR_NOMES) if nomes else []
+        self.eventos: List[Dict[str, Any]] = []
+        self.cancelado = False
+
+def _correr_simulacao(params: Dict[str, Any], seed: Optional[int], fila, cancelamento,
+                      intervalo: float, lote: int) -> Optional[Dict[str, Any]]:
+    # Corre no worker, com o dataset já carregado por _iniciar_worker (replicacoes._PACIENTES)
+    fluxo = FluxoSnapshots(intervalo=intervalo, lote=lote, fila=fila, cancelamento=cancelamento)
+    sim = SimulacaoClinica(pacientes=replicacoes._PACIENTES, seed=seed, stats_mode="exact", stream=fluxo, **params)
+    sim.run()
+    if sim.cancelado: return None
+    stats = calcular_estatisticas(sim) if sim.pacientes else {}
+    return empacotar_resultado(sim, stats)
+
+
+# --- BACKEND DE PROCESSOS PARA A INTERFACE ---
+
+class ExecucaoRemota:
+    """Uma simulação submetida ao ExecutorSimulacoes: snapshots em tempo real, cancelamento e resultado."""
+
+    def __init__(self, futuro, fluxo: FluxoSnapshots, params: Dict[str, Any]):
+        self.futuro = futuro; self.fluxo = fluxo; self.params = params
+        self.num_doctors = int(params.get("num_doctors", 3)); self.simulation_time = int(params.get("simulation_time", 480))
+        self._cancelada = False
+
+    def cancelar(self):
+        self._cancelada = True
+        self.fluxo.cancelar(); self.futuro.cancel()
+
+    @property
+    def cancelada(self) -> bool:
+        return self._cancelada or self.futuro.cancelled()
+
+    def terminada(self) -> bool:
+        return self.futuro.done()
+
+    def resultado(self, timeout: Optional[float] = None) -> Optional[ResultadoSimulacao]:
+        """ResultadoSimulacao (None se foi cancelada); propaga as exceções do worker."""
+        if self.futuro.cancelled(): return None
+        pacote = self.futuro.result(timeout)
+        return ResultadoSimulacao(pacote) if pacote is not None else None
+
+class ExecutorSimulacoes:
+    """Workers persistentes com o dataset carregado uma vez (PoolSimulacoes), para a interface.
+
+    Cada simulação corre num processo (o loop Tk não disputa o GIL), publica snapshots por uma
+    Queue do Manager e pode ser cancelada; com processos >= 2 correm várias lado a lado."""
+
+    def __init__(self, pacientes, processos: int = 2, contexto: Optional[str] = "spawn"):
+        self._pool = PoolSimulacoes(pacientes, processos=processos, contexto=contexto)
+        mp_ctx = multiprocessing.get_context(contexto) if contexto else multiprocessing
+        self._manager = mp_ctx.Manager()
+        self._execucoes: List[ExecucaoRemota] = []
+
+    def iniciar(self, params: Dict[str, Any], seed: Optional[int] = None, capacidade: int = 64,
+                intervalo: float = 1.0, lote: int = 50) -> ExecucaoRemota:
+        fila = self._manager.Queue(maxsize=capacidade); cancelamento = self._manager.Event()
+        futuro = self._pool.executor.submit(_correr_simulacao, params, seed, fila, cancelamento, intervalo, lote)
+        execucao = ExecucaoRemota(futuro, FluxoSnapshots(capacidade, intervalo, lote, fila=fila, cancelamento=cancelamento), params)
+        self._execucoes = [e for e in self._execucoes if not e.terminada()] + [execucao]
+        return execucao
+
+    def fechar(self):
+        # Cancela o que ainda corre (os workers param no lote seguinte) antes de desligar o pool
+        for execucao in self._execucoes:
+            if not execucao.terminada(): execucao.cancelar()
+        self._execucoes = []
+        self._pool.fechar(cancelar=True)
+        self._manager.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
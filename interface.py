@@ -1,13 +1,18 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, font as tkfont
 import numpy as np
-import threading
+import time
 import traceback
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
 from collections import Counter
-from simulacao import SimulacaoClinica, carregar_pacientes_json, calcular_estatisticas, Paciente
+from simulacao import carregar_pacientes_json, Paciente
+from replicacoes import Varrimento
+from analitico import estimar_estatisticas
+from capacidade import procura_por_especialidade
+from execucao import ExecutorSimulacoes
+from pesquisa import IndicePacientes, intervalo_idades
 
 
 # --- 1. FUNÇÕES DE PLOTAGEM (Melhoradas e Essenciais) ---
@@ -74,12 +79,64 @@ def grafico_fila_frame(frame, filas):
     ax.set_title("Evolução do Tamanho da Fila de Espera"); ax.set_xlabel("Minutos"); ax.set_ylabel("Tamanho da Fila"); ax.set_ylim(bottom=0); fig.tight_layout()
     return embed_plot_on_frame(frame, fig)
 
-def grafico_fila_vs_taxa_frame(frame, taxas, medias_fila):
+def grafico_varrimento_frame(frame, tabela, eixo_x="lambda_rate", metrica="fila_media"):
     # Gráfico ESSENCIAL: Gráfico mostrando a relação do tamanho médio da fila de espera com a taxa de chegada de doentes
+    # (uma linha por combinação dos restantes parâmetros do varrimento)
     fig, ax = plt.subplots(figsize=(6,4))
-    ax.plot(taxas, medias_fila, marker='o', color='blue'); ax.set_title("Comparação: Fila Média vs. Taxa de Chegada (λ)"); ax.set_xlabel("Taxa de Chegada (pacientes/h)"); ax.set_ylabel("Tamanho Médio da Fila"); ax.grid(True, linestyle='--', alpha=0.7); fig.tight_layout()
+    outros = [k for k in ("num_doctors", "mean_service_time", "service_distribution")
+              if len({linha[k] for linha in tabela if k in linha}) > 1]
+    grupos = {}
+    for linha in tabela:
+        grupos.setdefault(tuple(linha.get(k) for k in outros), []).append((linha[eixo_x], linha[metrica]))
+    for chave, pontos in grupos.items():
+        pontos.sort()
+        rotulo = ", ".join(f"{k}={v}" for k, v in zip(outros, chave)) or None
+        ax.plot([x for x, _ in pontos], [y for _, y in pontos], marker='o', label=rotulo)
+    if outros: ax.legend(fontsize=8)
+    ax.set_title("Comparação: Fila Média vs. Taxa de Chegada (λ)"); ax.set_xlabel("Taxa de Chegada (pacientes/h)"); ax.set_ylabel("Tamanho Médio da Fila"); ax.grid(True, linestyle='--', alpha=0.7); fig.tight_layout()
     return embed_plot_on_frame(frame, fig)
 
+def ler_valores(texto, tipo=float):
+    """'10, 20, 30' ou '10:30:5' (início:fim:passo, inclusivo) -> lista de valores do tipo dado."""
+    valores = []
+    for parte in texto.replace(";", ",").split(","):
+        parte = parte.strip()
+        if not parte: continue
+        if ":" in parte and tipo is not str:
+            limites = [float(x) for x in parte.split(":")]
+            ini, fim = limites[0], limites[1]; passo = limites[2] if len(limites) > 2 else 1.0
+            valores.extend(tipo(v) for v in np.arange(ini, fim + passo / 2, passo))
+        else:
+            valores.append(tipo(parte))
+    return valores
+
+def texto_estatisticas(stats, titulo="📊 ESTATÍSTICAS GERAIS"):
+    """Texto do painel de estatísticas (serve tanto para a simulação como para a estimativa analítica)."""
+    fila_max = stats['fila_max'] if stats['fila_max'] is not None else "—"
+    texto = f"{titulo}\n"
+    texto += "--------------------------------------\n"
+    texto += f"Pacientes Atendidos: {stats['doentes_atendidos']}\n"
+    texto += f"Ocupação Média Médicos: {stats['ocupacao_media_medicos']:.2f}%\n\n"
+
+    texto += "⏱️ TEMPOS (Minutos)\n"
+    texto += f"T. Médio Espera: {stats['tempo_medio_espera']:.2f} | Var: {stats['variancia_tempo_espera']:.2f}\n"
+    texto += f"T. Espera P95: {stats['tempo_p95_espera']:.2f}\n"
+    texto += f"T. Médio Consulta: {stats['tempo_medio_consulta']:.2f} | Var: {stats['variancia_tempo_consulta']:.2f}\n"
+    texto += f"T. Médio Total Clínica: {stats['tempo_medio_na_clinica']:.2f}\n\n"
+
+    texto += "🔢 FILA (Pacientes)\n"
+    texto += f"Fila Média: {stats['fila_media']:.2f} | Fila Máxima: {fila_max}\n\n"
+
+    med_stats_str = "🧑‍⚕️ MÉTRICAS POR MÉDICO\n"
+    med_stats_str += "--------------------------------------\n"
+    for mid, m_stats in stats.get("stats_por_medico", {}).items():
+        med_stats_str += f"Médico {mid+1} ({m_stats['especialidade'].title()}):\n"
+        med_stats_str += f"  - Atendidos: {m_stats['num_atendidos']:<5} | Ocupação: {m_stats['ocupacao_percent']:.1f}%\n"
+        med_stats_str += f"  - T. Consulta Médio: {m_stats['media_consulta']:.2f} min\n"
+
+    texto += med_stats_str
+    return texto
+
 def grafico_ocupacao_medicos_bar(frame, med_stats):
     # Gráfico de Ocupação Média por Médico (Métrica por Médico)
     OCUPADO_COR = "#00A86B" 
@@ -92,8 +149,164 @@ def grafico_ocupacao_medicos_bar(frame, med_stats):
     return embed_plot_on_frame(frame, fig)
 
 
+# --- ANIMAÇÃO (CANVAS) ---
+
+class VistaAnimacao:
+    """Itens do canvas da animação criados uma só vez; cada frame altera apenas o que mudou
+    (cor, texto, visibilidade), em vez de apagar e recriar tudo."""
+
+    FILA_COR = "#e63946"; OCUPADO_COR = "#00A86B"; LIVRE_COR = "#adb5bd"
+    MAX_FILA_DESENHADA = 80  # 8 filas de 10; acima disto a fila é mostrada como uma barra agregada
+    LARGURA_BARRA = 270
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.num_medicos = None
+
+    def limpar(self):
+        self.canvas.delete("all"); self.num_medicos = None
+
+    def preparar(self, num_medicos, escala_fila):
+        c = self.canvas; c.delete("all")
+        start_x = 30; start_y = 40
+        self.txt_fila = c.create_text(start_x, start_y-20, anchor="w", text="", font=("Arial", 12, "bold"))
+        self.rects_fila = []
+        for i in range(self.MAX_FILA_DESENHADA):
+            x = start_x + (i % 10) * 28; y = start_y + (i//10) * 40
+            self.rects_fila.append(c.create_rectangle(x, y, x+20, y+30, fill=self.FILA_COR, outline="black", state="hidden"))
+        self.barra_fundo = c.create_rectangle(start_x, start_y, start_x+self.LARGURA_BARRA, start_y+30, outline="black", state="hidden")
+        self.barra_fila = c.create_rectangle(start_x, start_y, start_x, start_y+30, fill=self.FILA_COR, outline="", state="hidden")
+        self._origem_barra = (start_x, start_y)
+
+        box_w = 220; box_h = 40; left_med_x = 450; top_med_y = 60
+        self.caixas = []; self.rotulos = []; self.nomes = []
+        for i in range(num_medicos):
+            y = top_med_y + i*(box_h+20)
+            self.caixas.append(c.create_rectangle(left_med_x, y, left_med_x+box_w, y+box_h, fill=self.LIVRE_COR, outline="black"))
+            self.rotulos.append(c.create_text(left_med_x+box_w+10, y+box_h/2, anchor="w", text="", font=("Arial", 11)))
+            self.nomes.append(c.create_text(left_med_x+6, y+box_h/2, anchor="w", text="", font=("Arial", 10, "bold"), fill="white"))
+        self.txt_rodape = c.create_text(30, 380, anchor="w", text="", font=("Arial", 10))
+
+        self.num_medicos = num_medicos; self.escala_fila = max(1, escala_fila)
+        self._fila_visivel = 0; self._barra_visivel = False
+        self._config = {}  # último valor aplicado a cada (item, opção)
+
+    def _aplicar(self, item, **opcoes):
+        # itemconfigure só quando o valor muda
+        novas = {k: v for k, v in opcoes.items() if self._config.get((item, k)) != v}
+        if novas:
+            self.canvas.itemconfigure(item, **novas)
+            for k, v in novas.items(): self._config[(item, k)] = v
+
+    def _mostrar_fila(self, n):
+        # Mostra/esconde só os retângulos entre o tamanho anterior e o atual
+        if n > self._fila_visivel:
+            for item in self.rects_fila[self._fila_visivel:n]: self.canvas.itemconfigure(item, state="normal")
+        elif n < self._fila_visivel:
+            for item in self.rects_fila[n:self._fila_visivel]: self.canvas.itemconfigure(item, state="hidden")
+        self._fila_visivel = n
+
+    def atualizar(self, fila_size, nomes_por_medico, rotulos, rodape):
+        self._aplicar(self.txt_fila, text=f"Fila de espera ({fila_size} pacientes)")
+        if fila_size <= self.MAX_FILA_DESENHADA:
+            if self._barra_visivel:
+                self._aplicar(self.barra_fundo, state="hidden"); self._aplicar(self.barra_fila, state="hidden"); self._barra_visivel = False
+            self._mostrar_fila(fila_size)
+        else:
+            self._mostrar_fila(0)
+            if not self._barra_visivel:
+                self._aplicar(self.barra_fundo, state="normal"); self._aplicar(self.barra_fila, state="normal"); self._barra_visivel = True
+            x, y = self._origem_barra
+            largura = self.LARGURA_BARRA * min(1.0, fila_size / self.escala_fila)
+            self.canvas.coords(self.barra_fila, x, y, x + largura, y + 30)
+
+        for i in range(self.num_medicos):
+            nome_atual = nomes_por_medico[i] if i < len(nomes_por_medico) else None
+            self._aplicar(self.caixas[i], fill=self.OCUPADO_COR if nome_atual is not None else self.LIVRE_COR)
+            self._aplicar(self.nomes[i], text=nome_atual or "")
+            self._aplicar(self.rotulos[i], text=rotulos[i])
+        self._aplicar(self.txt_rodape, text=rodape)
+
+
 # --- CLASSE APP (INTERFACE) ---
 
+class ListaVirtual:
+    """Listbox virtualizada: só as linhas visíveis existem no widget e são formatadas a pedido
+    (formatar(k) para o k-ésimo resultado); a barra de deslocamento representa o total."""
+
+    def __init__(self, parent, formatar, altura=20, **opcoes):
+        self.frame = ttk.Frame(parent)
+        self.listbox = tk.Listbox(self.frame, height=altura, activestyle="none", exportselection=False, **opcoes)
+        self.barra = ttk.Scrollbar(self.frame, orient="vertical", command=self._rolar)
+        self.barra.pack(side="right", fill="y"); self.listbox.pack(side="left", fill="both", expand=True)
+        self.formatar = formatar
+        self.total = 0; self.inicio = 0; self.altura = altura
+        self._altura_linha = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+
+        lb = self.listbox
+        lb.bind("<Configure>", self._redimensionar)
+        lb.bind("<MouseWheel>", lambda e: self._deslocar(-1 if e.delta > 0 else 1, "units"))
+        lb.bind("<Button-4>", lambda e: self._deslocar(-1, "units")); lb.bind("<Button-5>", lambda e: self._deslocar(1, "units"))
+        lb.bind("<Up>", lambda e: self._mover_selecao(-1)); lb.bind("<Down>", lambda e: self._mover_selecao(1))
+        lb.bind("<Prior>", lambda e: self._mover_selecao(-self.altura)); lb.bind("<Next>", lambda e: self._mover_selecao(self.altura))
+        lb.bind("<Home>", lambda e: self._mover_selecao(-self.total)); lb.bind("<End>", lambda e: self._mover_selecao(self.total))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def definir(self, total):
+        """Novo conjunto de resultados (só o total; as linhas vêm de formatar)."""
+        self.total = total; self.inicio = 0
+        self._desenhar()
+
+    def selecionado(self):
+        """Índice (no conjunto de resultados) da linha selecionada, ou None."""
+        sel = self.listbox.curselection()
+        return self.inicio + sel[0] if sel else None
+
+    def _desenhar(self, selecionar=None):
+        lb = self.listbox
+        fim = min(self.total, self.inicio + self.altura)
+        lb.delete(0, tk.END)
+        if fim > self.inicio: lb.insert(tk.END, *(self.formatar(k) for k in range(self.inicio, fim)))
+        if selecionar is not None and self.inicio <= selecionar < fim:
+            lb.selection_set(selecionar - self.inicio); lb.activate(selecionar - self.inicio)
+        if self.total: self.barra.set(self.inicio / self.total, fim / self.total)
+        else: self.barra.set(0, 1)
+
+    def _ir_para(self, inicio, selecionar=None):
+        inicio = max(0, min(int(inicio), self.total - self.altura))
+        if inicio != self.inicio or selecionar is not None:
+            self.inicio = inicio; self._desenhar(selecionar)
+
+    def _deslocar(self, n, unidade):
+        self._ir_para(self.inicio + n * (self.altura if unidade == "pages" else 1))
+        return "break"
+
+    def _rolar(self, acao, valor, unidade=None):
+        # Protocolo do comando de uma Scrollbar: ("moveto", fração) ou ("scroll", n, "units"/"pages")
+        if acao == "moveto": self._ir_para(round(float(valor) * self.total))
+        else: self._deslocar(int(valor), unidade)
+
+    def _mover_selecao(self, n):
+        if not self.total: return "break"
+        atual = self.selecionado()
+        alvo = max(0, min(self.total - 1, (self.inicio if atual is None else atual + n)))
+        inicio = self.inicio
+        if alvo < inicio: inicio = alvo
+        elif alvo >= inicio + self.altura: inicio = alvo - self.altura + 1
+        self._ir_para(inicio, selecionar=alvo)
+        self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    def _redimensionar(self, event):
+        altura = max(1, event.height // self._altura_linha)
+        if altura != self.altura:
+            self.altura = altura; self._ir_para(self.inicio, selecionar=self.selecionado())
+
+PERIODO_FRAME_MS = 120  # cadência da animação
+PERIODO_FLUXO_MS = 100  # leitura dos snapshots da simulação em curso
+
 class App(tk.Tk):
     def __init__(self, initial_params):
         super().__init__()
@@ -113,11 +326,23 @@ class App(tk.Tk):
         
         # FIX DEFINITIVO: Inicializa pacientes como lista vazia. O carregamento é adiado.
         self.pacientes = [] 
+        self.indice_pacientes = None  # IndicePacientes do dataset atual (criado na 1ª pesquisa)
+        self.linhas_pesquisa = np.empty(0, dtype=np.intp)  # linha do armazém de cada resultado da pesquisa
         
         self.sim = None
         self.anim_after = None
         self.minuto_atual = 0
-        self.comparacao_taxas_data = None 
+        self.minuto_mostrado = None
+        self.cursor_consultas = None
+        self.comparacao_resultados = None 
+        self.varrimento = None
+        self.executor = None  # ExecutorSimulacoes (workers com o dataset atual), criado na 1ª simulação
+        # Simulações desta sessão, por número: várias configurações correm lado a lado no executor
+        self.execucoes = {}  # número -> ExecucaoRemota ainda em curso
+        self.resultados_execucoes = {}  # número -> ResultadoSimulacao, None (cancelada) ou a exceção do worker
+        self.descricoes_execucoes = {}  # número -> texto da configuração (lista "Simulação:")
+        self.num_execucoes = 0
+        self.execucao_vista = None  # número da simulação mostrada na animação
         
         # Lista de especialidades fixas (sem tempo de serviço associado)
         self.all_specialties = ["clinica_geral", "pneumologia", "endocrinologia", "cardiologia", "ortopedia", "otorrino", "geriatria"]
@@ -180,6 +405,14 @@ class App(tk.Tk):
         self.ent_duracao.grid(row=4, column=1, sticky="w")
 
         tk.Button(self.left_frame, text="Iniciar Simulação", bg="#ffb703", command=self.iniciar_simulacao).pack(fill="x", pady=(12,6))
+        tk.Button(self.left_frame, text="Cancelar Simulação", bg="#f4f4f4", command=self._cancelar_simulacao).pack(fill="x", pady=3)
+        frm_execucao = tk.Frame(self.left_frame); frm_execucao.pack(fill="x", pady=3)
+        tk.Label(frm_execucao, text="Simulação:").pack(side="left")
+        self.cmb_execucao = ttk.Combobox(frm_execucao, values=[], width=34, state="readonly")
+        self.cmb_execucao.pack(side="left", fill="x", expand=True)
+        self.cmb_execucao.bind("<<ComboboxSelected>>", self._selecionar_execucao)
+        self.numeros_execucoes = []
+        tk.Button(self.left_frame, text="Estimativa Analítica", bg="#fff3c4", command=self._estimativa_analitica).pack(fill="x", pady=3)
         tk.Button(self.left_frame, text="Parar Animação", bg="#e63946", fg="white", command=self.parar_animacao).pack(fill="x", pady=3)
         tk.Button(self.left_frame, text="Abrir Painel de Gráficos", bg="#219ebc", fg="white", command=self.abrir_graficos_abas).pack(fill="x", pady=3)
         tk.Button(self.left_frame, text="Configurar Especialidades", bg="#8ecae6", command=self._open_specialty_config).pack(fill="x", pady=3)
@@ -202,6 +435,9 @@ class App(tk.Tk):
         canvas_frame.pack(side="top", fill="both", expand=True)
         self.canvas = tk.Canvas(canvas_frame, bg="#f7f7f7", height=420)
         self.canvas.pack(expand=True, fill="both")
+        self.vista = VistaAnimacao(self.canvas)
+        self.scl_minuto = tk.Scale(top_right, from_=0, to=0, orient="horizontal", label="Minuto", showvalue=True, command=self._ir_para_minuto)
+        self.scl_minuto.pack(side="top", fill="x")
 
     def _update_specialty_structure(self, event=None):
         try:
@@ -259,43 +495,41 @@ class App(tk.Tk):
         frm_input.pack(fill="x", padx=10, pady=10)
         
         self.search_vars = {
-            'nome': tk.StringVar(), 'idade': tk.StringVar(), 'sexo': tk.StringVar(), 'id_cc': tk.StringVar()
+            'nome': tk.StringVar(), 'idade': tk.StringVar(), 'sexo': tk.StringVar(), 'id_cc': tk.StringVar(), 'distrito': tk.StringVar()
         }
         
         # Labels e Entradas de Pesquisa Filtrada (sem "(parcial)")
         ttk.Label(frm_input, text="Nome:").grid(row=0, column=0, sticky="w"); ttk.Entry(frm_input, textvariable=self.search_vars['nome']).grid(row=0, column=1, sticky="we", padx=5)
-        ttk.Label(frm_input, text="Idade:").grid(row=1, column=0, sticky="w"); ttk.Entry(frm_input, textvariable=self.search_vars['idade']).grid(row=1, column=1, sticky="we", padx=5)
+        ttk.Label(frm_input, text="Idade (ex.: 30-40):").grid(row=1, column=0, sticky="w"); ttk.Entry(frm_input, textvariable=self.search_vars['idade']).grid(row=1, column=1, sticky="we", padx=5)
         
         ttk.Label(frm_input, text="CC/BI:").grid(row=0, column=2, sticky="w"); ttk.Entry(frm_input, textvariable=self.search_vars['id_cc']).grid(row=0, column=3, sticky="we", padx=5)
         ttk.Label(frm_input, text="Sexo:").grid(row=1, column=2, sticky="w"); ttk.Combobox(frm_input, values=['', 'masculino', 'feminino', 'outro'], textvariable=self.search_vars['sexo'], state="readonly").grid(row=1, column=3, sticky="we", padx=5)
+        distritos = [''] + (self._indice_pacientes().valores("distritos") if self.pacientes else [])
+        ttk.Label(frm_input, text="Distrito:").grid(row=2, column=0, sticky="w"); ttk.Combobox(frm_input, values=distritos, textvariable=self.search_vars['distrito'], state="readonly").grid(row=2, column=1, sticky="we", padx=5)
         
-        tk.Button(frm_input, text="Pesquisar", command=lambda: self._perform_search(listbox_results)).grid(row=2, column=0, columnspan=4, pady=10)
-
-        listbox_results = tk.Listbox(search_win, width=100, height=20, font=("Courier", 10))
-        listbox_results.pack(padx=10, pady=10)
-        listbox_results.bind("<<ListboxSelect>>", lambda event: self._show_patient_details(listbox_results))
-        listbox_results.insert(tk.END, "ID | NOME | IDADE | SEXO | DISTRITO | PRIO | NOTAS CLÍNICAS (Clique para Detalhes)")
-        listbox_results.insert(tk.END, "----------------------------------------------------------------------------------------------------")
+        tk.Button(frm_input, text="Pesquisar", command=lambda: self._perform_search(lista_results, lbl_total)).grid(row=3, column=0, columnspan=4, pady=10)
+
+        lbl_total = ttk.Label(search_win, text=""); lbl_total.pack(anchor="w", padx=10)
+        tk.Label(search_win, anchor="w", font=("Courier", 10),
+                 text="ID | NOME | IDADE | SEXO | DISTRITO | PRIO | NOTAS CLÍNICAS (Clique para Detalhes)").pack(fill="x", padx=10)
+        # Só a página visível é formatada: o custo não depende do número de resultados
+        self.linhas_pesquisa = np.empty(0, dtype=np.intp)
+        lista_results = ListaVirtual(search_win, self._linha_resultado, altura=20, width=100, font=("Courier", 10))
+        lista_results.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        lista_results.listbox.bind("<<ListboxSelect>>", lambda event: self._show_patient_details(lista_results))
         
-    def _show_patient_details(self, listbox_results):
+    def _show_patient_details(self, lista_results):
         try:
-            selection = listbox_results.curselection()
-            if not selection or listbox_results.get(selection[0]).startswith("ID |"): return
-            
-            selected_line = listbox_results.get(selection[0])
-            patient_id_raw = selected_line.split('|')[0].strip()
-            
-            patient = next((p for p in self.pacientes if str(p.id) == patient_id_raw), None)
-            
-            if not patient: return
+            k = lista_results.selecionado()
+            if k is None or k >= len(self.linhas_pesquisa): return
+            patient = self._indice_pacientes().armazem.paciente(int(self.linhas_pesquisa[k]))
 
             details_win = tk.Toplevel(self)
             details_win.title(f"Detalhes Clínicos do Paciente: {patient.nome}")
             details_win.geometry("500x450")
             
-            # Reutiliza o motor de prioridade da simulação
-            p_for_sim = {k: getattr(patient, k) for k in ['idade', 'descrição', 'religiao', 'atributos']}
-            _, prioridade_str, motivo_str = SimulacaoClinica._detectar_doenca_e_prioridade(SimulacaoClinica(pacientes=[]), p_for_sim)
+            # Reutiliza a triagem da simulação (calculada uma vez por paciente)
+            motivo_str = patient.nota_clinica()
             
             
             # --- Preparação do Texto Detalhado ---
@@ -330,53 +564,36 @@ class App(tk.Tk):
             messagebox.showerror("Erro de Detalhe", f"Erro ao exibir detalhes: {e}")
 
 
-    def _perform_search(self, listbox_results):
-        listbox_results.delete(0, tk.END)
-        listbox_results.insert(tk.END, "ID | NOME | IDADE | SEXO | DISTRITO | PRIO | NOTAS CLÍNICAS (Clique para Detalhes)")
-        listbox_results.insert(tk.END, "----------------------------------------------------------------------------------------------------")
-        
-        query_nome = self.search_vars['nome'].get().lower()
-        query_idade = self.search_vars['idade'].get().lower()
-        query_sexo = self.search_vars['sexo'].get().lower()
-        query_id_cc = self.search_vars['id_cc'].get().lower()
-        
-        found_count = 0
-        for p in self.pacientes:
-            p_data = p.__dict__
-            
-            is_match = True
-            
-            # Filtro 1: Nome (Contém a string)
-            if query_nome and query_nome not in str(p_data.get('nome', '')).lower(): 
-                is_match = False
-            
-            # Filtro 2: Idade (Contém a string)
-            if is_match and query_idade and query_idade not in str(p_data.get('idade', '')): 
-                is_match = False
-
-            # Filtro 3: Sexo (EXATO)
-            if is_match and query_sexo and str(p_data.get('sexo', '')).lower() != query_sexo: 
-                is_match = False
-                
-            # Filtro 4: CC/BI (Contém a string)
-            if is_match and query_id_cc and query_id_cc not in str(p.id).lower():
-                is_match = False
-            
-            # Se todos os filtros passarem
-            if is_match:
-                # Determina a prioridade e motivo (para exibir as notas clínicas)
-                p_for_sim = {k: getattr(p, k) for k in ['idade', 'descrição', 'religiao', 'atributos']}
-                _, prioridade_str, motivo_str = SimulacaoClinica._detectar_doenca_e_prioridade(SimulacaoClinica(pacientes=[]), p_for_sim)
-
-                morada = p_data.get('morada', {}); distrito = morada.get('distrito', '?')
-                
-                # A prioridade é sempre "NORMAL" na exibição
-                line = f"{p.id:<3} | {p.nome:<20} | {p.idade:<5} | {p.sexo:<5} | {distrito:<15} | {'NORM':<4} | {motivo_str[:35]:<35}"
-                listbox_results.insert(tk.END, line)
-                found_count += 1
-        
-        if found_count == 0:
-            listbox_results.insert(tk.END, "Nenhum paciente encontrado com os filtros especificados.")
+    def _perform_search(self, lista_results, lbl_total):
+        try:
+            idades = intervalo_idades(self.search_vars['idade'].get())
+        except ValueError:
+            messagebox.showwarning("Aviso", "Idade inválida: use uma idade (30) ou um intervalo (30-40, 65-)."); return
+
+        # Índice por dataset: sem varrer nem criar um Paciente por registo a cada pesquisa
+        if self.pacientes:
+            self.linhas_pesquisa = self._indice_pacientes().pesquisar(
+                nome=self.search_vars['nome'].get(), id_cc=self.search_vars['id_cc'].get(),
+                sexo=self.search_vars['sexo'].get(), idades=idades, distrito=self.search_vars['distrito'].get())
+        else:
+            self.linhas_pesquisa = np.empty(0, dtype=np.intp)
+        n = len(self.linhas_pesquisa)
+        lbl_total.config(text=f"{n} paciente(s) encontrado(s)." if n else "Nenhum paciente encontrado com os filtros especificados.")
+        lista_results.definir(n)
+
+    def _linha_resultado(self, k):
+        """Linha formatada do k-ésimo resultado da pesquisa (chamada só para as linhas visíveis)."""
+        if k >= len(self.linhas_pesquisa): return ""  # resultados de um dataset entretanto substituído
+        armazem = self._indice_pacientes().armazem; i = int(self.linhas_pesquisa[k])
+        # Notas clínicas a partir da triagem em cache do armazém
+        motivo_str = armazem.nota_clinica(i)
+        idade = int(armazem.idades[i]); distrito = armazem.distrito(i) or '?'
+        # A prioridade é sempre "NORMAL" na exibição
+        return f"{armazem.ids[i]:<3} | {armazem.nomes[i]:<20} | {idade if idade >= 0 else 'None':<5} | {str(armazem.valor('sexos', i)):<5} | {distrito:<15} | {'NORM':<4} | {motivo_str[:35]:<35}"
+
+    def _indice_pacientes(self) -> IndicePacientes:
+        if self.indice_pacientes is None: self.indice_pacientes = IndicePacientes(self.pacientes)
+        return self.indice_pacientes
             
     def _carregar_dataset_dialog(self):
         filepath = filedialog.askopenfilename(
@@ -386,9 +603,10 @@ class App(tk.Tk):
         )
         if filepath:
             try:
-                new_pacientes = carregar_pacientes_json(ficheiro=filepath, limite=None)
+                new_pacientes = carregar_pacientes_json(ficheiro=filepath, limite=None, colunar=True)
                 if new_pacientes:
-                    self.pacientes = new_pacientes
+                    self.pacientes = new_pacientes; self.indice_pacientes = None; self.linhas_pesquisa = np.empty(0, dtype=np.intp)
+                    self._fechar_executor()  # os workers têm o dataset anterior
                     self.dataset_file = filepath
                     self.lbl_dataset.config(text=f"Dataset: {os.path.basename(self.dataset_file)} ({len(self.pacientes)} pessoas)")
                     messagebox.showinfo("Sucesso", f"{len(self.pacientes)} pacientes carregados de {os.path.basename(filepath)}.")
@@ -413,54 +631,115 @@ class App(tk.Tk):
                 messagebox.showwarning("Aviso", "Não é possível iniciar. É **obrigatório** carregar um Dataset JSON válido (ficheiro de pacientes) antes de simular.")
                 return
 
-            self.sim = SimulacaoClinica(lambda_rate=lambda_rate, num_doctors=num_doctors,
-                                        service_distribution=dist, mean_service_time=tempo,
-                                        simulation_time=duracao, pacientes=self.pacientes,
-                                        arrival_pattern=arrival_pattern,
-                                        doctor_specialties=self.doctor_specialties)
-                                        
-            thread = threading.Thread(target=self._run_sim_thread, daemon=True)
-            thread.start()
-            self.minuto_atual = 0; self.canvas.delete("all"); self.lbl_paciente.config(text="Executando simulação... aguarda")
-            self.after(200, self.animar)
-
-    def _run_sim_thread(self):
+            params = dict(lambda_rate=lambda_rate, num_doctors=num_doctors, service_distribution=dist,
+                          mean_service_time=tempo, simulation_time=duracao, arrival_pattern=arrival_pattern,
+                          doctor_specialties=dict(self.doctor_specialties))
+            # A simulação corre num processo do executor: o loop Tk não disputa o GIL com o motor.
+            # As simulações anteriores continuam (2 processos lado a lado; as seguintes esperam na fila)
+            if self.executor is None: self.executor = ExecutorSimulacoes(self.pacientes, processos=2)
+            self.num_execucoes += 1; numero = self.num_execucoes
+            self.execucoes[numero] = self.executor.iniciar(params)
+            self.descricoes_execucoes[numero] = f"#{numero} λ={lambda_rate:g} · {num_doctors} médicos · {dist} {tempo:g} min"
+            self._ver_execucao(numero)
+            self.after(PERIODO_FLUXO_MS, self._acompanhar_simulacao, numero)
+
+    def _estado_execucao(self, numero):
+        if numero in self.execucoes: return "a correr"
+        resultado = self.resultados_execucoes.get(numero)
+        if resultado is None: return "cancelada"
+        return "erro" if isinstance(resultado, Exception) else "terminada"
+
+    def _atualizar_lista_execucoes(self):
+        self.numeros_execucoes = sorted(self.descricoes_execucoes)
+        self.cmb_execucao.config(values=[f"{self.descricoes_execucoes[n]} ({self._estado_execucao(n)})" for n in self.numeros_execucoes])
+        if self.execucao_vista in self.descricoes_execucoes: self.cmb_execucao.current(self.numeros_execucoes.index(self.execucao_vista))
+
+    def _selecionar_execucao(self, event=None):
+        if self.cmb_execucao.current() >= 0: self._ver_execucao(self.numeros_execucoes[self.cmb_execucao.current()])
+
+    def _ver_execucao(self, numero):
+        """Mostra a simulação `numero` na animação: snapshots se ainda corre, resultados se já terminou."""
+        self.parar_animacao()
+        self.execucao_vista = numero; self._atualizar_lista_execucoes()
+        self.sim = None; self.minuto_atual = 0; self.minuto_mostrado = None; self.cursor_consultas = None; self.vista.limpar()
+        if numero in self.execucoes: self.lbl_paciente.config(text="Executando simulação... aguarda"); return
+        resultado = self.resultados_execucoes.get(numero)
+        if resultado is None: self.lbl_paciente.config(text="Simulação cancelada."); return
+        if isinstance(resultado, Exception): self._mostrar_stats_texto(f"❌ Erro durante a simulação: {resultado}"); return
+
+        self.sim = resultado
+        # Se a simulação abortou em simulacao.py (sem pacientes), não há stats
+        if not resultado.pacientes: self._mostrar_stats_texto("Simulação abortada: Dataset de pacientes vazio.")
+        else: self._mostrar_stats_texto(texto_estatisticas(resultado.stats))
+        # Terminada: reprodução detalhada (nomes e barra de minutos) a partir do minuto 0
+        self.animar()
+
+    def _cancelar_simulacao(self):
+        """Cancela a simulação mostrada; as outras continuam."""
+        execucao = self.execucoes.pop(self.execucao_vista, None)
+        if execucao is not None:
+            execucao.cancelar(); self.resultados_execucoes[self.execucao_vista] = None
+            self._atualizar_lista_execucoes()
+            self.lbl_paciente.config(text="Simulação cancelada.")
+
+    def _fechar_executor(self):
+        for numero, execucao in self.execucoes.items():
+            execucao.cancelar(); self.resultados_execucoes[numero] = None
+        self.execucoes = {}
+        if self.descricoes_execucoes: self._atualizar_lista_execucoes()
+        if self.executor is not None: self.executor.fechar(); self.executor = None
+
+    def _estimativa_analitica(self):
+        """Resultados instantâneos pelas fórmulas M/M/c / M/G/c (não precisa de dataset nem de simular)."""
         try:
-            self.sim.run()
-            # Se a simulação abortou em simulacao.py (sem pacientes), não calcula stats
-            if not self.sim.pacientes: 
-                self.after(50, lambda: self._mostrar_stats_texto("Simulação abortada: Dataset de pacientes vazio."))
-                return
-
-            stats = calcular_estatisticas(self.sim)
-            
-            # NOVO FORMATO DE ESTATÍSTICAS
-            texto = "📊 ESTATÍSTICAS GERAIS\n"
-            texto += "--------------------------------------\n"
-            texto += f"Pacientes Atendidos: {stats['doentes_atendidos']}\n"
-            texto += f"Ocupação Média Médicos: {stats['ocupacao_media_medicos']:.2f}%\n\n"
-            
-            texto += "⏱️ TEMPOS (Minutos)\n"
-            texto += f"T. Médio Espera: {stats['tempo_medio_espera']:.2f} | Var: {stats['variancia_tempo_espera']:.2f}\n"
-            texto += f"T. Médio Consulta: {stats['tempo_medio_consulta']:.2f} | Var: {stats['variancia_tempo_consulta']:.2f}\n"
-            texto += f"T. Médio Total Clínica: {stats['tempo_medio_na_clinica']:.2f}\n\n"
-            
-            texto += "🔢 FILA (Pacientes)\n"
-            texto += f"Fila Média: {stats['fila_media']:.2f} | Fila Máxima: {stats['fila_max']}\n\n"
-            
-            med_stats_str = "🧑‍⚕️ MÉTRICAS POR MÉDICO\n"
-            med_stats_str += "--------------------------------------\n"
-            for mid, m_stats in stats.get("stats_por_medico", {}).items():
-                med_stats_str += f"Médico {mid+1} ({m_stats['especialidade'].title()}):\n"
-                med_stats_str += f"  - Atendidos: {m_stats['num_atendidos']:<5} | Ocupação: {m_stats['ocupacao_percent']:.1f}%\n"
-                med_stats_str += f"  - T. Consulta Médio: {m_stats['media_consulta']:.2f} min\n"
-                
-            texto += med_stats_str
-            
-            self.after(50, lambda: self._mostrar_stats_texto(texto))
+            self._update_specialty_structure()
+            params = dict(lambda_rate=float(self.ent_lambda.get()), num_doctors=int(self.ent_medicos.get()),
+                          service_distribution=self.cmb_dist.get(), mean_service_time=float(self.ent_tempo.get()),
+                          simulation_time=int(self.ent_duracao.get()), arrival_pattern=self.cmb_arrival_pattern.get(),
+                          doctor_specialties=self.doctor_specialties)
+            procura = procura_por_especialidade(self.pacientes) if self.pacientes else None
+            stats = estimar_estatisticas(num_pacientes=len(self.pacientes) or None, procura=procura, **params)
+        except ValueError:
+            messagebox.showwarning("Aviso","Insira valores válidos!"); return
+
+        texto = texto_estatisticas(stats, titulo=f"📐 ESTIMATIVA {stats['modelo']}")
+        if not stats["aplicavel"]:
+            texto = "⚠️ Chegadas não homogéneas ou médicos que não servem todos os pacientes: valores apenas indicativos.\n\n" + texto
+        if stats["ocupacao_media_medicos"] >= 100.0:
+            texto = "⚠️ Sistema instável (λ ≥ c·μ): a fila cresce sem limite.\n\n" + texto
+        self._mostrar_stats_texto(texto)
+
+    def _acompanhar_simulacao(self, numero):
+        """Drena os snapshots de uma simulação em curso (no loop Tk); só a simulação mostrada é desenhada.
+        Quando termina, guarda o resultado (e mostra-o, se for a simulação mostrada)."""
+        execucao = self.execucoes.get(numero)
+        if execucao is None: return  # cancelada
+        snapshots, _ = execucao.fluxo.drenar()
+        if snapshots and numero == self.execucao_vista: self._desenhar_snapshot(execucao, snapshots[-1])
+        if not execucao.terminada():
+            self.after(PERIODO_FLUXO_MS, self._acompanhar_simulacao, numero); return
+
+        del self.execucoes[numero]
+        try:
+            resultado = execucao.resultado()
         except Exception as e:
-            print("Erro durante a execução da simulação (thread):", e)
-            traceback.print_exc()
+            print("Erro durante a execução da simulação (worker):", e)
+            resultado = e
+        self.resultados_execucoes[numero] = resultado
+        if numero == self.execucao_vista: self._ver_execucao(numero)
+        else: self._atualizar_lista_execucoes()
+
+    def _desenhar_snapshot(self, sim, snap):
+        num_doctors = sim.num_doctors
+        if self.vista.num_medicos != num_doctors: self.vista.preparar(num_doctors, 1)
+        self.vista.escala_fila = max(self.vista.escala_fila, snap["fila"])
+        # Durante a simulação só se sabe se cada médico está ocupado (sem o nome do paciente)
+        nomes = ["" if ocupado else None for ocupado in snap["medicos_ocupados"]]
+        especialidades = sim.params.get("doctor_specialties", {})
+        rotulos = [f"Médico {i+1} ({especialidades.get(str(i), 'geral').title()})" for i in range(num_doctors)]
+        txt = f"Minuto: {int(snap['minuto'])} | Atendidos: {snap['atendidos']} | Médicos ocupados: {snap['ocupados']}/{num_doctors} | A simular..."
+        self.vista.atualizar(snap["fila"], nomes, rotulos, txt)
+        self.lbl_paciente.config(text=f"Executando simulação... minuto {int(snap['minuto'])} de {sim.simulation_time}")
 
     def _mostrar_stats_texto(self, texto):
         self.txt_stats.delete("1.0","end")
@@ -476,73 +755,63 @@ class App(tk.Tk):
             if not hasattr(self.sim, "fila_sizes") or not hasattr(self.sim, "ocupacao_medicos"): self.after(200, self.animar); return
             if self.minuto_atual >= len(self.sim.fila_sizes): self.lbl_paciente.config(text="Simulação terminada."); self.parar_animacao(); return
 
-            self.canvas.delete("all")
-            fila_size = self.sim.fila_sizes[self.minuto_atual] if self.minuto_atual < len(self.sim.fila_sizes) else 0
-            ocupacao = self.sim.ocupacao_medicos[self.minuto_atual] if self.minuto_atual < len(self.sim.ocupacao_medicos) else 0.0
-
-            start_x = 30; start_y = 40
-            self.canvas.create_text(start_x, start_y-20, anchor="w", text=f"Fila de espera ({fila_size} pacientes)", font=("Arial", 12, "bold"))
-            for i in range(fila_size):
-                x = start_x + (i % 10) * 28; y = start_y + (i//10) * 40
-                self.canvas.create_rectangle(x, y, x+20, y+30, fill="#e63946", outline="black")
-
-            num_doctors = getattr(self.sim, "num_doctors", 3)
-            box_w = 220; box_h = 40; left_med_x = 450; top_med_y = 60
-            ocup_num = int(round((ocupacao/100.0) * num_doctors)) if num_doctors > 0 else 0
-            nomes_por_medico = {i: None for i in range(num_doctors)}; eventos = getattr(self.sim, "eventos", []) or []
-            
-            for ev in eventos:
-                inicio = 0; dur = 0.0; fim = 0; is_valid_event = True
-                try: inicio = int(ev.get("minuto_inicio", 0)); dur = float(ev.get("duracao", 0.0)); fim = inicio + int(np.ceil(dur))
-                except Exception: is_valid_event = False 
-                if is_valid_event and inicio <= self.minuto_atual < fim:
-                    medico_raw = ev.get("medico", None); 
-                    
-                    # Apenas mostra o nome
-                    nome_completo = ev.get("paciente") or "Paciente desconhecido"
-                    nome_puro = nome_completo.split(' (')[0]
-                    
-                    is_valid_medico = True
-                    try: m_idx = int(medico_raw); 
-                    except Exception: is_valid_medico = False 
-                    if is_valid_medico: nomes_por_medico[m_idx] = nome_puro
-
-            OCUPADO_COR = "#00A86B" 
-            pacientes_em_consulta = []
-            for i in range(num_doctors):
-                y = top_med_y + i*(box_h+20)
-                
-                nome_atual = nomes_por_medico.get(i)
-                color = OCUPADO_COR if nome_atual is not None else "#adb5bd" 
-                
-                self.canvas.create_rectangle(left_med_x, y, left_med_x+box_w, y+box_h, fill=color, outline="black")
-                self.canvas.create_text(left_med_x+box_w+10, y+box_h/2, anchor="w", text=f"Médico {i+1} ({self.doctor_specialties.get(str(i), 'geral').title()})", font=("Arial", 11))
-                
-                if nome_atual: 
-                    self.canvas.create_text(left_med_x+6, y+box_h/2, anchor="w", text=nome_atual, font=("Arial", 10, "bold"), fill="white")
-                    medico_str = f"Médico {i + 1}"
-                    pacientes_em_consulta.append(f"{medico_str}: {nome_atual}")
-
-            atendidos = getattr(self.sim, "doentes_atendidos", 0)
-            tempos_espera = getattr(self.sim, "tempos_espera", []) or []
-            tempo_esp = np.mean(tempos_espera) if tempos_espera else 0
-            tempo_cons = np.mean(getattr(self.sim, "tempos_consulta", [])) or 0
-            
-            txt = f"Minuto: {self.minuto_atual} | Atendidos: {atendidos} | Tempo médio espera: {tempo_esp:.2f} min | Tempo médio consulta: {tempo_cons:.2f} min"
-            self.canvas.create_text(30, 380, anchor="w", text=txt, font=("Arial", 10))
-
-            # Atualiza o label de Paciente Atual apenas com o nome
-            if pacientes_em_consulta: texto = "\n".join(pacientes_em_consulta)
-            else: texto = "— nenhum paciente em consulta neste minuto —"
-
-            self.lbl_paciente.config(text=texto)
+            t0 = time.perf_counter()
+            self._desenhar_minuto(self.minuto_atual)
             self.minuto_atual += 1
-            self.anim_after = self.after(120, self.animar) 
+            # Cadência fixa: o tempo gasto a desenhar é descontado do intervalo até ao próximo frame
+            gasto_ms = int((time.perf_counter() - t0) * 1000)
+            self.anim_after = self.after(max(1, PERIODO_FRAME_MS - gasto_ms), self.animar) 
 
         except Exception as e:
             print("Erro na função animar():", e)
             traceback.print_exc()
             self.after(500, self.animar)
+
+    def _cursor(self):
+        # Cursor sobre o índice de consultas da simulação atual (criado quando o índice fica disponível)
+        indice = getattr(self.sim, "indice_consultas", None)
+        if indice is None: return None
+        if self.cursor_consultas is None or self.cursor_consultas.indice is not indice: self.cursor_consultas = indice.cursor()
+        return self.cursor_consultas
+
+    def _desenhar_minuto(self, minuto):
+        self.minuto_mostrado = minuto
+        n_minutos = len(self.sim.fila_sizes)
+        if int(self.scl_minuto.cget("to")) != max(0, n_minutos - 1): self.scl_minuto.config(to=max(0, n_minutos - 1))
+        self.scl_minuto.set(minuto)
+
+        fila_size = self.sim.fila_sizes[minuto] if minuto < n_minutos else 0
+        num_doctors = getattr(self.sim, "num_doctors", 3)
+        if self.vista.num_medicos != num_doctors: self.vista.preparar(num_doctors, max(self.sim.fila_sizes, default=1))
+
+        # Consulta ativa de cada médico: O(médicos) por frame, pelo índice de intervalos
+        cursor = self._cursor()
+        nomes_por_medico = cursor.nomes_em(minuto) if cursor is not None else [None] * num_doctors
+        # Especialidades da configuração desta simulação (pode não ser a configuração atual)
+        especialidades = getattr(self.sim, "doctor_specialties", self.doctor_specialties)
+        rotulos = [f"Médico {i+1} ({especialidades.get(str(i), 'geral').title()})" for i in range(num_doctors)]
+        pacientes_em_consulta = [f"Médico {i + 1}: {nome}" for i, nome in enumerate(nomes_por_medico) if nome]
+
+        atendidos = getattr(self.sim, "doentes_atendidos", 0)
+        # Médias da simulação inteira (já calculadas em calcular_estatisticas, não por frame)
+        stats_geral = getattr(self.sim, "stats_geral", {}) or {}
+        tempo_esp = stats_geral.get("tempo_medio_espera", 0.0); tempo_cons = stats_geral.get("tempo_medio_consulta", 0.0)
+        
+        txt = f"Minuto: {minuto} | Atendidos: {atendidos} | Tempo médio espera: {tempo_esp:.2f} min | Tempo médio consulta: {tempo_cons:.2f} min"
+        self.vista.atualizar(fila_size, nomes_por_medico, rotulos, txt)
+
+        # Atualiza o label de Paciente Atual apenas com o nome
+        if pacientes_em_consulta: texto = "\n".join(pacientes_em_consulta)
+        else: texto = "— nenhum paciente em consulta neste minuto —"
+
+        self.lbl_paciente.config(text=texto)
+
+    def _ir_para_minuto(self, valor):
+        """Salto da animação para o minuto escolhido na barra (funciona com a animação parada ou a correr)."""
+        minuto = int(float(valor))
+        if not self.sim or minuto == self.minuto_mostrado or minuto >= len(getattr(self.sim, "fila_sizes", [])): return
+        self.minuto_atual = minuto
+        if self.anim_after is None: self._desenhar_minuto(minuto)
     
     def _parar_animacao(self):
         if self.anim_after: self.after_cancel(self.anim_after)
@@ -550,7 +819,9 @@ class App(tk.Tk):
 
     def _abrir_graficos_abas(self):
         should_proceed = True
-        if not self.sim: messagebox.showwarning("Aviso", "Execute a simulação antes de abrir gráficos."); should_proceed = False
+        if self.execucao_vista in self.execucoes:
+            messagebox.showwarning("Aviso", "A simulação ainda está a decorrer. Aguarde que termine."); should_proceed = False
+        elif not self.sim: messagebox.showwarning("Aviso", "Execute a simulação antes de abrir gráficos."); should_proceed = False
         
         # Verifica se a simulação correu sem abortar
         if hasattr(self.sim, "pacientes") and not self.sim.pacientes:
@@ -585,51 +856,92 @@ class App(tk.Tk):
 
             tab5 = tk.Frame(notebook); notebook.add(tab5, text="Comparações (λ)")
             
-            if self.comparacao_taxas_data:
-                taxas, medias = self.comparacao_taxas_data
-                grafico_fila_vs_taxa_frame(tab5, taxas, medias)
+            if self.comparacao_resultados:
+                grafico_varrimento_frame(tab5, self.comparacao_resultados)
+                tk.Button(tab5, text="Nova Comparação", bg="#8ecae6",
+                          command=lambda: self._trigger_comparacao(win, tab5)).pack(pady=5)
             else:
-                tk.Label(tab5, text="O gráfico de comparação precisa de ser calculado (taxas 10 a 30).").pack(pady=10)
-                tk.Button(tab5, text="Calcular Comparação Lambda (10..30)", bg="#8ecae6", 
+                tk.Label(tab5, text="O gráfico de comparação precisa de ser calculado (grelha de λ, médicos, tempo e distribuição).").pack(pady=10)
+                tk.Button(tab5, text="Calcular Comparação", bg="#8ecae6", 
                           command=lambda: self._trigger_comparacao(win, tab5)).pack(pady=10)
 
     def _trigger_comparacao(self, graph_window, current_tab):
         graph_window.destroy() 
+        # Não bloqueia: o painel de gráficos reabre quando o varrimento terminar
         self.comparar_taxas()
-        self.abrir_graficos_abas() 
         
     def _comparar_taxas(self):
         # BLOQUEIO: É obrigatório carregar um dataset
         if not self.pacientes or len(self.pacientes) == 0:
             messagebox.showwarning("Aviso", "Não é possível comparar taxas. É **obrigatório** carregar um Dataset JSON válido (ficheiro de pacientes).")
             return
-            
-        taxas = list(range(10, 31, 5)); medias = []
-        
-        progresso = tk.Toplevel(self); progresso.title("A executar comparações...")
-        lb = tk.Label(progresso, text="A correr simulações para cada taxa, aguarda..."); lb.pack(padx=20, pady=15)
-        self.update()
+        if self.varrimento is not None and not self.varrimento.terminado.is_set():
+            messagebox.showinfo("Aviso", "Já existe uma comparação em curso.")
+            return
 
-        num_doctors = int(self.ent_medicos.get()); dist = self.cmb_dist.get(); tempo = float(self.ent_tempo.get()); duracao = int(self.ent_duracao.get())
-        
-        for taxa in taxas:
-            sim_temp = SimulacaoClinica(lambda_rate=taxa, num_doctors=num_doctors,
-                                        service_distribution=dist, mean_service_time=tempo,
-                                        simulation_time=duracao, pacientes=self.pacientes,
-                                        arrival_pattern="homogeneous",
-                                        doctor_specialties=self.doctor_specialties) 
-            sim_temp.run()
-            # Se a simulação correu, calcula a média da fila
-            if sim_temp.fila_sizes:
-                medias.append( sum(sim_temp.fila_sizes)/len(sim_temp.fila_sizes) )
+        win = tk.Toplevel(self); win.title("Comparação de Parâmetros")
+        campos = {
+            "lambda_rate": ("Taxas λ (pacientes/h):", "10:30:5", float),
+            "num_doctors": ("Nº médicos:", self.ent_medicos.get(), int),
+            "mean_service_time": ("Tempo médio (min):", self.ent_tempo.get(), float),
+            "service_distribution": ("Distribuições:", self.cmb_dist.get(), str),
+        }
+        entradas = {}
+        for row, (chave, (rotulo, valor, _)) in enumerate(campos.items()):
+            tk.Label(win, text=rotulo).grid(row=row, column=0, sticky="w", padx=5, pady=3)
+            ent = tk.Entry(win, width=24); ent.insert(0, valor); ent.grid(row=row, column=1, padx=5, pady=3)
+            entradas[chave] = ent
+        tk.Label(win, text="Valores separados por vírgulas; início:fim:passo para intervalos.", font=("Segoe UI", 8)).grid(row=4, column=0, columnspan=2)
+
+        barra = ttk.Progressbar(win, length=280, mode="determinate"); barra.grid(row=5, column=0, columnspan=2, padx=10, pady=(10, 2))
+        lbl = tk.Label(win, text=""); lbl.grid(row=6, column=0, columnspan=2)
+
+        def acompanhar():
+            v = self.varrimento
+            if not win.winfo_exists(): return
+            barra["value"] = v.concluidos; lbl.config(text=f"{v.concluidos}/{v.total} simulações concluídas")
+            if not v.terminado.is_set():
+                self.after(150, acompanhar); return
+            btn_iniciar.config(state=tk.NORMAL); btn_cancelar.config(state=tk.DISABLED)
+            if v.erro is not None:
+                messagebox.showerror("Erro", f"Erro durante a comparação: {v.erro}")
+            elif v.cancelado:
+                lbl.config(text=f"Comparação cancelada ({v.concluidos}/{v.total}).")
             else:
-                medias.append(0) 
-            
-        self.comparacao_taxas_data = (taxas, medias)
+                self.comparacao_resultados = v.tabela()
+                win.destroy()
+                messagebox.showinfo("Sucesso", "A comparação foi concluída e está pronta para ser exibida na aba 'Comparações (λ)'.")
+                if self.sim: self.abrir_graficos_abas()
 
-        progresso.destroy()
-        messagebox.showinfo("Sucesso", "A comparação de taxas foi concluída e está pronta para ser exibida na aba 'Comparações (λ)'.")
+        def iniciar():
+            try:
+                eixos = {chave: ler_valores(entradas[chave].get(), tipo) for chave, (_, _, tipo) in campos.items()}
+                duracao = int(self.ent_duracao.get())
+            except ValueError:
+                messagebox.showwarning("Aviso", "Insira valores válidos!", parent=win); return
+            if any(len(v) == 0 for v in eixos.values()) or any(d not in ("exponential", "normal", "uniform") for d in eixos["service_distribution"]):
+                messagebox.showwarning("Aviso", "Insira valores válidos!", parent=win); return
+
+            self._update_specialty_structure()
+            base = {"simulation_time": duracao, "arrival_pattern": "homogeneous", "doctor_specialties": self.doctor_specialties}
+            # Processos em "spawn": não herdam o estado do Tk
+            self.varrimento = Varrimento(base, self.pacientes, eixos, contexto="spawn").iniciar()
+            barra["maximum"] = self.varrimento.total; barra["value"] = 0
+            btn_iniciar.config(state=tk.DISABLED); btn_cancelar.config(state=tk.NORMAL)
+            acompanhar()
+
+        def cancelar():
+            if self.varrimento is not None: self.varrimento.cancelar()
+
+        def fechar():
+            cancelar(); win.destroy()
+
+        btn_iniciar = tk.Button(win, text="Iniciar", bg="#ffb703", command=iniciar); btn_iniciar.grid(row=7, column=0, sticky="we", padx=5, pady=8)
+        btn_cancelar = tk.Button(win, text="Cancelar", bg="#e63946", fg="white", state=tk.DISABLED, command=cancelar); btn_cancelar.grid(row=7, column=1, sticky="we", padx=5, pady=8)
+        win.protocol("WM_DELETE_WINDOW", fechar)
 
     def _on_close(self):
         if self.anim_after: self.after_cancel(self.anim_after)
+        if self.varrimento is not None: self.varrimento.cancelar()
+        self._fechar_executor()
         self.destroy()
@@ -1,7 +1,10 @@
 import argparse
+import contextlib
+import csv
 import json
 import os
-from interface import App
+import random
+import sys
 
 CONFIG_FILE = "config.json"
 
@@ -35,6 +38,11 @@ def parse_cli_arguments(config):
     """Analisa os argumentos da linha de comando e sobrescreve a configuração."""
     parser = argparse.ArgumentParser(description="Simulação de Clínica Médica.")
     
+    parser.add_argument('modo', nargs='?', choices=['gui', 'batch', 'replicas', 'capacidade', 'estimativa'], default='gui',
+                        help='gui (interface gráfica, por omissão), batch (sem interface, escreve as estatísticas), '
+                             'replicas (várias sementes em paralelo, com intervalos de confiança), '
+                             'capacidade (menor nº de médicos por especialidade que cumpre o SLA de espera) '
+                             'ou estimativa (fórmulas M/M/c ou M/G/c, sem simular nem carregar o dataset).')
     parser.add_argument('--lambda_rate', type=float, help='Taxa de chegada de pacientes por hora (λ).')
     parser.add_argument('--num_doctors', type=int, help='Número de médicos disponíveis.')
     parser.add_argument('--service_distribution', type=str, help='Distribuição do tempo de consulta.')
@@ -42,6 +50,21 @@ def parse_cli_arguments(config):
     parser.add_argument('--simulation_time', type=int, help='Duração total da simulação (minutos).')
     parser.add_argument('--arrival_pattern', type=str, help='Padrão de chegada (homogeneous ou nonhomogeneous).')
     parser.add_argument('--dataset_file', type=str, help='Caminho para o ficheiro JSON de pacientes.')
+    parser.add_argument('--seed', type=int, help='Semente do gerador aleatório.')
+    parser.add_argument('--stats_mode', choices=['auto', 'exact', 'online'],
+                        help='Estatísticas exatas (listas por paciente), online (acumuladores sem listas por paciente, p95 estimado) ou auto.')
+    parser.add_argument('--profile', nargs='?', const='fases', choices=['fases', 'cprofile', 'amostragem'],
+                        help='[batch] Instrumenta o run(): tempos por fase e contadores (fases, por omissão), '
+                             'mais cProfile ou amostragem da pilha; o resultado sai na chave "perfil".')
+    parser.add_argument('--limite', type=int, help='[batch] Número máximo de pacientes a carregar do dataset.')
+    parser.add_argument('--output', type=str, default='-', help='[batch] Ficheiro de saída ("-" para o stdout).')
+    parser.add_argument('--format', dest='output_format', choices=['json', 'csv'], default='json', help='[batch] Formato da saída.')
+    parser.add_argument('--replicacoes', type=int, default=10, help='[replicas] Número de replicações (sementes).')
+    parser.add_argument('--processos', type=int, help='[replicas/capacidade] Número de processos (por omissão, nº de CPUs).')
+    parser.add_argument('--sla', type=float, default=20.0,
+                        help='[capacidade] Espera máxima no percentil 95 (minutos); código de saída 2 se nenhuma alocação o cumprir.')
+    parser.add_argument('--podar_erlang', action='store_true',
+                        help='[capacidade] Não simula alocações abaixo do mínimo M/M/c conjunto (heurística, ver capacidade.py).')
 
     args, unknown = parser.parse_known_args() 
 
@@ -54,13 +77,170 @@ def parse_cli_arguments(config):
     if args.arrival_pattern is not None: final_config['arrival_pattern'] = args.arrival_pattern
     # Mantém o dataset file (necessário para o App)
     if args.dataset_file is not None: final_config['dataset_file'] = args.dataset_file 
+    if args.seed is not None: final_config['seed'] = args.seed
+    if args.stats_mode is not None: final_config['stats_mode'] = args.stats_mode
+    if args.limite is not None: final_config['limite'] = args.limite
+    if args.profile is not None: final_config['profile'] = args.profile
+
+    final_config['modo'] = args.modo
+    final_config['output'] = args.output
+    final_config['output_format'] = args.output_format
+    final_config['replicacoes'] = args.replicacoes
+    if args.processos is not None: final_config['processos'] = args.processos
+    final_config['sla'] = args.sla
+    if args.podar_erlang: final_config['podar_erlang'] = True
     
     return final_config
 
+def linhas_estatisticas(stats):
+    """Achata o dicionário de calcular_estatisticas em pares (métrica, valor) para CSV."""
+    linhas = []
+    for k, v in stats.items():
+        if k == "stats_por_medico":
+            for mid, m_stats in v.items():
+                for campo, valor in m_stats.items(): linhas.append((f"medico_{mid+1}.{campo}", valor))
+        elif isinstance(v, dict):
+            # Ex.: perfil (--profile) -> perfil.fases_s.ciclo_eventos
+            linhas.extend((f"{k}.{campo}", valor) for campo, valor in linhas_estatisticas(v))
+        elif isinstance(v, list):
+            linhas.append((k, json.dumps(v, ensure_ascii=False)))
+        else:
+            linhas.append((k, v))
+    return linhas
+
+def escrever_estatisticas(stats, destino, formato="json"):
+    if formato == "csv":
+        writer = csv.writer(destino)
+        writer.writerow(["metrica", "valor"])
+        writer.writerows(linhas_estatisticas(stats))
+    else:
+        json.dump(stats, destino, ensure_ascii=False, indent=2)
+        destino.write("\n")
+
+def escrever_replicacoes(resultado, destino, formato="json"):
+    if formato == "csv":
+        writer = csv.writer(destino)
+        writer.writerow(["metrica", "media", "desvio_padrao", "ic95_inf", "ic95_sup"])
+        for nome, m in resultado["metricas"].items():
+            writer.writerow([nome, m["media"], m["desvio_padrao"], m["ic95"][0], m["ic95"][1]])
+    else:
+        json.dump(resultado, destino, ensure_ascii=False, indent=2)
+        destino.write("\n")
+
+def executar_batch(config):
+    """Corre uma simulação sem interface gráfica e devolve as estatísticas."""
+    # Só o motor: não importa tkinter nem matplotlib
+    from simulacao import SimulacaoClinica, carregar_pacientes_json, calcular_estatisticas, PARAMETROS_SIMULACAO
+
+    # A amostra/ordem dos pacientes também depende da semente (random do carregamento)
+    if config.get("seed") is not None: random.seed(config["seed"])
+    pacientes = carregar_pacientes_json(config["dataset_file"], limite=config.get("limite"), colunar=True)
+    if not pacientes:
+        print("❌ Simulação abortada: Sem pacientes carregados. Verifique o dataset.")
+        return None
+
+    params = {k: config[k] for k in PARAMETROS_SIMULACAO if k in config}
+    sim = SimulacaoClinica(pacientes=pacientes, record_events=False, profile=config.get("profile"), **params)
+    resultado = sim.run()
+    stats = calcular_estatisticas(sim)
+    if sim.perfil is not None and resultado is not None:
+        stats["perfil"] = perfil = resultado["perfil"]; c = perfil["contadores"]
+        print("⏱️ " + " | ".join(f"{fase} {t:.3f} s" for fase, t in perfil["fases_s"].items()))
+        print(f"⏱️ {c['eventos']} eventos ({c['eventos_por_s'] or 0:,.0f}/s no ciclo), heap máx. {c['heap_max']}, "
+              f"fila máx. {c['fila_total_max']}")
+    return stats
+
+def executar_estimativa(config):
+    """Estimativa analítica instantânea (Erlang-C / Allen–Cunneen), com as mesmas chaves do modo batch."""
+    from simulacao import PARAMETROS_SIMULACAO
+    from analitico import estimar_estatisticas
+
+    params = {k: config[k] for k in PARAMETROS_SIMULACAO if k in config}
+    try:
+        stats = estimar_estatisticas(num_pacientes=config.get("limite"), **params)
+    except ValueError as e:
+        print(f"❌ Estimativa impossível: {e}"); return None
+    if not stats["aplicavel"]:
+        print("⚠️ Chegadas não homogéneas ou médicos especialistas: a estimativa é apenas indicativa.")
+    return stats
+
+def executar_replicacoes(config):
+    """Corre config['replicacoes'] sementes da mesma configuração num pool de processos."""
+    from simulacao import carregar_pacientes_json
+    from replicacoes import correr_replicacoes
+
+    # A amostra/ordem dos pacientes também depende da semente (random do carregamento)
+    if config.get("seed") is not None: random.seed(config["seed"])
+    pacientes = carregar_pacientes_json(config["dataset_file"], limite=config.get("limite"), colunar=True)
+    if not pacientes:
+        print("❌ Simulação abortada: Sem pacientes carregados. Verifique o dataset.")
+        return None
+    return correr_replicacoes(config, pacientes, n_replicacoes=config.get("replicacoes", 10),
+                             seed_base=config.get("seed") or 0, processos=config.get("processos"))
+
+def executar_capacidade(config):
+    """Procura a alocação de médicos mais barata com p95 da espera <= config['sla']."""
+    from simulacao import carregar_pacientes_json
+    from capacidade import otimizar_capacidade
+
+    if config.get("seed") is not None: random.seed(config["seed"])
+    pacientes = carregar_pacientes_json(config["dataset_file"], limite=config.get("limite"), colunar=True)
+    if not pacientes:
+        print("❌ Simulação abortada: Sem pacientes carregados. Verifique o dataset.")
+        return None
+    resultado = otimizar_capacidade(config, pacientes, sla=config.get("sla", 20.0),
+                                    replicacoes=config.get("replicacoes", 10), seed_base=config.get("seed") or 0,
+                                    processos=config.get("processos"), podar_erlang=config.get("podar_erlang", False))
+    p95 = f"{resultado['p95_espera']:.2f}" if resultado["p95_espera"] is not None else "?"
+    if resultado["viavel"]:
+        print(f"✅ {resultado['num_doctors']} médicos: {resultado['alocacao']} (p95 espera ≈ {p95} min)")
+    else:
+        print(f"⚠️ Nenhuma alocação cumpriu o SLA (p95 ≤ {resultado['sla_p95_espera']:g} min) em {resultado['iteracoes']} "
+              f"iterações; a última avaliada foi {resultado['num_doctors']} médicos: {resultado['alocacao']} (p95 espera ≈ {p95} min)")
+    return resultado
+
+def escrever_capacidade(resultado, destino, formato="json"):
+    if formato == "csv":
+        writer = csv.writer(destino)
+        writer.writerow(["especialidade", "medicos"])
+        writer.writerows(sorted(resultado["alocacao"].items()))
+    else:
+        json.dump(resultado, destino, ensure_ascii=False, indent=2)
+        destino.write("\n")
+
+def codigo_capacidade(resultado):
+    # 2 = nenhuma alocação cumpre o SLA (o resultado é escrito na mesma, com "viavel": false)
+    return 0 if resultado["viavel"] else 2
+
+def main_batch(config, executar=executar_batch, escrever=escrever_estatisticas, codigo_saida=None):
+    saida_stdout = config.get("output", "-") == "-"
+    # Mensagens de progresso vão para o stderr quando os resultados saem no stdout
+    with contextlib.redirect_stdout(sys.stderr) if saida_stdout else contextlib.nullcontext():
+        stats = executar(config)
+    if stats is None: return 1
+
+    if saida_stdout:
+        escrever(stats, sys.stdout, config.get("output_format", "json"))
+    else:
+        with open(config["output"], "w", encoding="utf-8", newline="") as f:
+            escrever(stats, f, config.get("output_format", "json"))
+        print(f"✅ Estatísticas gravadas em {config['output']}")
+    return codigo_saida(stats) if codigo_saida is not None else 0
+
 if __name__ == "__main__":
-    initial_config = load_initial_config()
+    with contextlib.redirect_stdout(sys.stderr):
+        initial_config = load_initial_config()
     final_config = parse_cli_arguments(initial_config)
-    
+
+    if final_config["modo"] == "batch":
+        sys.exit(main_batch(final_config))
+    if final_config["modo"] == "replicas":
+        sys.exit(main_batch(final_config, executar_replicacoes, escrever_replicacoes))
+    if final_config["modo"] == "capacidade":
+        sys.exit(main_batch(final_config, executar_capacidade, escrever_capacidade, codigo_capacidade))
+    if final_config["modo"] == "estimativa":
+        sys.exit(main_batch(final_config, executar_estimativa))
+
     from interface import App 
     app = App(initial_params=final_config)
     app.update() 
@@ -0,0 +1,170 @@
+import unicodedata
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from simulacao import ArmazemPacientes
+
+# Alfabeto dos nomes normalizados: 0 = fim do nome; letras sem acentos, dígitos, espaço e "?" (outros)
+ALFABETO = " abcdefghijklmnopqrstuvwxyz0123456789?"
+_OUTRO = len(ALFABETO)
+_BASE = len(ALFABETO) + 1  # 39^3 trigramas cabem em uint16 (ordenação radix)
+_LIMITE_TABELA = 0x250      # Latim básico e estendido; o resto conta como "outro"
+BLOCO_INDICE = 100_000
+
+def _tabela_normalizacao() -> Tuple[np.ndarray, np.ndarray]:
+    """Código Unicode -> símbolo do ALFABETO (minúsculas, sem acentos) e símbolo -> byte ASCII."""
+    tabela = np.full(_LIMITE_TABELA, _OUTRO, dtype=np.uint8); tabela[0] = 0
+    for cp in range(1, _LIMITE_TABELA):
+        base = unicodedata.normalize("NFD", chr(cp).lower())[:1]
+        if base and base in ALFABETO: tabela[cp] = ALFABETO.index(base) + 1
+        elif chr(cp).isspace(): tabela[cp] = 1
+    ascii_ = np.frombuffer(b"\0" + ALFABETO.encode("ascii"), dtype=np.uint8)
+    return tabela, ascii_
+
+_TABELA, _ASCII = _tabela_normalizacao()
+
+def _simbolos(textos) -> np.ndarray:
+    """Matriz (n, comprimento) de símbolos do ALFABETO; 0 depois do fim de cada texto."""
+    arr = np.asarray(textos, dtype=str)
+    if arr.size == 0 or arr.dtype.itemsize == 0: return np.zeros((arr.size, 0), dtype=np.uint8)
+    cps = arr.reshape(-1).view(np.uint32).reshape(arr.size, -1)
+    return _TABELA[np.minimum(cps, _LIMITE_TABELA - 1)] if cps.size else cps.astype(np.uint8)
+
+def _bytes(simbolos: np.ndarray, largura: int) -> np.ndarray:
+    # Matriz de símbolos -> array de bytes ASCII de largura fixa (numpy "S")
+    mat = np.zeros((simbolos.shape[0], max(largura, 1)), dtype=np.uint8)
+    mat[:, :simbolos.shape[1]] = _ASCII[simbolos]
+    return mat.view(f"S{mat.shape[1]}").reshape(-1)
+
+def normalizar(textos) -> np.ndarray:
+    """Textos em bytes ASCII minúsculos e sem acentos ("João" -> b"joao"), para comparação por substring."""
+    simbolos = _simbolos(textos)
+    return _bytes(simbolos, simbolos.shape[1])
+
+def _trigramas(simbolos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(chave, linha) de cada trigrama completo; chave < 39^3 em uint16."""
+    if simbolos.shape[1] < 3: return np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.int64)
+    s = simbolos.astype(np.uint16)
+    chaves = (s[:, :-2] * _BASE + s[:, 1:-1]) * _BASE + s[:, 2:]
+    validos = simbolos[:, 2:] != 0  # o 0 só aparece depois do fim do texto
+    linhas, _ = np.nonzero(validos)
+    return chaves[validos], linhas
+
+def intervalo_idades(texto: str) -> Optional[Tuple[int, int]]:
+    """"30" -> (30, 30), "30-40" -> (30, 40), "65-" -> (65, máx.), "-12" -> (0, 12); "" -> None."""
+    texto = texto.strip()
+    if not texto: return None
+    if "-" not in texto: return int(texto), int(texto)
+    ini, fim = (t.strip() for t in texto.split("-", 1))
+    return int(ini) if ini else 0, int(fim) if fim else np.iinfo(np.int16).max
+
+class _IndiceTrigramas:
+    """Índice invertido trigrama -> linhas sobre textos normalizados, construído por blocos de textos."""
+
+    def __init__(self, blocos):
+        blocos_simbolos = []; chaves = []; linhas = []; ini = 0
+        for bloco in blocos:
+            simbolos = _simbolos(bloco)
+            blocos_simbolos.append(simbolos)
+            k, l = _trigramas(simbolos)
+            chaves.append(k); linhas.append((l + ini).astype(np.int32)); ini += simbolos.shape[0]
+        largura = max((b.shape[1] for b in blocos_simbolos), default=0)
+        self.normalizados = np.concatenate(
+            [_bytes(b, largura) for b in blocos_simbolos]) if blocos_simbolos else np.zeros(0, dtype="S1")
+
+        chaves = np.concatenate(chaves) if chaves else np.empty(0, dtype=np.uint16)
+        linhas = np.concatenate(linhas) if linhas else np.empty(0, dtype=np.int32)
+        # Ordenação estável: dentro de cada trigrama as linhas ficam por ordem crescente
+        ordem = np.argsort(chaves, kind="stable")
+        chaves = chaves[ordem]; linhas = linhas[ordem]; del ordem
+        unicos = np.ones(chaves.size, dtype=bool)
+        unicos[1:] = (chaves[1:] != chaves[:-1]) | (linhas[1:] != linhas[:-1])
+        chaves = chaves[unicos]; self._listas = linhas[unicos]
+        self._inicio = np.zeros(_BASE ** 3 + 1, dtype=np.int64)
+        np.cumsum(np.bincount(chaves, minlength=_BASE ** 3), out=self._inicio[1:])
+
+    def candidatos(self, simbolos: np.ndarray) -> Optional[np.ndarray]:
+        """Interseção das listas dos trigramas da consulta (da mais curta para a mais longa); None se < 3 caracteres."""
+        chaves, _ = _trigramas(simbolos)
+        if chaves.size == 0: return None
+        candidatos = None
+        listas = (self._listas[self._inicio[k]:self._inicio[k + 1]] for k in np.unique(chaves).tolist())
+        for lista in sorted(listas, key=len):
+            candidatos = lista if candidatos is None else np.intersect1d(candidatos, lista, assume_unique=True)
+            if candidatos.size == 0: break
+        return candidatos
+
+class IndicePacientes:
+    """Índice de pesquisa sobre um ArmazemPacientes, construído uma vez por dataset.
+
+    - id -> linha: ids ordenados + busca binária;
+    - nomes e CC/BI: índices invertidos de trigramas dos textos normalizados; os candidatos da
+      interseção são confirmados por substring (sem criar objetos Paciente);
+    - sexo, distrito e idade: máscaras vetorizadas sobre as colunas de códigos do armazém."""
+
+    def __init__(self, pacientes):
+        if not isinstance(pacientes, ArmazemPacientes):
+            pacientes = ArmazemPacientes.de_registos((i, p.__dict__) for i, p in enumerate(pacientes))
+        self.armazem = pacientes
+        n = len(pacientes)
+
+        ids = np.char.lower(np.asarray(pacientes.ids, dtype=str)) if n else np.empty(0, dtype=str)
+        self.ids_minusculos = ids
+        self._ordem_ids = np.argsort(ids, kind="stable")
+        self._ids_ordenados = ids[self._ordem_ids]
+        self._trigramas_ids = _IndiceTrigramas(ids[ini:ini + BLOCO_INDICE] for ini in range(0, n, BLOCO_INDICE))
+
+        # Nomes normalizados e trigramas, por blocos (limita a memória temporária em datasets grandes)
+        self._trigramas_nomes = _IndiceTrigramas(pacientes.nomes[ini:ini + BLOCO_INDICE] for ini in range(0, n, BLOCO_INDICE))
+        self.nomes_normalizados = self._trigramas_nomes.normalizados
+
+    def __len__(self):
+        return len(self.armazem)
+
+    def linha(self, id_paciente: str) -> Optional[int]:
+        """Linha do paciente com este CC/BI (o primeiro, se houver repetidos) ou None."""
+        chave = str(id_paciente).lower()
+        k = int(np.searchsorted(self._ids_ordenados, chave, side="left"))
+        if k < self._ids_ordenados.size and self._ids_ordenados[k] == chave: return int(self._ordem_ids[k])
+        return None
+
+    def _codigos(self, coluna: str, valor: str) -> List[int]:
+        valor = valor.lower()
+        return [c for c, v in enumerate(self.armazem.tabelas[coluna].valores) if v is not None and str(v).lower() == valor]
+
+    def valores(self, coluna: str) -> List[str]:
+        """Valores distintos de uma coluna de códigos (ex.: "distritos"), para listas de filtro."""
+        return sorted(str(v) for v in self.armazem.tabelas[coluna].valores if v is not None)
+
+    def pesquisar(self, nome: str = "", id_cc: str = "", sexo: str = "",
+                  idades: Optional[Tuple[int, int]] = None, distrito: str = "") -> np.ndarray:
+        """Linhas (por ordem do dataset) que cumprem todos os filtros indicados; filtros vazios são ignorados.
+
+        O nome é procurado por substring sem distinguir maiúsculas nem acentos, o CC/BI por substring
+        sem distinguir maiúsculas, a idade num intervalo fechado (ver intervalo_idades) e o sexo e o
+        distrito por igualdade."""
+        arm = self.armazem
+        mascara = None
+        for m in ((np.isin(arm.sexos, self._codigos("sexos", sexo)) if sexo else None),
+                  (np.isin(arm.distritos, self._codigos("distritos", distrito)) if distrito else None),
+                  ((np.asarray(arm.idades) >= idades[0]) & (np.asarray(arm.idades) <= idades[1]) if idades is not None else None)):
+            if m is not None: mascara = m if mascara is None else mascara & m
+
+        simbolos = _simbolos([nome.strip()])
+        consulta = _bytes(simbolos, simbolos.shape[1])[0]
+        id_cc = id_cc.strip().lower()
+        candidatos = None
+        for indice, texto, ativo in ((self._trigramas_ids, id_cc, bool(id_cc)), (self._trigramas_nomes, nome.strip(), bool(consulta))):
+            if not ativo: continue
+            lista = indice.candidatos(_simbolos([texto]))
+            if lista is not None:
+                candidatos = lista if candidatos is None else np.intersect1d(candidatos, lista, assume_unique=True)
+        if candidatos is None:
+            candidatos = np.flatnonzero(mascara) if mascara is not None else np.arange(len(self))
+        elif mascara is not None:
+            candidatos = candidatos[mascara[candidatos]]
+        # Os trigramas não garantem a ordem nem a contiguidade (e abaixo de 3 caracteres não filtram): confirma por substring
+        if id_cc: candidatos = candidatos[np.char.find(self.ids_minusculos[candidatos], id_cc) >= 0]
+        if consulta: candidatos = candidatos[np.char.find(self.nomes_normalizados[candidatos], consulta) >= 0]
+        return candidatos
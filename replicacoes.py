@@ -0,0 +1,225 @@
+import os
+import math
+import shutil
+import tempfile
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+from simulacao import SimulacaoClinica, ArmazemPacientes, calcular_estatisticas, PARAMETROS_SIMULACAO
+
+# Valores críticos da t de Student (bilateral, 95%) para 1..30 graus de liberdade
+_T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+def t_critico_95(gl: int) -> float:
+    if gl < 1: return float('nan')
+    if gl <= len(_T95): return _T95[gl - 1]
+    # Expansão de Cornish-Fisher em torno da normal (erro < 1e-3 para gl > 30)
+    z = 1.959964
+    return z + (z**3 + z) / (4 * gl) + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * gl**2)
+
+
+# --- WORKERS (dataset carregado uma vez por processo) ---
+
+_PACIENTES = None
+
+def _iniciar_worker(diretorio_armazem: Optional[str], pacientes, ordem: Optional[np.ndarray] = None):
+    global _PACIENTES
+    if not diretorio_armazem: _PACIENTES = pacientes; return
+    # O armazém colunar é mapeado em memória: todos os processos partilham as mesmas páginas
+    _PACIENTES = ArmazemPacientes.abrir(diretorio_armazem, mmap=True)
+    if ordem is not None: _PACIENTES = _PACIENTES.selecionar(ordem)
+
+def _correr_replicacao(params: Dict[str, Any], seed: int) -> Dict[str, float]:
+    sim = SimulacaoClinica(pacientes=_PACIENTES, seed=seed, record_events=False, **params)
+    sim.run()
+    stats = calcular_estatisticas(sim)
+    return {k: float(v) for k, v in stats.items() if isinstance(v, (int, float))}
+
+class PoolSimulacoes:
+    """Pool de processos com o dataset de pacientes partilhado pelos workers.
+
+    Um ArmazemPacientes já mapeado (ex.: a cache `<ficheiro>.cache/`) é aberto com mmap em cada
+    worker a partir do mesmo diretório, e só o vetor de ordem da vista segue para os workers.
+    Um armazém em memória é gravado uma vez num diretório temporário; uma lista de Paciente é
+    enviada uma vez por worker (nunca por tarefa)."""
+
+    def __init__(self, pacientes, processos: Optional[int] = None, contexto: Optional[str] = None):
+        self.processos = processos or os.cpu_count() or 1
+        self._tmp = None
+        if isinstance(pacientes, ArmazemPacientes) and pacientes.diretorio is not None:
+            initargs = (pacientes.diretorio, None, pacientes.ordem)
+        elif isinstance(pacientes, ArmazemPacientes):
+            self._tmp = tempfile.mkdtemp(prefix="sim_pacientes_")
+            pacientes.guardar(self._tmp)
+            initargs = (self._tmp, None)
+        else:
+            initargs = (None, pacientes)
+        # contexto="spawn" evita fazer fork de um processo com Tk ativo (GUI)
+        mp_ctx = multiprocessing.get_context(contexto) if contexto else None
+        self.executor = ProcessPoolExecutor(max_workers=self.processos, mp_context=mp_ctx,
+                                            initializer=_iniciar_worker, initargs=initargs)
+
+    def submeter(self, params: Dict[str, Any], seed: int):
+        return self.executor.submit(_correr_replicacao, params, seed)
+
+    def fechar(self, cancelar: bool = False, esperar: bool = True):
+        """Fecha o pool. Com esperar=False devolve logo: as tarefas já a correr acabam nos workers
+        e o diretório temporário é apagado numa thread de fundo quando estes saem."""
+        if not esperar:
+            self.executor.shutdown(wait=False, cancel_futures=cancelar)
+            threading.Thread(target=self.fechar, daemon=True).start(); return
+        self.executor.shutdown(wait=True, cancel_futures=cancelar)
+        if self._tmp: shutil.rmtree(self._tmp, ignore_errors=True); self._tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar(cancelar=exc[0] is not None)
+
+
+# --- REPLICAÇÕES ---
+
+def parametros_simulacao(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Parâmetros de SimulacaoClinica presentes na configuração (sem a semente)."""
+    return {k: config[k] for k in PARAMETROS_SIMULACAO if k in config and k != "seed"}
+
+def agregar_replicacoes(resultados: List[Dict[str, float]]) -> Dict[str, Dict[str, Any]]:
+    """Média, desvio padrão e intervalo de confiança a 95% (t de Student) de cada métrica."""
+    agregado = {}
+    n = len(resultados)
+    if n == 0: return agregado
+    for chave in resultados[0]:
+        valores = np.array([r[chave] for r in resultados], dtype=float)
+        media = float(np.mean(valores))
+        desvio = float(np.std(valores, ddof=1)) if n > 1 else 0.0
+        meia_largura = t_critico_95(n - 1) * desvio / math.sqrt(n) if n > 1 else float('nan')
+        agregado[chave] = {"media": media, "desvio_padrao": desvio,
+                           "ic95": [media - meia_largura, media + meia_largura], "valores": valores.tolist()}
+    return agregado
+
+def correr_replicacoes(config: Dict[str, Any], pacientes, n_replicacoes: int = 10,
+                       seed_base: int = 0, processos: Optional[int] = None,
+                       pool: Optional[PoolSimulacoes] = None) -> Dict[str, Any]:
+    """Corre n_replicacoes da mesma configuração (sementes seed_base, seed_base+1, ...) em paralelo."""
+    params = parametros_simulacao(config)
+    seeds = [seed_base + i for i in range(n_replicacoes)]
+
+    if pool is None and (processos == 1 or n_replicacoes <= 1):
+        _iniciar_worker(None, pacientes)
+        resultados = [_correr_replicacao(params, s) for s in seeds]
+    elif pool is not None:
+        resultados = [f.result() for f in [pool.submeter(params, s) for s in seeds]]
+    else:
+        with PoolSimulacoes(pacientes, processos=min(processos or os.cpu_count() or 1, n_replicacoes)) as p:
+            resultados = [f.result() for f in [p.submeter(params, s) for s in seeds]]
+
+    return {"n_replicacoes": n_replicacoes, "seeds": seeds, "metricas": agregar_replicacoes(resultados)}
+
+
+# --- VARRIMENTO DE PARÂMETROS ---
+
+def grelha_parametros(config_base: Dict[str, Any], eixos: Dict[str, list]) -> List[Dict[str, Any]]:
+    """Produto cartesiano dos eixos (ex.: lambda_rate, num_doctors, mean_service_time,
+    service_distribution) sobre os parâmetros da configuração base."""
+    base = parametros_simulacao(config_base)
+    nomes = list(eixos)
+    pontos = []
+    for valores in itertools.product(*(eixos[n] for n in nomes)):
+        ponto = dict(base); ponto.update(zip(nomes, valores))
+        pontos.append(ponto)
+    return pontos
+
+class Varrimento:
+    """Corre uma grelha de parâmetros num pool de processos, sem bloquear quem o lança.
+
+    iniciar() devolve logo; o progresso fica em concluidos/total (e em ao_progresso, chamado
+    na thread de fundo), os resultados em `resultados` (uma linha por ponto: eixos + semente + métricas).
+
+    Sementes: o ponto i corre com seed + i, e os pontos são independentes. Com sementes_comuns=True
+    todos correm com a mesma seed (números aleatórios comuns). As diferenças entre pontos ficam
+    menos ruidosas, mas os resultados dos pontos ficam correlacionados. Sem seed cada ponto tira
+    uma semente nova (independentes, não reprodutíveis)."""
+
+    PERIODO_CANCELAMENTO = 0.1  # segundos entre verificações do pedido de cancelamento
+
+    def __init__(self, config_base: Dict[str, Any], pacientes, eixos: Dict[str, list],
+                 seed: Optional[int] = None, processos: Optional[int] = None, contexto: Optional[str] = None,
+                 ao_progresso: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+                 sementes_comuns: bool = False):
+        self.eixos = eixos
+        self.pontos = grelha_parametros(config_base, eixos)
+        self.pacientes = pacientes
+        self.seed = seed; self.sementes_comuns = sementes_comuns
+        self.processos = min(processos or os.cpu_count() or 1, max(1, len(self.pontos)))
+        self.contexto = contexto
+        self.ao_progresso = ao_progresso
+
+        self.total = len(self.pontos)
+        self.concluidos = 0
+        self.resultados: List[Dict[str, Any]] = []
+        self.erro: Optional[BaseException] = None
+        self.terminado = threading.Event()
+        self._cancelado = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def cancelado(self) -> bool:
+        return self._cancelado.is_set()
+
+    def iniciar(self) -> "Varrimento":
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancelar(self):
+        # Os pontos ainda em fila são descartados; os que já correm terminam nos workers e são
+        # ignorados. terminado fica ativo até PERIODO_CANCELAMENTO depois, sem esperar por eles.
+        self._cancelado.set()
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        return self.terminado.wait(timeout)
+
+    def semente(self, i: int) -> Optional[int]:
+        """Semente do ponto i da grelha."""
+        if self.seed is None or self.sementes_comuns: return self.seed
+        return self.seed + i
+
+    def tabela(self) -> List[Dict[str, Any]]:
+        """Resultados pela ordem da grelha."""
+        with self._lock:
+            return sorted(self.resultados, key=lambda linha: linha["ponto"])
+
+    def _executar(self):
+        pool = None
+        try:
+            pool = PoolSimulacoes(self.pacientes, processos=self.processos, contexto=self.contexto)
+            futuros = {pool.submeter(params, self.semente(i)): i for i, params in enumerate(self.pontos)}
+            pendentes = set(futuros)
+            # wait() com timeout em vez de as_completed: o cancelamento é visto mesmo sem pontos a terminar
+            while pendentes and not self._cancelado.is_set():
+                feitos, pendentes = wait(pendentes, timeout=self.PERIODO_CANCELAMENTO, return_when=FIRST_COMPLETED)
+                for futuro in sorted(feitos, key=futuros.get):
+                    if self._cancelado.is_set(): break
+                    i = futuros[futuro]
+                    linha = {"ponto": i}
+                    linha.update({nome: self.pontos[i][nome] for nome in self.eixos})
+                    linha["seed"] = self.semente(i)
+                    linha.update(futuro.result())
+                    with self._lock:
+                        self.resultados.append(linha); self.concluidos += 1
+                    if self.ao_progresso: self.ao_progresso(self.concluidos, self.total, linha)
+        except BaseException as e:
+            self.erro = e
+        finally:
+            # Cancelado (ou com erro) não espera pelos pontos que ainda correm nos workers
+            if pool is not None: pool.fechar(cancelar=True, esperar=self.erro is None and not self._cancelado.is_set())
+            self.terminado.set()
@@ -1,10 +1,21 @@
 import os
+import sys
+import time
 import json
+import hashlib
+import shutil
 import random
 import numpy as np
 import heapq
 import itertools
 import math
+import cProfile
+import pstats
+import queue
+import threading
+from array import array
+from bisect import bisect_right
+from collections import deque
 from typing import List, Dict, Any, Optional, Tuple
 
 # --- CONSTANTES GLOBAIS ---
@@ -24,6 +35,89 @@ DOENCA_TO_ESP = {
 
 # --- UTILS E CÁLCULOS ---
 
+class TabelaCodigos:
+    """Tabela de internamento string <-> código inteiro (doenças, especialidades, notas...)."""
+
+    def __init__(self, valores=()):
+        self.valores: List[str] = []
+        self._codigos: Dict[str, int] = {}
+        for v in valores: self.codigo(v)
+
+    def codigo(self, valor: str) -> int:
+        cod = self._codigos.get(valor)
+        if cod is None:
+            cod = len(self.valores)
+            self._codigos[valor] = cod; self.valores.append(valor)
+        return cod
+
+    def get(self, valor: str, default: int = -1) -> int:
+        return self._codigos.get(valor, default)
+
+    def valor(self, codigo: int) -> str:
+        return self.valores[codigo]
+
+    def __len__(self):
+        return len(self.valores)
+
+# Especialidades: conjunto pequeno e partilhado (o motor compara códigos de pacientes e de médicos)
+ESPECIALIDADES = TabelaCodigos([FALLBACK_ESP] + sorted(set(DOENCA_TO_ESP.values()) - {FALLBACK_ESP}))
+
+def detectar_doenca_e_prioridade(p: Dict[str, Any]) -> Tuple[str, str, str]:
+    doenca = None; prioridade = "normal"; prioridade_motivo = []; nota_clinica = []
+
+    if isinstance(p, dict):
+        doenca = p.get("doenca", p.get("descrição")); 
+        if isinstance(doenca, str): doenca = doenca.lower()
+        
+        # 1. Notas Clínicas/Alertas (sem implicar urgência na fila)
+        if str(p.get('religiao', '')).lower() == 'testemunhas de jeová': nota_clinica.append("Restrição de Transfusão de Sangue")
+        if str((p.get('atributos') or {}).get('fumador')).lower() == 'true': nota_clinica.append("Alerta: Fumador")
+
+        # Prioridade de fila é sempre 'normal'
+        prioridade = "normal"
+
+        if doenca is None or not doenca:
+            doenca = "virose"
+
+    else: doenca = "virose"
+
+    if doenca is None or not doenca: doenca = "virose"
+    
+    # O motivo clínico agora é uma lista concisa de notas
+    motivo_str = f"{', '.join(prioridade_motivo + nota_clinica)}" if prioridade_motivo or nota_clinica else "Sem Nota Clínica"
+        
+    return doenca.lower(), prioridade, motivo_str
+
+def doenca_para_especialidade(doenca: str) -> str:
+    if doenca in DOENCA_TO_ESP: return DOENCA_TO_ESP[doenca]
+    if "cardio" in doenca or "angina" in doenca or "hipertens" in doenca or "arritm" in doenca: return "cardiologia"
+    if "pneumo" in doenca or "asma" in doenca or "bronq" in doenca: return "pneumologia"
+    if "diabet" in doenca or "endocrinologia" in doenca: return "endocrinologia"
+    if "fract" in doenca or "queda" in doenca or "ortop" in doenca: return "ortopedia"
+    if "otit" in doenca or "rinite" in doenca or "otorr" in doenca: return "otorrino"
+    if "geriatria" in doenca: return "geriatria"
+    return FALLBACK_ESP
+
+class TabelasTriagem:
+    """Tabelas de triagem de um dataset: doenças e notas clínicas internadas (códigos locais ao dataset)
+    e a especialidade de cada doença já vista (código de ESPECIALIDADES).
+
+    Vivem com o dataset (ArmazemPacientes.tabelas_triagem, ou partilhadas pelos Paciente de uma lista)
+    e são libertadas com ele."""
+
+    def __init__(self, doencas=(), notas=()):
+        self.doencas = TabelaCodigos(doencas)
+        self.notas = TabelaCodigos(notas)
+        # Especialidade por código de doença: a cadeia de testes de doenca_para_especialidade corre uma vez por doença
+        self._especialidades = [ESPECIALIDADES.codigo(doenca_para_especialidade(d)) for d in self.doencas.valores]
+
+    def triar(self, p: Dict[str, Any]) -> Tuple[int, int, int]:
+        """Triagem de um paciente em códigos inteiros: (doença, especialidade, nota clínica)."""
+        doenca, _, motivo_str = detectar_doenca_e_prioridade(p)
+        cod = self.doencas.codigo(doenca)
+        if cod == len(self._especialidades): self._especialidades.append(ESPECIALIDADES.codigo(doenca_para_especialidade(doenca)))
+        return cod, self._especialidades[cod], self.notas.codigo(motivo_str)
+
 class Paciente:
     def __init__(self, id: str, nome: str, idade: Optional[int] = None,
                  profissao: Optional[str] = None, prioridade: str = "normal", **kwargs):
@@ -38,58 +132,418 @@ class Paciente:
         self.atributos = kwargs.get('atributos')
         self.religiao = kwargs.get('religiao')
         self.desportos = kwargs.get('desportos')
+        # Tabelas dos códigos de triagem (as do dataset; um Paciente avulso cria as suas na primeira triagem)
+        self._tabelas_triagem: Optional[TabelasTriagem] = kwargs.get('tabelas_triagem')
+        self._triagem: Optional[Tuple[int, int, int]] = None
+
+    def triagem(self) -> Tuple[int, int, int]:
+        """(doença, especialidade, nota clínica) em códigos, memorizado até invalidar_triagem()."""
+        if self._triagem is None:
+            if self._tabelas_triagem is None: self._tabelas_triagem = TabelasTriagem()
+            self._triagem = self._tabelas_triagem.triar(self.__dict__)
+        return self._triagem
+
+    def nota_clinica(self) -> str:
+        self.triagem()
+        return self._tabelas_triagem.notas.valor(self._triagem[2])
+
+    def invalidar_triagem(self):
+        # Chamar depois de alterar descrição, religião ou atributos
+        self._triagem = None
         
     def __repr__(self):
         return f"{self.nome} ({self.prioridade})"
 
-def carregar_pacientes_json(ficheiro: str, limite: Optional[int] = None) -> List[Paciente]:
-    """Carrega todos os pacientes de um ficheiro JSON, procurando por 'id' ou 'cc'."""
+class ColunaOrdenada:
+    """Coluna vista através de um vetor de linhas: coluna[i] é dados[ordem[i]], sem copiar os dados.
+
+    Aceita os índices que o resto do código usa nas colunas (inteiro, slice, array de índices e
+    (linhas, coluna) nas triagens); np.asarray(coluna) copia só as linhas da vista."""
+
+    __slots__ = ("dados", "ordem")
+
+    def __init__(self, dados: np.ndarray, ordem: np.ndarray):
+        self.dados = dados; self.ordem = ordem
+
+    def __len__(self):
+        return len(self.ordem)
+
+    def __getitem__(self, i):
+        if isinstance(i, tuple): return self.dados[(self.ordem[i[0]],) + i[1:]]
+        return self.dados[self.ordem[i]]
+
+    def __array__(self, dtype=None, copy=None):
+        arr = np.asarray(self.dados[self.ordem])
+        return arr if dtype is None else arr.astype(dtype, copy=False)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (len(self.ordem),) + self.dados.shape[1:]
+
+    @property
+    def dtype(self):
+        return self.dados.dtype
+
+    def tolist(self) -> list:
+        return np.asarray(self).tolist()
+
+class ArmazemPacientes:
+    """Pacientes em colunas (arrays NumPy + strings internadas em TabelaCodigos).
+
+    Os objetos Paciente só são criados a pedido (armazem[i]); iterar devolve Paciente um a um.
+    Um armazém aberto com mmap guarda o diretório de origem; selecionar() sobre ele devolve uma
+    vista (colunas ColunaOrdenada sobre as mesmas páginas + o vetor `ordem` das linhas de base)."""
+
+    COLUNAS_CODIGO = ("sexos", "distritos", "profissoes", "religioes", "descricoes", "desportos")
+    COLUNAS = ("ids", "nomes", "idades", "fumador", "triagens") + COLUNAS_CODIGO
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=str)
+        self.nomes: List[str] = []
+        self.idades = np.empty(0, dtype=np.int16)  # -1 = desconhecida
+        self.fumador = np.empty(0, dtype=np.bool_)
+        # Códigos de triagem por linha: (doença, especialidade, nota clínica)
+        self.triagens = np.empty((0, 3), dtype=np.int32)
+        self.tabelas_triagem = TabelasTriagem()
+        self.tabelas: Dict[str, TabelaCodigos] = {}
+        for col in self.COLUNAS_CODIGO:
+            setattr(self, col, np.empty(0, dtype=np.int32)); self.tabelas[col] = TabelaCodigos()
+        # Diretório mapeado em memória (abrir com mmap=True) e linhas de base de uma vista (None = todas)
+        self.diretorio: Optional[str] = None
+        self.ordem: Optional[np.ndarray] = None
+
+    @classmethod
+    def de_registos(cls, registos, tabelas: Optional["ArmazemPacientes"] = None) -> "ArmazemPacientes":
+        """Constrói o armazém a partir de pares (índice original, dict do JSON).
+
+        Com `tabelas`, usa (e estende) as tabelas de códigos e de triagem desse armazém."""
+        arm = cls()
+        if tabelas is not None: arm.tabelas = tabelas.tabelas; arm.tabelas_triagem = tabelas.tabelas_triagem
+        tab = arm.tabelas
+        ids = []; nomes = arm.nomes; idades = array("h"); fumador = array("b"); triagens = array("i")
+        codigos = {col: array("i") for col in cls.COLUNAS_CODIGO}
+        for i, p in registos:
+            ids.append(str(p.get("id") or p.get("cc") or (i + 1)))
+            nomes.append(p.get("nome", f"Pessoa {i+1}"))
+            try: idade = int(p.get("idade"))
+            except (TypeError, ValueError): idade = -1
+            idades.append(idade if 0 <= idade < 32768 else -1)
+            morada = p.get("morada") or {}
+            desportos = p.get("desportos")
+            codigos["sexos"].append(tab["sexos"].codigo(p.get("sexo")))
+            codigos["distritos"].append(tab["distritos"].codigo(morada.get("distrito")))
+            codigos["profissoes"].append(tab["profissoes"].codigo(p.get("profissao")))
+            codigos["religioes"].append(tab["religioes"].codigo(p.get("religiao")))
+            codigos["descricoes"].append(tab["descricoes"].codigo(p.get("descrição")))
+            codigos["desportos"].append(tab["desportos"].codigo(tuple(desportos) if desportos is not None else None))
+            fumador.append(str((p.get("atributos") or {}).get("fumador")).lower() == "true")
+            triagens.extend(arm.tabelas_triagem.triar(p))
+        arm.ids = np.array(ids, dtype=str)
+        arm.idades = np.frombuffer(idades, dtype=np.int16).copy()
+        arm.fumador = np.frombuffer(fumador, dtype=np.int8).astype(np.bool_)
+        arm.triagens = np.frombuffer(triagens, dtype=np.int32).reshape(-1, 3).copy()
+        for col, vals in codigos.items():
+            setattr(arm, col, np.frombuffer(vals, dtype=np.int32).copy())
+        return arm
+
+    @classmethod
+    def gravar_registos(cls, registos, diretorio: str, extra: Optional[Dict[str, Any]] = None,
+                        bloco: int = 1 << 14) -> int:
+        """Grava os registos no formato de guardar() numa só passagem, um bloco de cada vez.
+
+        A memória fica limitada a `bloco` registos: cada bloco vai para um .npy parcial e no fim as
+        partes são copiadas para as colunas finais (mapeadas em memória). Devolve o nº de linhas."""
+        os.makedirs(diretorio, exist_ok=True)
+        tabelas = cls(); partes: Dict[str, List[str]] = {col: [] for col in cls.COLUNAS}; n = 0
+        registos = iter(registos)
+        while True:
+            parte = cls.de_registos(itertools.islice(registos, bloco), tabelas=tabelas)
+            if not len(parte): break
+            for col in cls.COLUNAS:
+                caminho = os.path.join(diretorio, f"{col}.parte{len(partes[col])}.npy")
+                np.save(caminho, np.asarray(getattr(parte, col), dtype=str if col == "nomes" else None))
+                partes[col].append(caminho)
+            n += len(parte)
+        for col, caminhos in partes.items():
+            final = os.path.join(diretorio, f"{col}.npy")
+            if not caminhos:
+                np.save(final, np.asarray(getattr(tabelas, col), dtype=str if col == "nomes" else None)); continue
+            blocos = [np.load(c, mmap_mode="r") for c in caminhos]
+            # As strings de cada bloco têm a largura do seu maior valor: a coluna final usa a maior
+            destino = np.lib.format.open_memmap(final, mode="w+", dtype=np.result_type(*blocos),
+                                                shape=(n,) + blocos[0].shape[1:])
+            ini = 0
+            for b in blocos: destino[ini:ini + len(b)] = b; ini += len(b)
+            destino.flush(); del destino, blocos
+            for c in caminhos: os.remove(c)
+        tabelas._gravar_meta(diretorio, n, extra)
+        return n
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice): return self.selecionar(np.arange(len(self))[i])
+        return self.paciente(int(i))
+
+    def __iter__(self):
+        for i in range(len(self)): yield self.paciente(i)
+
+    def valor(self, coluna: str, i: int):
+        return self.tabelas[coluna].valores[getattr(self, coluna)[i]]
+
+    def distrito(self, i: int) -> Optional[str]:
+        return self.tabelas["distritos"].valores[self.distritos[i]]
+
+    def nota_clinica(self, i: int) -> str:
+        return self.tabelas_triagem.notas.valores[self.triagens[i, 2]]
+
+    def paciente(self, i: int) -> Paciente:
+        idade = int(self.idades[i])
+        distrito = self.distrito(i)
+        desportos = self.valor("desportos", i)
+        p = Paciente(id=str(self.ids[i]), nome=self.nomes[i], idade=None if idade < 0 else idade,
+                     profissao=self.valor("profissoes", i), sexo=self.valor("sexos", i),
+                     morada={"distrito": distrito} if distrito else {},
+                     descrição=self.valor("descricoes", i), atributos={"fumador": bool(self.fumador[i])},
+                     religiao=self.valor("religioes", i), desportos=list(desportos) if desportos is not None else None,
+                     tabelas_triagem=self.tabelas_triagem)
+        p._triagem = tuple(int(x) for x in self.triagens[i])
+        return p
+
+    def guardar(self, diretorio: str, extra: Optional[Dict[str, Any]] = None):
+        """Grava as colunas em .npy (mapeáveis em memória) e as tabelas em meta.json."""
+        os.makedirs(diretorio, exist_ok=True)
+        for col in self.COLUNAS:
+            arr = np.asarray(getattr(self, col), dtype=str if col == "nomes" else None)
+            np.save(os.path.join(diretorio, f"{col}.npy"), np.ascontiguousarray(arr))
+        self._gravar_meta(diretorio, len(self), extra)
+
+    def _gravar_meta(self, diretorio: str, n: int, extra: Optional[Dict[str, Any]] = None):
+        meta = dict(extra or {})
+        meta["n"] = n
+        meta["tabelas"] = {col: t.valores for col, t in self.tabelas.items()}
+        # Doenças e notas são tabelas do dataset; as especialidades são remapeadas ao abrir (ESPECIALIDADES é do processo)
+        meta["triagem"] = [self.tabelas_triagem.doencas.valores, ESPECIALIDADES.valores, self.tabelas_triagem.notas.valores]
+        with open(os.path.join(diretorio, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def abrir(cls, diretorio: str, mmap: bool = True) -> "ArmazemPacientes":
+        """Abre um armazém gravado com guardar(); com mmap=True as colunas são partilhadas entre processos."""
+        with open(os.path.join(diretorio, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        modo = "r" if mmap else None
+        carregar = lambda nome: np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode=modo)
+        arm = cls()
+        if mmap: arm.diretorio = diretorio
+        for col in cls.COLUNAS: setattr(arm, col, carregar(col))
+        for col in cls.COLUNAS_CODIGO:
+            valores = meta["tabelas"][col]
+            if col == "desportos": valores = [tuple(v) if v is not None else None for v in valores]
+            arm.tabelas[col] = TabelaCodigos(valores)
+        doencas, especialidades, notas = meta["triagem"]
+        arm.tabelas_triagem = TabelasTriagem(doencas, notas)
+        mapa = np.array([ESPECIALIDADES.codigo(v) for v in especialidades], dtype=np.int32)
+        if not np.array_equal(mapa, np.arange(mapa.size)):
+            arm.triagens = np.array(arm.triagens)
+            if mapa.size: arm.triagens[:, 1] = mapa[arm.triagens[:, 1]]
+        return arm
+
+    def selecionar(self, indices) -> "ArmazemPacientes":
+        """Novo armazém só com as linhas indicadas (pela ordem dada); partilha as tabelas.
+
+        Sobre um armazém mapeado em memória devolve uma vista: nenhuma coluna é copiada."""
+        idx = np.asarray(indices, dtype=np.intp)
+        arm = ArmazemPacientes()
+        arm.tabelas = self.tabelas; arm.tabelas_triagem = self.tabelas_triagem
+        if self.diretorio is not None:
+            arm.diretorio = self.diretorio
+            arm.ordem = idx if self.ordem is None else self.ordem[idx]
+            for col in self.COLUNAS:
+                coluna = getattr(self, col)
+                setattr(arm, col, ColunaOrdenada(coluna.dados if isinstance(coluna, ColunaOrdenada) else coluna, arm.ordem))
+            return arm
+        arm.ids = self.ids[idx]; arm.nomes = [self.nomes[k] for k in idx.tolist()]
+        arm.idades = self.idades[idx]; arm.fumador = self.fumador[idx]; arm.triagens = self.triagens[idx]
+        for col in self.COLUNAS_CODIGO: setattr(arm, col, getattr(self, col)[idx])
+        return arm
+
+_NADA = object()  # marcador de "nenhum elemento descodificado" (null é um elemento válido)
+_CARACTERES_NUMERO = frozenset("0123456789.eE+-")
+
+def iterar_registos_json(ficheiro: str, tamanho_bloco: int = 1 << 20):
+    """Lê um array JSON de topo elemento a elemento, sem carregar o ficheiro inteiro em memória."""
+    decoder = json.JSONDecoder()
+    with open(ficheiro, "r", encoding="utf-8-sig") as f:
+        buf = ""; fim_ficheiro = False
+        while not buf.strip() and not fim_ficheiro:
+            mais = f.read(tamanho_bloco); fim_ficheiro = not mais; buf += mais
+        buf = buf.lstrip()
+        if not buf.startswith("["): raise ValueError("o ficheiro não contém um array JSON")
+        pos = 1
+        while True:
+            # Salta espaços e vírgulas entre elementos
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","): pos += 1
+            if pos < len(buf) and buf[pos] == "]": return
+            obj = _NADA
+            if pos < len(buf):
+                try:
+                    obj, fim = decoder.raw_decode(buf, pos)
+                    # Objetos, arrays, strings e literais fecham-se sozinhos; um número só está completo
+                    # se o carácter seguinte já estiver no buffer ("1." | "5", "1.5e" | "3"): senão lê mais
+                    if (not fim_ficheiro and buf[pos] in _CARACTERES_NUMERO
+                            and (fim == len(buf) or buf[fim] in _CARACTERES_NUMERO)):
+                        obj = _NADA
+                except json.JSONDecodeError:
+                    if fim_ficheiro: raise
+            if obj is not _NADA:
+                yield obj; pos = fim
+                continue
+            if fim_ficheiro: raise ValueError("array JSON incompleto")
+            mais = f.read(tamanho_bloco)
+            fim_ficheiro = not mais
+            buf = buf[pos:] + mais; pos = 0
+
+def _amostra_reservatorio(itens, k: int) -> list:
+    """Amostra aleatória uniforme de k itens numa só passagem (reservoir sampling, algoritmo R)."""
+    reservatorio = []
+    for n, item in enumerate(itens):
+        if n < k: reservatorio.append(item)
+        else:
+            j = random.randrange(n + 1)
+            if j < k: reservatorio[j] = item
+    return reservatorio
+
+def _paciente_de_registo(i: int, p: Dict[str, Any], tabelas_triagem: Optional[TabelasTriagem] = None) -> Paciente:
+    # Tenta obter ID de 'id' ou 'cc'
+    patient_id = p.get("id") or p.get("cc") or (i + 1)
+    return Paciente(
+        id=str(patient_id),
+        nome=p.get("nome", f"Pessoa {i+1}"),
+        idade=p.get("idade"),
+        profissao=p.get("profissao"),
+        prioridade="normal", 
+        sexo=p.get('sexo'),
+        morada=p.get('morada'),
+        descrição=p.get('descrição'),
+        atributos=p.get('atributos', {}),
+        religiao=p.get('religiao'),
+        desportos=p.get('desportos'),
+        tabelas_triagem=tabelas_triagem
+        )
+
+VERSAO_CACHE = 1
+
+def _chave_cache(ficheiro: str, amostra: int = 1 << 20) -> Dict[str, Any]:
+    """Identifica a versão do ficheiro: tamanho, mtime e hash do início e do fim do ficheiro."""
+    st = os.stat(ficheiro)
+    h = hashlib.sha1()
+    with open(ficheiro, "rb") as f:
+        h.update(f.read(amostra))
+        if st.st_size > amostra:
+            f.seek(max(amostra, st.st_size - amostra)); h.update(f.read(amostra))
+    return {"versao": VERSAO_CACHE, "tamanho": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": h.hexdigest()}
+
+def _abrir_cache(ficheiro: str) -> Optional[ArmazemPacientes]:
+    diretorio = ficheiro + ".cache"
+    try:
+        with open(os.path.join(diretorio, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        chave = _chave_cache(ficheiro)
+        if any(meta.get(k) != v for k, v in chave.items()): return None
+        return ArmazemPacientes.abrir(diretorio, mmap=True)
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _gravar_cache(ficheiro: str) -> Optional[ArmazemPacientes]:
+    """Constrói a cache colunar diretamente do stream do JSON (memória limitada a um bloco de
+    registos) e abre-a com mmap; None se não for possível gravá-la. Erros de leitura propagam."""
+    diretorio = ficheiro + ".cache"; tmp = f"{diretorio}.tmp{os.getpid()}"
+    try:
+        chave = _chave_cache(ficheiro)
+        registos = ((i, p) for i, p in enumerate(iterar_registos_json(ficheiro)) if not _e_medico(p))
+        ArmazemPacientes.gravar_registos(registos, tmp, extra=chave)
+        if os.path.isdir(diretorio): shutil.rmtree(diretorio)
+        os.replace(tmp, diretorio)
+    except OSError as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        print(f"⚠️ Não foi possível gravar a cache de {ficheiro}: {e}")
+        return None
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True); raise
+    return ArmazemPacientes.abrir(diretorio, mmap=True)
+
+def carregar_pacientes_json(ficheiro: str, limite: Optional[int] = None, colunar: bool = False,
+                            amostra_aleatoria: bool = True, usar_cache: bool = True):
+    """Carrega os pacientes de um ficheiro JSON (em streaming), procurando por 'id' ou 'cc'.
+
+    Com limite, amostra_aleatoria=True escolhe uma amostra uniforme numa só passagem
+    (memória limitada a `limite` registos); amostra_aleatoria=False pára de ler assim que
+    tem `limite` pacientes. Com colunar=True devolve um ArmazemPacientes em vez de uma lista.
+
+    No modo colunar (com usar_cache) o dataset completo fica gravado em `<ficheiro>.cache/`
+    (construída em streaming, com a memória limitada a um bloco de registos),
+    invalidado quando o tamanho, o mtime ou o hash do JSON mudam; as leituras seguintes
+    mapeiam as colunas em memória sem voltar a ler o JSON e devolvem uma vista (colunas
+    mapeadas + vetor de ordem) em vez de uma cópia."""
     if not os.path.exists(ficheiro):
         print(f"⚠️ Ficheiro {ficheiro} não encontrado. Retornando lista vazia.")
         return []
 
-    data = None
+    completo = None
+    if colunar and usar_cache and (limite is None or amostra_aleatoria):
+        try:
+            completo = _abrir_cache(ficheiro)
+            # Cache em falta: é construída numa passagem em streaming, mesmo com limite
+            if completo is None: completo = _gravar_cache(ficheiro)
+        except Exception as e:
+            print(f"⚠️ Erro ao ler {ficheiro}: {e}")
+            return []
+    if completo is not None:
+        # Amostra (ou permutação) vetorizada; a semente sai do `random` global, como nas leituras sem cache
+        rng = np.random.default_rng(random.getrandbits(64)); n = len(completo)
+        ordem = rng.permutation(n) if limite is None or limite >= n else rng.choice(n, limite, replace=False)
+        # Vista sobre as colunas mapeadas: nenhuma coluna é copiada
+        armazem = completo.selecionar(ordem)
+        print(f"✅ {len(armazem)} pacientes carregados de {ficheiro}")
+        return armazem
+
     try:
-        with open(ficheiro, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        registos = ((i, p) for i, p in enumerate(iterar_registos_json(ficheiro)) if not _e_medico(p))
+
+        if colunar and limite is None:
+            # Dataset completo: as colunas são construídas diretamente do stream e baralhadas depois
+            armazem = ArmazemPacientes.de_registos(registos)
+            ordem = list(range(len(armazem)))
+            random.shuffle(ordem)
+            armazem = armazem.selecionar(ordem)
+            print(f"✅ {len(armazem)} pacientes carregados de {ficheiro}")
+            return armazem
+
+        if limite is None: selecionados = list(registos)
+        elif amostra_aleatoria: selecionados = _amostra_reservatorio(registos, limite)
+        else: selecionados = list(itertools.islice(registos, limite))
     except Exception as e:
         print(f"⚠️ Erro ao ler {ficheiro}: {e}")
         return []
-    
-    if data is None:
-        return []
-
-    pacientes = []
-    for i, p in enumerate(data):
-        profissao = str(p.get("profissao", "")).lower()
-        is_doctor = "médico" in profissao or "medicina" in profissao
-        
-        # Tenta obter ID de 'id' ou 'cc'
-        patient_id = p.get("id") or p.get("cc") or (i + 1)
-        
-        if not is_doctor:
-            pacientes.append(Paciente(
-                id=str(patient_id),
-                nome=p.get("nome", f"Pessoa {i+1}"),
-                idade=p.get("idade"),
-                profissao=p.get("profissao"),
-                prioridade="normal", 
-                sexo=p.get('sexo'),
-                morada=p.get('morada'),
-                descrição=p.get('descrição'),
-                atributos=p.get('atributos', {}),
-                religiao=p.get('religiao'),
-                desportos=p.get('desportos')
-                ))
 
     # Importante: A ordem na lista define a ordem de chegada (e o limite de pacientes para simulação)
-    random.shuffle(pacientes)
-    if limite is not None:
-        pacientes = pacientes[:limite]
+    random.shuffle(selecionados)
+
+    if colunar:
+        pacientes = ArmazemPacientes.de_registos(selecionados)
+    else:
+        tabelas_triagem = TabelasTriagem()  # partilhadas pelos pacientes desta lista
+        pacientes = [_paciente_de_registo(i, p, tabelas_triagem) for i, p in selecionados]
 
     print(f"✅ {len(pacientes)} pacientes carregados de {ficheiro}")
     return pacientes
 
+def _e_medico(p: Dict[str, Any]) -> bool:
+    profissao = str(p.get("profissao", "")).lower()
+    return "médico" in profissao or "medicina" in profissao
+
 def gera_intervalo_tempo_chegada(taxa, rng: Optional[np.random.Generator] = None):
     if taxa <= 0: return float('inf')
     taxa_por_minuto = taxa / 60.0
@@ -100,25 +554,505 @@ def gera_tempo_consulta(media, distribuicao="exponential", rng: Optional[np.rand
     val = 0.0
     if distribuicao in ("exponential", "exponencial"):
         if rng is None: val = float(np.random.exponential(scale=media))
-        else: val = float(np.random.exponential(scale=media))
+        else: val = float(rng.exponential(scale=media))
     elif distribuicao == "normal":
         if rng is None: val = float(np.random.normal(loc=media, scale=0.2 * media))
-        else: val = float(np.random.normal(loc=media, scale=0.2 * media))
+        else: val = float(rng.normal(loc=media, scale=0.2 * media))
         val = max(0.1, val)
     elif distribuicao in ("uniform", "uniforme"):
         if rng is None: val = float(np.random.uniform(low=0.5 * media, high=1.5 * media))
-        else: val = float(np.random.uniform(low=0.5 * media, high=1.5 * media))
+        else: val = float(rng.uniform(low=0.5 * media, high=1.5 * media))
     else: raise ValueError("Distribuição inválida")
     return val
 
+class AmostradorServico:
+    """Tempos de consulta tirados do Generator da simulação em blocos pré-calculados.
+
+    Mesmas distribuições de gera_tempo_consulta; o bloco é reposto quando se esgota."""
+
+    def __init__(self, media: float, distribuicao: str = "exponential",
+                 rng: Optional[np.random.Generator] = None, bloco: int = 1024):
+        self.media = float(media)
+        self.distribuicao = distribuicao
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.bloco = max(1, int(bloco))
+        self._valores: List[float] = []
+        self._pos = 0
+
+    def _gerar_bloco(self) -> np.ndarray:
+        media = self.media; n = self.bloco
+        if self.distribuicao in ("exponential", "exponencial"):
+            return self.rng.exponential(scale=media, size=n)
+        if self.distribuicao == "normal":
+            return np.maximum(0.1, self.rng.normal(loc=media, scale=0.2 * media, size=n))
+        if self.distribuicao in ("uniform", "uniforme"):
+            return self.rng.uniform(low=0.5 * media, high=1.5 * media, size=n)
+        raise ValueError("Distribuição inválida")
+
+    def proximo(self) -> float:
+        if self._pos >= len(self._valores):
+            self._valores = self._gerar_bloco().tolist(); self._pos = 0
+        val = self._valores[self._pos]
+        self._pos += 1
+        return val
+
+class SerieTemporal:
+    """Função em escada (tempo -> valor) atualizada a cada evento da simulação."""
+
+    def __init__(self, valor_inicial: float = 0.0):
+        self.tempos: List[float] = [0.0]
+        self.valores: List[float] = [valor_inicial]
+
+    def registar(self, tempo: float, valor: float):
+        # Vários eventos no mesmo instante: fica o último valor
+        if tempo == self.tempos[-1]: self.valores[-1] = valor
+        elif valor != self.valores[-1]:
+            self.tempos.append(tempo); self.valores.append(valor)
+
+    def valor_em(self, instantes) -> np.ndarray:
+        """Valor da escada em cada instante (o último evento com tempo <= instante)."""
+        t = np.asarray(self.tempos, dtype=float)
+        idx = np.searchsorted(t, np.asarray(instantes, dtype=float), side="right") - 1
+        return np.asarray(self.valores)[np.clip(idx, 0, None)]
+
+    def amostrar(self, fim: float, passo: float = 1.0, inicio: float = 0.0) -> np.ndarray:
+        """Amostragem pontual em inicio, inicio+passo, ... (< fim). passo=1/60 dá resolução ao segundo."""
+        return self.valor_em(np.arange(inicio, fim, passo))
+
+    def _integral(self, instantes) -> np.ndarray:
+        t = np.asarray(self.tempos, dtype=float); v = np.asarray(self.valores, dtype=float)
+        acum = np.concatenate(([0.0], np.cumsum(v[:-1] * np.diff(t))))
+        x = np.asarray(instantes, dtype=float)
+        idx = np.clip(np.searchsorted(t, x, side="right") - 1, 0, None)
+        return acum[idx] + v[idx] * (x - t[idx])
+
+    def medias_ponderadas(self, fim: float, passo: float = 1.0, inicio: float = 0.0) -> np.ndarray:
+        """Média ponderada no tempo de cada intervalo [a, a+passo) entre inicio e fim."""
+        limites = np.append(np.arange(inicio, fim, passo), fim)
+        if limites.size < 2: return np.array([])
+        integ = self._integral(limites)
+        return np.diff(integ) / np.diff(limites)
+
+    def media_ponderada(self, fim: float, inicio: float = 0.0) -> float:
+        if fim <= inicio: return 0.0
+        a, b = self._integral([inicio, fim])
+        return float((b - a) / (fim - inicio))
+
+class SerieAmostradaOnline:
+    """Equivalente em memória constante de SerieTemporal.amostrar(fim, passo): guarda apenas o
+    número, a soma e o máximo das amostras em 0, passo, 2·passo, ... (< fim)."""
+
+    def __init__(self, valor_inicial: float, fim: float, passo: float = 1.0):
+        self.valor = valor_inicial; self.fim = float(fim); self.passo = passo
+        self._proxima = 0  # índice da próxima amostra ainda não contabilizada
+        self.n = 0; self.soma = 0.0; self.maximo = None
+
+    def _contabilizar_ate(self, tempo: float):
+        # As amostras em instantes < tempo ficam com o valor atual (o evento em 'tempo' ainda não conta)
+        limite = int(math.ceil(min(tempo, self.fim) / self.passo))
+        if limite > self._proxima:
+            cnt = limite - self._proxima
+            self.n += cnt; self.soma += self.valor * cnt; self._proxima = limite
+            if self.maximo is None or self.valor > self.maximo: self.maximo = self.valor
+
+    def registar(self, tempo: float, valor: float):
+        if valor == self.valor: return
+        self._contabilizar_ate(tempo); self.valor = valor
+
+    def fechar(self):
+        self._contabilizar_ate(self.fim)
+
+    def media(self) -> float:
+        return self.soma / self.n if self.n else 0.0
+
+class QuantilP2:
+    """Quantil p estimado em streaming pelo algoritmo P² (Jain & Chlamtac, 1985): 5 marcadores, O(1) por valor.
+
+    Os primeiros 'exatos' valores ficam guardados (quantil exato em amostras pequenas) e servem
+    para inicializar os marcadores."""
+
+    __slots__ = ("p", "n", "exatos", "_buffer", "_q", "_pos", "_incremento")
+
+    def __init__(self, p: float, exatos: int = 256):
+        self.p = p; self.n = 0; self.exatos = max(5, exatos)
+        self._buffer: Optional[List[float]] = []
+        self._q: List[float] = []; self._pos: List[int] = []
+        self._incremento = [0.0, p / 2.0, p, (1.0 + p) / 2.0, 1.0]
+
+    def _inicializar(self):
+        # Marcadores nas posições (1-based) 1, 1+(m-1)p/2, 1+(m-1)p, 1+(m-1)(1+p)/2, m do buffer ordenado
+        dados = sorted(self._buffer); m = len(dados)
+        self._pos = [int(round(1.0 + (m - 1) * f)) for f in self._incremento]
+        for i in (1, 2, 3): self._pos[i] = min(max(self._pos[i], self._pos[i - 1] + 1), m - (4 - i))
+        self._q = [dados[k - 1] for k in self._pos]
+        self._buffer = None
+
+    def adicionar(self, x: float):
+        self.n += 1
+        if self._buffer is not None:
+            self._buffer.append(x)
+            if self.n == self.exatos: self._inicializar()
+            return
+
+        q = self._q; pos = self._pos
+        if x < q[0]: q[0] = x; k = 0
+        elif x >= q[4]: q[4] = x; k = 3
+        else: k = min(3, bisect_right(q, x) - 1)
+        for i in range(k + 1, 5): pos[i] += 1
+
+        # Ajusta os marcadores interiores (fórmula parabólica, ou linear se sair da ordem);
+        # a posição desejada do marcador i após n valores é 1 + (n-1)·incremento[i]
+        n1 = self.n - 1; incremento = self._incremento
+        for i in (1, 2, 3):
+            d = 1.0 + n1 * incremento[i] - pos[i]
+            if (d >= 1.0 and pos[i + 1] - pos[i] > 1) or (d <= -1.0 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = qp; pos[i] += d
+
+    def valor(self) -> float:
+        if self.n == 0: return 0.0
+        if self._buffer is not None: return float(np.percentile(self._buffer, 100.0 * self.p))
+        return self._q[2]
+
+class EstatisticaOnline:
+    """Média e variância (Welford), mínimo, máximo e quantis P² acumulados valor a valor, em memória constante."""
+
+    __slots__ = ("n", "media", "_m2", "minimo", "maximo", "quantis")
+
+    def __init__(self, quantis: Tuple[float, ...] = ()):
+        self.n = 0; self.media = 0.0; self._m2 = 0.0
+        self.minimo = math.inf; self.maximo = -math.inf
+        self.quantis = {q: QuantilP2(q) for q in quantis}
+
+    def adicionar(self, x: float):
+        self.n += 1
+        delta = x - self.media
+        self.media += delta / self.n
+        self._m2 += delta * (x - self.media)
+        if x < self.minimo: self.minimo = x
+        if x > self.maximo: self.maximo = x
+        for est in self.quantis.values(): est.adicionar(x)
+
+    @property
+    def variancia(self) -> float:
+        # Variância populacional, como np.var (a das estatísticas exatas)
+        return self._m2 / self.n if self.n > 1 else 0.0
+
+    @property
+    def variancia_amostral(self) -> float:
+        # Com correção de Bessel, como np.var(ddof=1)
+        return self._m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def quantil(self, q: float) -> float:
+        return self.quantis[q].valor()
+
+    @classmethod
+    def combinar(cls, partes) -> "EstatisticaOnline":
+        """Junta acumuladores (fórmula paralela de Chan); os quantis não são combináveis e ficam de fora."""
+        total = cls()
+        for e in partes:
+            if e.n == 0: continue
+            n = total.n + e.n; delta = e.media - total.media
+            total._m2 += e._m2 + delta * delta * total.n * e.n / n
+            total.media += delta * e.n / n; total.n = n
+            total.minimo = min(total.minimo, e.minimo); total.maximo = max(total.maximo, e.maximo)
+        return total
+
+class IndiceConsultas:
+    """Consultas de cada médico como intervalos de minutos [inicio, fim), ordenados pelo início.
+
+    O paciente em consulta num minuto é o da última consulta iniciada até esse minuto, se ainda
+    não terminou (as consultas de um médico não se sobrepõem, a menos do arredondamento ao minuto)."""
+
+    def __init__(self, num_medicos: int):
+        self.inicios = [array('l') for _ in range(num_medicos)]
+        self.fins = [array('l') for _ in range(num_medicos)]
+        self.nomes: List[List[str]] = [[] for _ in range(num_medicos)]
+
+    @classmethod
+    def de_eventos(cls, eventos: List[Dict[str, Any]], num_medicos: int) -> "IndiceConsultas":
+        indice = cls(num_medicos)
+        for ev in eventos:
+            m = ev.get("medico")
+            if m is None or not 0 <= m < num_medicos: continue
+            inicio = int(ev["minuto_inicio"])
+            indice.inicios[m].append(inicio); indice.fins[m].append(inicio + int(math.ceil(ev["duracao"])))
+            indice.nomes[m].append((ev.get("paciente") or "Paciente desconhecido").split(' (')[0])
+        return indice
+
+    def __len__(self) -> int:
+        return len(self.inicios)
+
+    def nome_em(self, medico: int, minuto: int) -> Optional[str]:
+        j = bisect_right(self.inicios[medico], minuto) - 1
+        return self.nomes[medico][j] if j >= 0 and self.fins[medico][j] > minuto else None
+
+    def cursor(self) -> "CursorConsultas":
+        return CursorConsultas(self)
+
+class CursorConsultas:
+    """Leitura do IndiceConsultas minuto a minuto: avançar um minuto custa O(médicos) (amortizado);
+    saltar para qualquer minuto, O(médicos · log consultas)."""
+
+    def __init__(self, indice: IndiceConsultas):
+        self.indice = indice
+        self.minuto: Optional[int] = None
+        self._pos = [-1] * len(indice)
+
+    def posicionar(self, minuto: int):
+        self._pos = [bisect_right(inicios, minuto) - 1 for inicios in self.indice.inicios]
+        self.minuto = minuto
+
+    def nomes_em(self, minuto: int) -> List[Optional[str]]:
+        """Nome do paciente em consulta com cada médico no minuto dado (None se livre)."""
+        if self.minuto is None or not 0 <= minuto - self.minuto <= 1: self.posicionar(minuto)
+        else:
+            for m, inicios in enumerate(self.indice.inicios):
+                j = self._pos[m]
+                while j + 1 < len(inicios) and inicios[j + 1] <= minuto: j += 1
+                self._pos[m] = j
+            self.minuto = minuto
+        fins, nomes = self.indice.fins, self.indice.nomes
+        return [nomes[m][j] if j >= 0 and fins[m][j] > minuto else None for m, j in enumerate(self._pos)]
+
+class EstadoMedicos:
+    """Estado dos médicos em arrays paralelos indexados pelo número do médico (struct-of-arrays).
+
+    A especialidade de cada médico fica também em código de ESPECIALIDADES, que é o que o ciclo
+    de eventos usa; o resto é preenchido durante o run() (fim, tempo_ocupado, estat_consulta) ou
+    no fim a partir do registo de consultas (num_atendidos e tempos_consulta, modo exato)."""
+
+    def __init__(self, especialidades: List[str]):
+        n = len(especialidades)
+        self.especialidades = list(especialidades)
+        self.codigos = [ESPECIALIDADES.codigo(e) for e in especialidades]
+        # Fim da consulta atual (ou da última) de cada médico
+        self.fim = array('d', bytes(8 * n))
+        self.tempo_ocupado = array('d', bytes(8 * n))
+        self.num_atendidos = array('q', bytes(8 * n))
+        self.tempos_consulta: List[np.ndarray] = [np.empty(0)] * n
+        self.estat_consulta = [EstatisticaOnline((0.9,)) for _ in range(n)]
+
+    def __len__(self):
+        return len(self.especialidades)
+
+class RegistoConsultas:
+    """Consultas por ordem de início em arrays paralelos: paciente (nº de chegada), médico, início e duração."""
+
+    def __init__(self):
+        self.paciente = array('q'); self.medico = array('q')
+        self.inicio = array('d'); self.duracao = array('d')
+
+    def __len__(self):
+        return len(self.inicio)
+
+    def colunas(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(paciente, médico, início, duração) como arrays NumPy, sem cópia."""
+        return (np.frombuffer(self.paciente, dtype=np.int64), np.frombuffer(self.medico, dtype=np.int64),
+                np.frombuffer(self.inicio, dtype=np.float64), np.frombuffer(self.duracao, dtype=np.float64))
+
+class PoolMedicos:
+    """Médicos livres indexados pelo código da especialidade (min-heap de índices por especialidade).
+
+    Mantém a ordem de preferência original: o médico livre de menor índice entre os da
+    especialidade pedida e os generalistas (FALLBACK_ESP)."""
+
+    def __init__(self, especialidades: List[int]):
+        # especialidades: código (ESPECIALIDADES) de cada médico
+        self.especialidades = list(especialidades)
+        self._livres: List[List[int]] = [[] for _ in range(max([len(ESPECIALIDADES)] + [c + 1 for c in especialidades]))]
+        for idx, cod in enumerate(especialidades): self._livres[cod].append(idx)  # índices crescentes: já são heaps
+        self._geral = self._livres[ESPECIALIDADES.codigo(FALLBACK_ESP)]
+
+    def num_livres(self, especialidade: Optional[int] = None) -> int:
+        if especialidade is None: return sum(len(h) for h in self._livres)
+        return len(self._livres[especialidade]) if especialidade < len(self._livres) else 0
+
+    def obter_livre(self, especialidade: int) -> Optional[int]:
+        """Retira e devolve o médico livre compatível com a especialidade (None se não houver)."""
+        h_esp = self._livres[especialidade]; h_ger = self._geral
+        if h_esp: heap = h_ger if h_ger and h_ger[0] < h_esp[0] else h_esp
+        elif h_ger: heap = h_ger
+        else: return None
+        return heapq.heappop(heap)
+
+    def libertar(self, idx: int):
+        heapq.heappush(self._livres[self.especialidades[idx]], idx)
+
+class GestorFilas:
+    """Filas FIFO (deque) por código de especialidade, com ordem de despacho pré-calculada.
+
+    Um médico que fica livre serve primeiro a fila da sua especialidade e depois as
+    restantes por ordem alfabética (do nome da especialidade)."""
+
+    def __init__(self, especialidades=()):
+        self._filas: Dict[int, deque] = {}
+        self._ordem: Dict[int, Tuple[deque, ...]] = {}
+        self.total = 0
+        for cod in sorted(set(especialidades) | {ESPECIALIDADES.codigo(FALLBACK_ESP)}): self.garantir(cod)
+
+    def garantir(self, especialidade: int):
+        if especialidade not in self._filas:
+            self._filas[especialidade] = deque()
+            self._ordem = {}  # nova especialidade: recalcula as ordens de despacho
+
+    def ordem_despacho(self, especialidade: int) -> Tuple[deque, ...]:
+        ordem = self._ordem.get(especialidade)
+        if ordem is None:
+            outras = sorted((k for k in self._filas if k != especialidade), key=ESPECIALIDADES.valor)
+            ordem = tuple(self._filas[k] for k in ([especialidade] if especialidade in self._filas else []) + outras)
+            self._ordem[especialidade] = ordem
+        return ordem
+
+    def adicionar(self, especialidade: int, pid: int):
+        fila = self._filas.get(especialidade)
+        if fila is None: self.garantir(especialidade); fila = self._filas[especialidade]
+        fila.append(pid)
+        self.total += 1
+
+    def retirar_para(self, especialidade: int) -> Optional[int]:
+        """Próximo paciente (FIFO) para um médico da especialidade dada, ou None."""
+        if self.total == 0: return None
+        for fila in self.ordem_despacho(especialidade):
+            if fila:
+                self.total -= 1
+                return fila.popleft()
+        return None
+
+    def tamanho(self, especialidade: int) -> int:
+        fila = self._filas.get(especialidade)
+        return len(fila) if fila is not None else 0
+
+    def tamanhos(self) -> Dict[str, int]:
+        """Tamanho de cada fila, pelo nome da especialidade."""
+        return {ESPECIALIDADES.valor(cod): len(f) for cod, f in self._filas.items()}
+
+class PoolMedicosInstrumentado(PoolMedicos):
+    """PoolMedicos que conta as procuras de médico livre, os heaps examinados e o máximo de
+    médicos ocupados (= tamanho máximo do heap de saídas) (só com profile)."""
+
+    def __init__(self, especialidades: List[int]):
+        super().__init__(especialidades)
+        self.procuras = 0; self.iteracoes = 0; self.ocupados = 0; self.ocupados_max = 0
+
+    def obter_livre(self, especialidade: int) -> Optional[int]:
+        self.procuras += 1
+        self.iteracoes += bool(self._livres[especialidade]) + bool(self._geral)
+        idx = super().obter_livre(especialidade)
+        if idx is not None:
+            self.ocupados += 1
+            if self.ocupados > self.ocupados_max: self.ocupados_max = self.ocupados
+        return idx
+
+    def libertar(self, idx: int):
+        super().libertar(idx)
+        self.ocupados -= 1
+
+class GestorFilasInstrumentado(GestorFilas):
+    """GestorFilas com o máximo de cada fila e as filas percorridas no despacho (só com profile)."""
+
+    def __init__(self, especialidades=()):
+        super().__init__(especialidades)
+        self.maximos: Dict[int, int] = {}; self.total_max = 0; self.iteracoes_despacho = 0
+
+    def adicionar(self, especialidade: int, pid: int):
+        super().adicionar(especialidade, pid)
+        n = len(self._filas[especialidade])
+        if n > self.maximos.get(especialidade, 0): self.maximos[especialidade] = n
+        if self.total > self.total_max: self.total_max = self.total
+
+    def retirar_para(self, especialidade: int) -> Optional[int]:
+        if self.total == 0: return None
+        for fila in self.ordem_despacho(especialidade):
+            self.iteracoes_despacho += 1
+            if fila:
+                self.total -= 1
+                return fila.popleft()
+        return None
+
+MODOS_PERFIL = ("fases", "cprofile", "amostragem")
+
+class PerfilExecucao:
+    """Instrumentação de um run() (SimulacaoClinica(profile=...)): tempo de cada fase, contadores do
+    ciclo de eventos e, nos modos "cprofile" e "amostragem", as funções onde o tempo é gasto."""
+
+    def __init__(self, modo: str = "fases", intervalo_amostragem: float = 0.005, top: int = 25):
+        if modo not in MODOS_PERFIL: raise ValueError(f"profile inválido: {modo} (esperado um de {MODOS_PERFIL})")
+        self.modo = modo; self.intervalo_amostragem = intervalo_amostragem; self.top = top
+        self.fases: Dict[str, float] = {}
+        self.contadores: Dict[str, Any] = {}
+        self._fase: Optional[str] = None; self._t0 = 0.0
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._amostras: Dict[str, List[int]] = {}; self._n_amostras = 0
+        self._parar_amostragem: Optional[threading.Event] = None; self._amostrador: Optional[threading.Thread] = None
+
+    def marcar(self, fase: Optional[str]):
+        """Fecha a fase em curso e começa `fase` (None só fecha)."""
+        agora = time.perf_counter()
+        if self._fase is not None: self.fases[self._fase] = self.fases.get(self._fase, 0.0) + agora - self._t0
+        self._fase = fase; self._t0 = agora
+
+    def iniciar(self):
+        if self.modo == "cprofile":
+            self._cprofile = cProfile.Profile(); self._cprofile.enable()
+        elif self.modo == "amostragem":
+            self._parar_amostragem = threading.Event()
+            self._amostrador = threading.Thread(target=self._amostrar, args=(threading.get_ident(),), daemon=True)
+            self._amostrador.start()
+
+    def parar(self):
+        self.marcar(None)
+        if self._cprofile is not None: self._cprofile.disable()
+        if self._amostrador is not None:
+            self._parar_amostragem.set(); self._amostrador.join(); self._amostrador = None
+
+    def _amostrar(self, alvo: int):
+        # Amostragem da pilha da thread do run(): custo fixo por intervalo, independente do nº de chamadas
+        while not self._parar_amostragem.wait(self.intervalo_amostragem):
+            frame = sys._current_frames().get(alvo)
+            if frame is None: continue
+            self._n_amostras += 1; vistas = set(); topo = True
+            while frame is not None:
+                codigo = frame.f_code
+                chave = f"{os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno}({codigo.co_name})"
+                contagem = self._amostras.setdefault(chave, [0, 0])
+                if topo: contagem[0] += 1; topo = False
+                if chave not in vistas: contagem[1] += 1; vistas.add(chave)
+                frame = frame.f_back
+
+    def _top_cprofile(self) -> List[Dict[str, Any]]:
+        estat = pstats.Stats(self._cprofile).stats
+        linhas = sorted(estat.items(), key=lambda kv: kv[1][3], reverse=True)[:self.top]
+        return [{"funcao": f"{os.path.basename(f)}:{linha}({nome})", "chamadas": nc, "tempo_proprio_s": tt,
+                 "tempo_cumulativo_s": ct} for (f, linha, nome), (_, nc, tt, ct, _) in linhas]
+
+    def _top_amostragem(self) -> List[Dict[str, Any]]:
+        n = max(1, self._n_amostras)
+        linhas = sorted(self._amostras.items(), key=lambda kv: (kv[1][0], kv[1][1]), reverse=True)[:self.top]
+        return [{"funcao": chave, "amostras": proprio, "fracao_propria": proprio / n, "fracao_inclusiva": incl / n}
+                for chave, (proprio, incl) in linhas]
+
+    def resultado(self) -> Dict[str, Any]:
+        res = {"modo": self.modo, "fases_s": dict(self.fases), "total_s": sum(self.fases.values()),
+               "contadores": dict(self.contadores)}
+        if self._cprofile is not None: res["cprofile"] = self._top_cprofile()
+        if self.modo == "amostragem": res["amostragem"] = {"amostras": self._n_amostras, "top": self._top_amostragem()}
+        return res
+
 def calcular_estatisticas(sim) -> dict:
+    if not sim.estatisticas_exatas: return _estatisticas_online(sim)
     
+    medicos = sim._medicos
     ii = 0
-    while ii < len(sim._medicos):
-        m = sim._medicos[ii]
-        tempos = m.get("tempos_consulta", []) or []
-        num_att = m.get("num_atendidos", 0)
-        total_ocup = m.get("total_tempo_ocupado", 0.0)
+    while ii < len(medicos):
+        tempos = medicos.tempos_consulta[ii]
+        num_att = int(medicos.num_atendidos[ii])
+        total_ocup = medicos.tempo_ocupado[ii]
         media_cons = float(np.mean(tempos)) if len(tempos) > 0 else 0.0
         p90 = float(np.percentile(tempos, 90)) if len(tempos) > 0 else 0.0
         
@@ -126,7 +1060,7 @@ def calcular_estatisticas(sim) -> dict:
         tempo_ocioso = max(0.0, float(sim.simulation_time) - total_ocup)
         
         sim.stats_por_medico[ii] = {
-            "id": m.get("id"), "especialidade": m.get("especialidade"),
+            "id": ii, "especialidade": medicos.especialidades[ii],
             "num_atendidos": num_att, "tempo_ocioso": tempo_ocioso,
             "ocupacao_percent": ocup_percent, "media_consulta": media_cons, "p90_consulta": p90,
         }
@@ -149,6 +1083,7 @@ def calcular_estatisticas(sim) -> dict:
 
     return {
         "tempo_medio_espera": sim.stats_geral["tempo_medio_espera"],
+        "tempo_p95_espera": sim.stats_geral["tempo_p95_espera"],
         "variancia_tempo_espera": (float(np.var(tempos_esp_arr)) if len(tempos_esp_arr)>1 else 0.0),
         "tempo_medio_consulta": sim.stats_geral["tempo_medio_consulta"],
         "variancia_tempo_consulta": (float(np.var(tempos_cons_arr)) if len(tempos_cons_arr)>1 else 0.0),
@@ -160,8 +1095,100 @@ def calcular_estatisticas(sim) -> dict:
         "stats_por_medico": sim.stats_por_medico 
     }
 
+def _estatisticas_online(sim) -> dict:
+    """calcular_estatisticas a partir dos acumuladores do modo online (o p95 e o p90 são estimativas P²)."""
+    medicos = sim._medicos
+    for ii, est in enumerate(medicos.estat_consulta):
+        total_ocup = medicos.tempo_ocupado[ii]
+        sim.stats_por_medico[ii] = {
+            "id": ii, "especialidade": medicos.especialidades[ii],
+            "num_atendidos": int(medicos.num_atendidos[ii]), "tempo_ocioso": max(0.0, float(sim.simulation_time) - total_ocup),
+            "ocupacao_percent": 100.0 * total_ocup / max(1.0, float(sim.simulation_time)),
+            "media_consulta": est.media, "p90_consulta": est.quantil(0.9),
+        }
+
+    espera = sim.estat_espera
+    consulta = EstatisticaOnline.combinar(medicos.estat_consulta)
+    sim.stats_geral = {
+        "tempo_medio_espera": espera.media,
+        "tempo_p95_espera": espera.quantil(0.95),
+        "tempo_medio_consulta": consulta.media,
+        "fila_media": sim.serie_fila.media(),
+        "fila_max": int(sim.serie_fila.maximo or 0),
+        "ocupacao_media_medicos": 100.0 * sim.serie_ocupados.media() / max(1, sim.num_doctors),
+        "doentes_atendidos": int(sim.doentes_atendidos)
+    }
+
+    return {
+        "tempo_medio_espera": sim.stats_geral["tempo_medio_espera"],
+        "tempo_p95_espera": sim.stats_geral["tempo_p95_espera"],
+        "variancia_tempo_espera": espera.variancia,
+        "tempo_medio_consulta": sim.stats_geral["tempo_medio_consulta"],
+        "variancia_tempo_consulta": consulta.variancia,
+        "tempo_medio_na_clinica": sim.estat_clinica.media,
+        "fila_media": sim.stats_geral["fila_media"],
+        "fila_max": sim.stats_geral["fila_max"],
+        "ocupacao_media_medicos": sim.stats_geral["ocupacao_media_medicos"],
+        "doentes_atendidos": sim.stats_geral["doentes_atendidos"],
+        "stats_por_medico": sim.stats_por_medico
+    }
+
 # --- MOTOR DE SIMULAÇÃO (SimulacaoClinica) ---
 
+class FluxoSnapshots:
+    """Canal limitado e thread-safe entre o motor (produtor) e quem o observa (ex.: a interface).
+
+    O motor publica lotes de snapshots do estado, um por cada 'intervalo' minutos simulados. Com o
+    canal cheio descarta-se o lote mais antigo: a simulação nunca fica à espera de quem lê.
+    Entre processos, 'fila' e 'cancelamento' são uma Queue e um Event de um multiprocessing.Manager."""
+
+    def __init__(self, capacidade: int = 64, intervalo: float = 1.0, lote: int = 20, fila=None, cancelamento=None):
+        self._fila = fila if fila is not None else queue.Queue(maxsize=capacidade)
+        self.intervalo = float(intervalo); self.lote = max(1, int(lote))
+        self.descartados = 0
+        self.resultado: Any = None
+        self._terminado = threading.Event()
+        self._cancelado = cancelamento if cancelamento is not None else threading.Event()
+
+    def publicar(self, snapshots: List[Dict[str, Any]]):
+        while True:
+            try: self._fila.put_nowait(snapshots); return
+            except queue.Full:
+                try: self._fila.get_nowait(); self.descartados += 1
+                except queue.Empty: pass
+
+    def drenar(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """(snapshots pendentes, terminado). Com terminado=True já não chegam mais snapshots."""
+        terminado = self._terminado.is_set()  # lido antes de esvaziar: o último lote é publicado antes de fechar()
+        snapshots = []
+        while True:
+            try: snapshots.extend(self._fila.get_nowait())
+            except queue.Empty: break
+        return snapshots, terminado
+
+    def fechar(self, resultado: Any = None):
+        self.resultado = resultado; self._terminado.set()
+
+    def cancelar(self):
+        self._cancelado.set()
+
+    @property
+    def cancelado(self) -> bool:
+        return self._cancelado.is_set()
+
+    @property
+    def terminado(self) -> bool:
+        return self._terminado.is_set()
+
+
+# Chaves da configuração (config.json / CLI) que são parâmetros de SimulacaoClinica
+PARAMETROS_SIMULACAO = ("lambda_rate", "num_doctors", "service_distribution", "mean_service_time",
+                        "simulation_time", "seed", "arrival_pattern", "arrival_profile", "doctor_specialties",
+                        "stats_mode")
+
+# stats_mode="auto": estatísticas exatas (listas por paciente) só até este número de chegadas
+LIMITE_ESTATISTICAS_EXATAS = 200_000
+
 class SimulacaoClinica:
     def __init__(self, **kwargs):
         self.lambda_rate = float(kwargs.get('lambda_rate', 10))
@@ -172,8 +1199,27 @@ class SimulacaoClinica:
         self.seed = kwargs.get('seed')
         self.arrival_pattern = kwargs.get('arrival_pattern', "homogeneous")
         self.arrival_profile = kwargs.get('arrival_profile')
-        self.pacientes: List[Paciente] = kwargs.get('pacientes', [])
+        # Lista de Paciente ou ArmazemPacientes (colunar)
+        self.pacientes = kwargs.get('pacientes', [])
         self.doctor_specialties = kwargs.get('doctor_specialties', {})
+        # "exact" (listas por paciente), "online" (acumuladores em vez de listas) ou "auto".
+        # O modo online não guarda nada por consulta; os vetores de chegadas (ver reset) continuam
+        # a crescer com o nº de chegadas, em qualquer modo
+        self.stats_mode = kwargs.get('stats_mode', "auto")
+        # Tabelas de triagem para pacientes que não são Paciente nem linhas de um ArmazemPacientes
+        self._tabelas_triagem = TabelasTriagem()
+        if self.stats_mode not in ("auto", "exact", "online"): raise ValueError("stats_mode inválido")
+        # Os eventos só servem a animação da interface; os modos sem interface dispensam-nos.
+        # None (omissão): só com estatísticas exatas, para o modo online não guardar nada por consulta
+        registo = kwargs.get('record_events')
+        self.record_events: Optional[bool] = None if registo is None else bool(registo)
+        # FluxoSnapshots opcional: estado publicado durante o run() (e cancelamento a pedido de quem observa)
+        self.stream: Optional[FluxoSnapshots] = kwargs.get('stream')
+        # Instrumentação opcional (PerfilExecucao): True/"fases", "cprofile" ou "amostragem"; None = desligada
+        perfil = kwargs.get('profile')
+        self.modo_perfil = "fases" if perfil is True else (perfil or None)
+        if self.modo_perfil is not None and self.modo_perfil not in MODOS_PERFIL:
+            raise ValueError(f"profile inválido: {perfil} (esperado um de {MODOS_PERFIL})")
         self.reset()
 
     def reset(self):
@@ -186,44 +1232,82 @@ class SimulacaoClinica:
         self.eventos: List[Dict[str, Any]] = []
         self.distritos_pacientes: List[str] = []
 
+        self.contagem_distritos: Dict[str, int] = {}
+        self.indice_consultas: Optional[IndiceConsultas] = None
+        self.cancelado = False
+        self._lote_snapshots: List[Dict[str, Any]] = []
+
         self.doentes_atendidos = 0
         self.stats_por_medico: Dict[int, Dict[str, Any]] = {}
         self.stats_geral: Dict[str, Any] = {}
 
+        # Acumuladores do modo online (decidido em run(), quando se sabe o número de chegadas)
+        self.estatisticas_exatas = self.stats_mode != "online"
+        self.estat_espera = EstatisticaOnline((0.95,))
+        self.estat_clinica = EstatisticaOnline()
+
         self._rng = np.random.default_rng(self.seed)
-        self._heap: List[Tuple[float, int, str, str]] = []
-        self._counter = itertools.count()
-
-        self._chegada: Dict[str, float] = {}
-        self._inicio: Dict[str, float] = {}
-        self._saida: Dict[str, float] = {}
-        self._duracao: Dict[str, float] = {}
-        # O ID do paciente (pid) mapeia para o índice na lista self.pacientes
-        self._pid_to_pidx: Dict[str, int] = {} 
-
-        self._medicos: List[Dict[str, Any]] = []
-        i = 0
-        while i < self.num_doctors:
-            esp = self.doctor_specialties.get(str(i), FALLBACK_ESP)
-            self._medicos.append({
-                "id": i,
-                "livre": True,
-                "fim": 0.0,
-                "especialidade": esp, 
-                "last_event_time": 0.0,
-                "total_tempo_ocupado": 0.0,
-                "num_atendidos": 0,
-                "tempos_consulta": []
-            })
-            i += 1
+        self._amostrador = AmostradorServico(self.mean_service_time, self.service_distribution, rng=self._rng)
+        # Heap de saídas: (tempo, sequência, paciente, médico). As chegadas ficam em self._chegadas_t.
+        # Os pacientes são identificados pelo nº de chegada (posição em self._chegadas_t) e os médicos pelo índice
+        self._heap: List[Tuple[float, int, int, int]] = []
+
+        self._medicos = EstadoMedicos([self.doctor_specialties.get(str(i), FALLBACK_ESP) for i in range(self.num_doctors)])
+        # Consultas iniciadas (modo exato): tempos de espera, de consulta e na clínica saem daqui no fim
+        self._consultas = RegistoConsultas()
+        # Com profile, as classes instrumentadas; sem profile o ciclo de eventos não paga nenhum contador
+        self.perfil = PerfilExecucao(self.modo_perfil) if self.modo_perfil else None
+        self._pool = (PoolMedicosInstrumentado if self.perfil else PoolMedicos)(self._medicos.codigos)
 
         # FIX: Fila simplificada, sem distinção de prioridade
-        self._filas: Dict[str, List[str]] = {} 
-        self._pid_counter = 1
+        self._filas = (GestorFilasInstrumentado if self.perfil else GestorFilas)(
+            {ESPECIALIDADES.codigo(e) for e in DOENCA_TO_ESP.values()} | set(self._medicos.codigos))
+        # Vetores de chegadas gerados de uma vez para todo o horizonte: ~20 B por chegada (tempo, linha,
+        # especialidade), também no modo online. Gerá-los por blocos intercalaria os sorteios com os das
+        # durações (mesmo RNG) e as execuções exata e online com a mesma seed deixariam de coincidir
+        self._chegadas_t: np.ndarray = np.empty(0)
+        # Linha do dataset e código da especialidade pedida de cada chegada
+        self._chegadas_pidx: np.ndarray = np.empty(0, dtype=np.intp)
+        self._chegadas_esp: np.ndarray = np.empty(0, dtype=np.int32)
+
+        # Séries em escada da fila e dos médicos ocupados, atualizadas em cada CHEGADA/SAIDA
+        self._ocupados = 0
+        self.serie_fila = SerieTemporal(0)
+        self.serie_ocupados = SerieTemporal(0)
         
-    def _gera_intervalo_chegada_homogeneo(self) -> float:
-        if not self.pacientes: return float('inf') 
-        return gera_intervalo_tempo_chegada(self.lambda_rate, rng=self._rng)
+    def _gera_tempos_poisson(self, inicio: float, fim: float, taxa: float, max_n: int) -> np.ndarray:
+        """Chegadas de Poisson (taxa por hora) em [inicio, fim), geradas por lotes.
+
+        Cada lote é a soma acumulada de exponenciais, cortada no fim do bloco."""
+        if taxa <= 0 or fim <= inicio or max_n <= 0: return np.empty(0)
+        escala = 60.0 / taxa
+        partes = []; n = 0; t = float(inicio)
+        # Lote inicial ~10% acima do número esperado de chegadas no bloco
+        lote = int(min(max_n, (fim - inicio) / escala * 1.1 + 16))
+        while n < max_n:
+            intervalos = self._rng.exponential(escala, size=lote)
+            intervalos[0] += t
+            tempos = np.cumsum(intervalos)
+            corte = int(np.searchsorted(tempos, fim, side="left"))
+            partes.append(tempos[:corte]); n += corte
+            if corte < lote: break
+            t = float(tempos[-1]); lote = max(16, min(max_n - n, lote))
+        return np.concatenate(partes)[:max_n]
+
+    def _carregar_chegadas(self, tempos: np.ndarray):
+        # Chegadas em bloco: vetor ordenado, fundido no ciclo de eventos com o heap de saídas.
+        # A ordem (estável) de geração define a linha do dataset de cada chegada.
+        linhas = np.arange(tempos.size)
+        if tempos.size > 1 and np.any(np.diff(tempos) < 0):
+            linhas = np.argsort(tempos, kind="stable"); tempos = tempos[linhas]
+        self._chegadas_t = np.ascontiguousarray(tempos, dtype=np.float64)
+        self._chegadas_pidx = linhas
+        # Especialidade pedida por cada chegada, triada de uma vez (o ciclo de eventos só lê códigos)
+        if isinstance(self.pacientes, ArmazemPacientes):
+            self._chegadas_esp = np.ascontiguousarray(self.pacientes.triagens[linhas, 1], dtype=np.int32)
+        else:
+            self._chegadas_esp = np.fromiter((self._triagem(self.pacientes[k])[1] for k in linhas.tolist()),
+                                             dtype=np.int32, count=linhas.size)
 
     def _gera_chegadas_nonhomogeneous(self):
         if not self.pacientes: return 
@@ -235,90 +1319,110 @@ class SimulacaoClinica:
                 (300, 420, 25.0), (420, self.simulation_time, 10.0)
             ]
 
-        pid_ctr = self._pid_counter
-        pidx = 0
-        for bloco in profile:
-            start_min, end_min, lam = bloco
-            
-            is_valid_block = end_min > start_min and lam > 0
-            
-            if is_valid_block:
-                t = float(start_min)
-                taxa_min = lam / 60.0
-                
-                while t < end_min and pidx < len(self.pacientes):
-                    intervalo = float(self._rng.exponential(1.0 / taxa_min))
-                    t = t + intervalo
-                    
-                    if t < end_min and pidx < len(self.pacientes):
-                        pid = f"p{pid_ctr}"
-                        pid_ctr += 1
-                        self._chegada[pid] = t
-                        heapq.heappush(self._heap, (t, next(self._counter), CHEGADA, pid))
-                        self._pid_to_pidx[pid] = pidx
-                        pidx += 1
-                        
-        self._pid_counter = pid_ctr
+        blocos = []; restantes = len(self.pacientes)
+        for start_min, end_min, lam in profile:
+            tempos = self._gera_tempos_poisson(start_min, end_min, lam, restantes)
+            blocos.append(tempos); restantes -= tempos.size
+        self._carregar_chegadas(np.concatenate(blocos) if blocos else np.empty(0))
 
     def _gera_chegadas_homogeneo(self):
         if not self.pacientes: return 
-        
-        t = float(self._gera_intervalo_chegada_homogeneo())
-        pid_ctr = self._pid_counter
-        pidx = 0
-        while t < self.simulation_time and pidx < len(self.pacientes):
-            pid = f"p{pid_ctr}"
-            pid_ctr += 1
-            self._chegada[pid] = t
-            heapq.heappush(self._heap, (t, next(self._counter), CHEGADA, pid))
-            self._pid_to_pidx[pid] = pidx
-            pidx += 1
-            t = t + float(self._gera_intervalo_chegada_homogeneo())
-        self._pid_counter = pid_ctr
+        self._carregar_chegadas(self._gera_tempos_poisson(0.0, self.simulation_time, self.lambda_rate, len(self.pacientes)))
     
-    def _gera_tempo_consulta_local(self, especialidade: Optional[str], paciente_idx: Optional[int]) -> float:
-        # FIX: O tempo de serviço agora depende APENAS do input do utilizador (mean_service_time)
-        mean = self.mean_service_time
-        return gera_tempo_consulta(mean, self.service_distribution, rng=self._rng)
-
     def _detectar_doenca_e_prioridade(self, p: Dict[str, Any]) -> Tuple[str, str, str]:
-        doenca = None; prioridade = "normal"; prioridade_motivo = []; nota_clinica = []
+        return detectar_doenca_e_prioridade(p)
 
-        if isinstance(p, dict):
-            doenca = p.get("doenca", p.get("descrição")); 
-            if isinstance(doenca, str): doenca = doenca.lower()
-            
-            # 1. Notas Clínicas/Alertas (sem implicar urgência na fila)
-            if str(p.get('religiao', '')).lower() == 'testemunhas de jeová': nota_clinica.append("Restrição de Transfusão de Sangue")
-            if str(p.get('atributos', {}).get('fumador')).lower() == 'true': nota_clinica.append("Alerta: Fumador")
+    def _doenca_para_especialidade(self, doenca: str) -> str:
+        return doenca_para_especialidade(doenca)
 
-            # Prioridade de fila é sempre 'normal'
-            prioridade = "normal"
+    def _triagem(self, pdata) -> Tuple[int, int, int]:
+        # Códigos (doença, especialidade, nota clínica), calculados uma vez por paciente
+        if isinstance(pdata, Paciente): return pdata.triagem()
+        return self._tabelas_triagem.triar(pdata if isinstance(pdata, dict) else {})
 
-            if doenca is None or not doenca:
-                doenca = "virose"
+    def _dados_paciente(self, pidx: Optional[int]) -> Tuple[Optional[str], Optional[str], int, str]:
+        """(nome, distrito, código da especialidade, nota clínica) do paciente pidx, lidos das colunas
+        quando há ArmazemPacientes."""
+        if pidx is None or pidx >= len(self.pacientes):
+            _, cod_esp, cod_nota = self._triagem(None)
+            return None, None, cod_esp, self._tabelas_triagem.notas.valor(cod_nota)
+        if isinstance(self.pacientes, ArmazemPacientes):
+            arm = self.pacientes
+            return arm.nomes[pidx], arm.distrito(pidx), int(arm.triagens[pidx, 1]), arm.nota_clinica(pidx)
+        pdata = self.pacientes[pidx]
+        morada = pdata.morada or {}
+        return pdata.nome, morada.get('distrito'), pdata.triagem()[1], pdata.nota_clinica()
 
-        else: doenca = "virose"
+    def _registar_evento(self, tempo: float, chegada: int, medico_idx: Optional[int], dur: float):
+        # Evento da animação (ver record_events): o nome e a nota clínica são lidos aqui, não no ciclo
+        nome, _, cod_esp, motivo_str = self._dados_paciente(int(self._chegadas_pidx[chegada]))
+        # Prioridade de fila é sempre 'normal'
+        self.eventos.append({"minuto_inicio": int(math.floor(tempo)), "duracao": dur, "medico": medico_idx,
+                             "paciente": f"{nome} ({motivo_str})", "especialidade": ESPECIALIDADES.valores[cod_esp],
+                             "prioridade": "normal", "motivo": motivo_str})
 
-        if doenca is None or not doenca: doenca = "virose"
-        
-        # O motivo clínico agora é uma lista concisa de notas
-        motivo_str = f"{', '.join(prioridade_motivo + nota_clinica)}" if prioridade_motivo or nota_clinica else "Sem Nota Clínica"
-            
-        return doenca.lower(), prioridade, motivo_str
+    def _distritos(self, linhas: np.ndarray) -> List[str]:
+        """Distrito de cada linha ("Desconhecido" se não tiver), pela ordem dada."""
+        if isinstance(self.pacientes, ArmazemPacientes):
+            nomes = [d or "Desconhecido" for d in self.pacientes.tabelas["distritos"].valores]
+            return [nomes[c] for c in self.pacientes.distritos[linhas].tolist()]
+        return [(self.pacientes[k].morada or {}).get('distrito') or "Desconhecido" for k in linhas.tolist()]
 
-    def _doenca_para_especialidade(self, doenca: str) -> str:
-        if doenca in DOENCA_TO_ESP: return DOENCA_TO_ESP[doenca]
-        if "cardio" in doenca or "angina" in doenca or "hipertens" in doenca or "arritm" in doenca: return "cardiologia"
-        if "pneumo" in doenca or "asma" in doenca or "bronq" in doenca: return "pneumologia"
-        if "diabet" in doenca or "endocrinologia" in doenca: return "endocrinologia"
-        if "fract" in doenca or "queda" in doenca or "ortop" in doenca: return "ortopedia"
-        if "otit" in doenca or "rinite" in doenca or "otorr" in doenca: return "otorrino"
-        if "geriatria" in doenca: return "geriatria"
-        return FALLBACK_ESP
+    def _contagem_distritos(self, linhas: np.ndarray) -> Dict[str, int]:
+        """Pacientes por distrito, pela ordem em que cada distrito aparece primeiro."""
+        contagem: Dict[str, int] = {}
+        if isinstance(self.pacientes, ArmazemPacientes):
+            valores = self.pacientes.tabelas["distritos"].valores
+            cods, primeiro, n = np.unique(self.pacientes.distritos[linhas], return_index=True, return_counts=True)
+            for k in np.argsort(primeiro).tolist():
+                nome = valores[cods[k]] or "Desconhecido"; contagem[nome] = contagem.get(nome, 0) + int(n[k])
+            return contagem
+        for nome in self._distritos(linhas): contagem[nome] = contagem.get(nome, 0) + 1
+        return contagem
+
+    def _snapshots_ate(self, tempo: float, prox: float) -> Optional[float]:
+        """Snapshot do estado no último instante de amostragem anterior a 'tempo' (os eventos em
+        'tempo' ainda não contam). Devolve o instante do próximo snapshot, ou None se foi cancelado."""
+        fluxo = self.stream
+        if prox >= self.simulation_time: return math.inf
+        passo = fluxo.intervalo
+        n = math.ceil((min(tempo, self.simulation_time) - prox) / passo)
+        self._lote_snapshots.append({
+            "minuto": prox + (n - 1) * passo, "fila": self._filas.total, "filas": self._filas.tamanhos(),
+            "ocupados": self._ocupados, "atendidos": self.doentes_atendidos,
+            # Um médico está ocupado enquanto o fim da consulta atual não passou
+            "medicos_ocupados": [fim > prox + (n - 1) * passo for fim in self._medicos.fim],
+        })
+        if len(self._lote_snapshots) >= fluxo.lote:
+            fluxo.publicar(self._lote_snapshots); self._lote_snapshots = []
+            # O cancelamento só é consultado a cada lote (entre processos é uma ida ao Manager)
+            if fluxo.cancelado: return None
+        return prox + n * passo
 
     def run(self):
+        """Corre a simulação; com profile, o dict devolvido inclui "perfil" (PerfilExecucao.resultado())."""
+        if not self.modo_perfil: return self._executar()
+        try:
+            resultado = self._executar()
+        finally:
+            if self.perfil is not None: self.perfil.parar()
+        perfil = self.perfil
+        eventos = int(self._chegadas_t.size) + self.doentes_atendidos
+        perfil.contadores.update({
+            "eventos": eventos, "chegadas": int(self._chegadas_t.size), "saidas": self.doentes_atendidos,
+            "eventos_por_s": eventos / perfil.fases["ciclo_eventos"] if perfil.fases.get("ciclo_eventos") else None,
+            "heap_max": self._pool.ocupados_max, "fila_total_max": self._filas.total_max,
+            "fila_max_por_especialidade": dict(sorted((ESPECIALIDADES.valor(c), n) for c, n in self._filas.maximos.items())),
+            "procuras_medico": self._pool.procuras, "iteracoes_procura_medico": self._pool.iteracoes,
+            "iteracoes_despacho_fila": self._filas.iteracoes_despacho,
+        })
+        if resultado is not None: resultado["perfil"] = perfil.resultado()
+        return resultado
+
+    def _executar(self):
         self.reset()
+        perfil = self.perfil
+        if perfil is not None: perfil.iniciar(); perfil.marcar("chegadas")
         
         # FIX: Verifica se há pacientes carregados (Obrigatoriedade do Dataset)
         if not self.pacientes:
@@ -328,175 +1432,142 @@ class SimulacaoClinica:
         if self.arrival_pattern == "nonhomogeneous": self._gera_chegadas_nonhomogeneous()
         else: self._gera_chegadas_homogeneo()
 
-        # FIX: Inicialização da fila simplificada
-        self._filas[FALLBACK_ESP] = [] 
-
-        while self._heap:
-            tempo, _, tipo, pid = heapq.heappop(self._heap)
-            
-            if tipo == CHEGADA:
-                pidx = self._pid_to_pidx.get(pid, None)
-                
-                if pidx is not None and pidx < len(self.pacientes): 
-                    pdata = self.pacientes[pidx]
-                    p_info = pdata.__dict__ if not isinstance(pdata, dict) else pdata
-                    doenca, prioridade, motivo_str = self._detectar_doenca_e_prioridade(p_info)
-
-                    especialidade_req = self._doenca_para_especialidade(doenca)
-
-                    if pdata.morada and pdata.morada.get('distrito'): self.distritos_pacientes.append(pdata.morada['distrito'])
-                    else: self.distritos_pacientes.append("Desconhecido")
-                        
-                    # FIX: Inicialização da fila simplificada
-                    if especialidade_req not in self._filas: self._filas[especialidade_req] = []
-
-                    medico_idx = None
-                    j = 0
-                    found_compatible_doctor = False
-                    
-                    # Procura 1: Compatível e Livre
-                    while j < len(self._medicos):
-                        m = self._medicos[j]
-                        is_compatible = (m["especialidade"] == especialidade_req) or (m["especialidade"] == FALLBACK_ESP)
-                        
-                        if m["livre"] and is_compatible and not found_compatible_doctor: 
-                            medico_idx = j
-                            found_compatible_doctor = True 
-                        
-                        j += 1
-                    
-                    # Procura 2: Generalista Livre (Fallback), se ainda não encontrou
-                    k = 0
-                    if not found_compatible_doctor:
-                        found_fallback_doctor = False
-                        while k < len(self._medicos):
-                            m2 = self._medicos[k]
-                            if m2["livre"] and m2["especialidade"] == FALLBACK_ESP and not found_fallback_doctor: 
-                                medico_idx = k
-                                found_fallback_doctor = True
-                            k += 1
-
-                    if medico_idx is not None:
-                        # Paciente ATENDIDO IMEDIATAMENTE
-                        dur = self._gera_tempo_consulta_local(especialidade_req, pidx)
-                        
-                        if dur <= 0.001: dur = self.mean_service_time 
-                            
-                        self._inicio[pid] = tempo; self._duracao[pid] = dur; self._medicos[medico_idx]["livre"] = False; self._medicos[medico_idx]["fim"] = tempo + dur
-                        self._medicos[medico_idx]["num_atendidos"] += 1; self._medicos[medico_idx]["tempos_consulta"].append(dur)
-                        heapq.heappush(self._heap, (tempo + dur, next(self._counter), SAIDA, pid))
-                        
-                        nome = pdata.nome
-                        ev = {"minuto_inicio": int(math.floor(tempo)), "duracao": dur, "medico": medico_idx, "paciente": f"{nome} ({motivo_str})", "especialidade": especialidade_req, "prioridade": prioridade, "motivo": motivo_str}
-                        self.eventos.append(ev)
-                        
-                        self._medicos[medico_idx]["last_event_time"] = tempo
+        # Estado do ciclo em arrays indexados por inteiros: o nº de chegada identifica o paciente
+        # (os memoryview devolvem floats/ints Python sem converter o vetor) e o índice identifica o médico
+        n_cheg = int(self._chegadas_t.size); ai = 0
+        chegadas = memoryview(self._chegadas_t); esp_chegada = memoryview(self._chegadas_esp)
+
+        if self.stats_mode == "auto": self.estatisticas_exatas = n_cheg <= LIMITE_ESTATISTICAS_EXATAS
+        exatas = self.estatisticas_exatas
+        if not exatas:
+            # Só acumuladores: o registo de consultas e os resultados por paciente ficam vazios
+            self.serie_fila = SerieAmostradaOnline(0, self.simulation_time)
+            self.serie_ocupados = SerieAmostradaOnline(0, self.simulation_time)
+
+        # Métodos e estruturas do ciclo em variáveis locais (cada evento evita as procuras de atributos)
+        heap = self._heap; heappush = heapq.heappush; heappop = heapq.heappop
+        obter_livre = self._pool.obter_livre; libertar = self._pool.libertar
+        filas = self._filas; adicionar_fila = filas.adicionar; retirar_fila = filas.retirar_para
+        proxima_duracao = self._amostrador.proximo; dur_minima = self.mean_service_time
+        registar_fila = self.serie_fila.registar; registar_ocupados = self.serie_ocupados.registar
+        medicos = self._medicos; esp_medico = medicos.codigos; fim_medico = medicos.fim
+        consultas = self._consultas
+        reg_paciente = consultas.paciente.append; reg_medico = consultas.medico.append
+        reg_inicio = consultas.inicio.append; reg_duracao = consultas.duracao.append
+        estat_espera = self.estat_espera; estat_clinica = self.estat_clinica
+        estat_consulta = medicos.estat_consulta; tempo_ocupado = medicos.tempo_ocupado
+        registar_eventos = self.record_events if self.record_events is not None else exatas
+        registar_evento = self._registar_evento if registar_eventos else None
+        seq = 0; ocupados = 0; atendidos = 0
+
+        # Instante do próximo snapshot do fluxo (inf sem fluxo: uma só comparação por evento)
+        prox_snapshot = 0.0 if self.stream is not None else math.inf
+        if perfil is not None: perfil.marcar("ciclo_eventos")
+
+        while True:
+            # Próximo evento: a chegada seguinte ou o topo do heap de saídas (chegadas primeiro em empate)
+            if ai < n_cheg and (not heap or chegadas[ai] <= heap[0][0]):
+                tempo = chegadas[ai]; pid = ai; medico_idx = -1
+                ai += 1
+            elif heap:
+                tempo, _, pid, medico_idx = heappop(heap)
+            else: break
+
+            if tempo > prox_snapshot:
+                self._ocupados = ocupados; self.doentes_atendidos = atendidos
+                prox_snapshot = self._snapshots_ate(tempo, prox_snapshot)
+                if prox_snapshot is None: self.cancelado = True; break
+
+            if medico_idx < 0:
+                # CHEGADA: médico livre compatível (especialidade pedida ou generalista), de menor índice
+                cod_esp = esp_chegada[pid]
+                medico_idx = obter_livre(cod_esp)
+                if medico_idx is not None:
+                    # Paciente ATENDIDO IMEDIATAMENTE
+                    dur = proxima_duracao()
+                    if dur <= 0.001: dur = dur_minima
+                    fim_medico[medico_idx] = fim = tempo + dur
+                    seq += 1; heappush(heap, (fim, seq, pid, medico_idx))
+                    if exatas: reg_paciente(pid); reg_medico(medico_idx); reg_inicio(tempo); reg_duracao(dur)
                     else:
-                        # Paciente VAI PARA A FILA (FIFO)
-                        self._filas[especialidade_req].append(pid)
-                        
-                        nome = pdata.nome
-                        self.eventos.append({"minuto_inicio": int(math.floor(tempo)), "duracao": 0.0, "medico": None, "paciente": f"{nome} ({motivo_str})", "especialidade": especialidade_req, "prioridade": prioridade, "motivo": motivo_str})
-            
-
-            elif tipo == SAIDA:
-                found_idx = None
-                kk = 0
-                doctor_found = False
-                while kk < len(self._medicos) and not doctor_found:
-                    m = self._medicos[kk]
-                    if (not m["livre"]) and (abs(m["fim"] - tempo) <= 1e-4): 
-                        found_idx = kk
-                        doctor_found = True
-                    kk += 1
-
-                self._saida[pid] = tempo; self.doentes_atendidos += 1
-
-                if found_idx is not None:
-                    dur_local = self._duracao.get(pid, 0.0); self._medicos[found_idx]["total_tempo_ocupado"] += dur_local; self._medicos[found_idx]["livre"] = True
-                    self._medicos[found_idx]["last_event_time"] = tempo
-
-                    esp_med = self._medicos[found_idx].get("especialidade", FALLBACK_ESP); prox_pid = None; keys = sorted(list(self._filas.keys())) 
-                    
-                    found_next_patient = False
-                    
-                    # 1. Tenta encontrar na fila da especialidade do médico (FIFO)
-                    if esp_med in self._filas and len(self._filas[esp_med]) > 0: 
-                        prox_pid = self._filas[esp_med].pop(0) # FIFO
-                        found_next_patient = True
-                        
-                    # 2. Tenta encontrar na fila de outras especialidades (FIFO)
-                    i2 = 0
-                    while i2 < len(keys) and not found_next_patient:
-                        kf = keys[i2]
-                        if kf != esp_med and len(self._filas.get(kf, [])) > 0: 
-                            prox_pid = self._filas[kf].pop(0) # FIFO
-                            found_next_patient = True
-                        i2 += 1
-                    
-                    # 3. Tenta encontrar na fila do FALLBACK (FIFO)
-                    if not found_next_patient and FALLBACK_ESP in self._filas and len(self._filas[FALLBACK_ESP]) > 0:
-                        prox_pid = self._filas[FALLBACK_ESP].pop(0)
-                        found_next_patient = True
-
-
-                    if prox_pid is not None:
-                        # Próximo paciente INICIA ATENDIMENTO
-                        pidx2 = self._pid_to_pidx.get(prox_pid, None)
-                        pdata2 = self.pacientes[pidx2] if pidx2 is not None and pidx2 < len(self.pacientes) else None
-                        p_info2 = pdata2.__dict__ if pdata2 is not None and not isinstance(pdata2, dict) else (pdata2 if pdata2 is not None else {})
-                        doenca2, prioridade2, motivo_str2 = self._detectar_doenca_e_prioridade(p_info2)
-                        
-                        esp_final = self._doenca_para_especialidade(doenca2); dur2 = self._gera_tempo_consulta_local(esp_final, pidx2)
-                        if dur2 <= 0.001: dur2 = self.mean_service_time 
-
-                        self._inicio[prox_pid] = tempo; self._duracao[prox_pid] = dur2; self._medicos[found_idx]["livre"] = False; self._medicos[found_idx]["fim"] = tempo + dur2
-                        self._medicos[found_idx]["num_atendidos"] += 1; self._medicos[found_idx]["tempos_consulta"].append(dur2)
-                        heapq.heappush(self._heap, (tempo + dur2, next(self._counter), SAIDA, prox_pid))
-                        
-                        nome2 = pdata2.nome if pdata2 else "Paciente desconhecido (ERRO)"
-                        self.eventos.append({"minuto_inicio": int(math.floor(tempo)), "duracao": dur2, "medico": found_idx, "paciente": f"{nome2} ({motivo_str2})", "especialidade": esp_final, "prioridade": prioridade2, "motivo": motivo_str2})
+                        estat_espera.adicionar(max(0.0, tempo - chegadas[pid]))
+                        estat_consulta[medico_idx].adicionar(dur); tempo_ocupado[medico_idx] += dur
+                    if registar_evento is not None: registar_evento(tempo, pid, medico_idx, dur)
+                    ocupados += 1; registar_ocupados(tempo, ocupados)
+                else:
+                    # Paciente VAI PARA A FILA (FIFO)
+                    adicionar_fila(cod_esp, pid)
+                    registar_fila(tempo, filas.total)
+                    if registar_evento is not None: registar_evento(tempo, pid, None, 0.0)
+            else:
+                # SAIDA: o evento transporta o médico que atendeu (libertação exata em O(1))
+                atendidos += 1; ocupados -= 1
+                if not exatas: estat_clinica.adicionar(max(0.0, tempo - chegadas[pid]))
+
+                # Fila da especialidade do médico primeiro, depois as restantes (FIFO em cada uma)
+                pid = retirar_fila(esp_medico[medico_idx])
+                if pid is not None:
+                    # Próximo paciente INICIA ATENDIMENTO
+                    dur = proxima_duracao()
+                    if dur <= 0.001: dur = dur_minima
+                    fim_medico[medico_idx] = fim = tempo + dur
+                    seq += 1; heappush(heap, (fim, seq, pid, medico_idx))
+                    if exatas: reg_paciente(pid); reg_medico(medico_idx); reg_inicio(tempo); reg_duracao(dur)
                     else:
-                        pass
-            
-        # O cálculo das filas e ocupação continua aqui
-        minuto = 0
-        while minuto < self.simulation_time:
-            chegada_count = 0; inicio_count = 0
-            keys_cheg = list(self._chegada.keys()); ik = 0
-            while ik < len(keys_cheg):
-                pk = keys_cheg[ik]; tcheg = self._chegada.get(pk, float('inf')); tin = self._inicio.get(pk)
-                if tcheg <= minuto:
-                    chegada_count += 1
-                    if tin is not None and tin <= minuto: inicio_count += 1
-                ik += 1
-            fila_atual = chegada_count - inicio_count
-            if fila_atual < 0: fila_atual = 0
-            self.fila_sizes.append(fila_atual)
-            
-            ocup = 0; mm = 0
-            while mm < len(self._medicos):
-                med = self._medicos[mm]
-                if med.get("fim", 0.0) > minuto and not med.get("livre", True): ocup += 1
-                mm += 1
-                
-            porc = 100.0 * ocup / max(1, self.num_doctors)
-            if porc < 0.0: porc = 0.0
-            if porc > 100.0: porc = 100.0
-            self.ocupacao_medicos.append(porc); minuto += 1
-
-        pid_keys = list(self._inicio.keys()); ppi = 0
-        while ppi < len(pid_keys):
-            pid = pid_keys[ppi]; tinicio = self._inicio.get(pid); tchegada = self._chegada.get(pid)
-            tsaida = self._saida.get(pid); dur = self._duracao.get(pid, 0.0) 
-            espera = 0.0
-            if tinicio is not None and tchegada is not None: espera = max(0.0, tinicio - tchegada) 
-            total = 0.0
-            if tsaida is not None and tchegada is not None: total = max(0.0, tsaida - tchegada)
-            else: total = espera + dur
-            self.tempos_espera.append(espera); self.tempos_consulta.append(dur); self.tempos_clinica.append(total)
-            ppi += 1
+                        estat_espera.adicionar(max(0.0, tempo - chegadas[pid]))
+                        estat_consulta[medico_idx].adicionar(dur); tempo_ocupado[medico_idx] += dur
+                    if registar_evento is not None: registar_evento(tempo, pid, medico_idx, dur)
+                    ocupados += 1
+                else:
+                    # Nenhum paciente à espera: o médico volta ao pool de livres
+                    libertar(medico_idx)
+
+                registar_fila(tempo, filas.total)
+                registar_ocupados(tempo, ocupados)
+
+        self._ocupados = ocupados; self.doentes_atendidos = atendidos
+        if perfil is not None: perfil.marcar("pos_processamento")
+        if self.stream is not None:
+            if self.cancelado: return None
+            self._snapshots_ate(math.inf, prox_snapshot)
+            if self._lote_snapshots: self.stream.publicar(self._lote_snapshots); self._lote_snapshots = []
+
+        if not exatas:
+            self.serie_fila.fechar(); self.serie_ocupados.fechar()
+            for i, est in enumerate(estat_consulta): medicos.num_atendidos[i] = est.n
+            self.contagem_distritos = self._contagem_distritos(self._chegadas_pidx[:ai])
+            if perfil is not None: perfil.marcar("estatisticas")
+            calcular_estatisticas(self)
+            return {
+                "tempos_espera": [], "tempos_consulta": [], "fila_sizes": [], "ocupacao_medicos": [],
+                "stats_por_medico": self.stats_por_medico, "stats_geral": self.stats_geral,
+                "distritos_pacientes": [], "contagem_distritos": self.contagem_distritos
+            }
+
+        self.distritos_pacientes = self._distritos(self._chegadas_pidx[:ai])
+        # Índice por médico para a animação (consulta ativa em cada minuto sem percorrer os eventos)
+        if registar_eventos: self.indice_consultas = IndiceConsultas.de_eventos(self.eventos, self.num_doctors)
+        # Filas e ocupação por minuto: amostragem das séries em escada (linear no nº de eventos)
+        self.fila_sizes = [int(x) for x in self.serie_fila.amostrar(self.simulation_time)]
+        ocup = self.serie_ocupados.amostrar(self.simulation_time)
+        self.ocupacao_medicos = np.clip(100.0 * ocup / max(1, self.num_doctors), 0.0, 100.0).tolist()
+
+        # Tempos por paciente (pela ordem de início das consultas), vetorizados sobre o registo de consultas
+        pac, med, inicio, dur = consultas.colunas()
+        chegada = self._chegadas_t[pac]
+        self.tempos_espera = np.maximum(0.0, inicio - chegada).tolist()
+        self.tempos_consulta = dur.tolist()
+        self.tempos_clinica = np.maximum(0.0, (inicio + dur) - chegada).tolist()
+        # Por médico: consultas pela ordem de início (ordenação estável), tempo ocupado somado pela mesma ordem
+        ordem = np.argsort(med, kind="stable")
+        limites = np.searchsorted(med[ordem], np.arange(len(medicos) + 1))
+        dur_ordem = dur[ordem]
+        for i in range(len(medicos)):
+            tempos = dur_ordem[limites[i]:limites[i + 1]]
+            medicos.tempos_consulta[i] = tempos; medicos.num_atendidos[i] = tempos.size
+            medicos.tempo_ocupado[i] = float(np.cumsum(tempos)[-1]) if tempos.size else 0.0
 
+        if perfil is not None: perfil.marcar("estatisticas")
         calcular_estatisticas(self) 
         
         return {
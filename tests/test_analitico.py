@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from analitico import estimar_estatisticas, estimativa_aplicavel, quantil_servico
+from simulacao import ArmazemPacientes, SimulacaoClinica, calcular_estatisticas
+
+N_PACIENTES = 150_000
+
+
+@pytest.fixture(scope="module")
+def pacientes():
+    # Todos com a mesma triagem (clinica_geral): uma só fila partilhada por todos os médicos
+    return ArmazemPacientes.de_registos([(0, {"nome": "A", "descrição": "gripe"})]).selecionar(np.zeros(N_PACIENTES, dtype=int))
+
+
+@pytest.mark.parametrize("distribuicao, tolerancia", [("exponential", 0.10), ("uniform", 0.15)])
+def test_estimativa_concorda_com_simulacao_longa(pacientes, distribuicao, tolerancia):
+    # ρ ≈ 0.83, ~145k pacientes: M/M/c exata (Erlang-C) e M/G/c por Allen–Cunneen
+    params = dict(lambda_rate=30, num_doctors=3, mean_service_time=5, service_distribution=distribuicao,
+                  simulation_time=2 * N_PACIENTES - 10_000)
+    sim = SimulacaoClinica(pacientes=pacientes, seed=1, stats_mode="online", record_events=False, **params)
+    sim.run()
+    simulado = calcular_estatisticas(sim); estimado = estimar_estatisticas(**params)
+
+    assert estimado["aplicavel"]
+    for chave in ("tempo_medio_espera", "tempo_p95_espera", "fila_media"):
+        assert simulado[chave] == pytest.approx(estimado[chave], rel=tolerancia), chave
+    assert simulado["ocupacao_media_medicos"] == pytest.approx(estimado["ocupacao_media_medicos"], rel=0.02)
+
+
+def test_estimativa_aplicavel_so_com_uma_fila_partilhada():
+    assert estimativa_aplicavel(num_doctors=3)
+    assert estimativa_aplicavel(num_doctors=2, doctor_specialties={"0": "clinica_geral", "1": "clinica_geral"})
+    assert not estimativa_aplicavel(num_doctors=3, arrival_pattern="nonhomogeneous")
+    assert not estimativa_aplicavel(num_doctors=2, doctor_specialties={"0": "cardiologia"})
+    # Só cardiologistas: M/G/c apenas se toda a procura for de cardiologia
+    cardio = {"0": "cardiologia", "1": "cardiologia"}
+    assert not estimativa_aplicavel(num_doctors=2, doctor_specialties=cardio)
+    assert not estimativa_aplicavel({"cardiologia": 0.7, "ortopedia": 0.3}, num_doctors=2, doctor_specialties=cardio)
+    assert estimativa_aplicavel({"cardiologia": 1.0}, num_doctors=2, doctor_specialties=cardio)
+
+
+def test_quantil_servico_normal():
+    assert quantil_servico(10.0, "normal", 0.5) == pytest.approx(10.0)
+    assert quantil_servico(10.0, "normal", 0.95) == pytest.approx(10.0 * (1 + 0.2 * 1.6449), rel=1e-4)
+    assert quantil_servico(10.0, "normal", 0.99) == pytest.approx(10.0 * (1 + 0.2 * 2.3263), rel=1e-4)
+
+
+def test_estimativa_rejeita_tempo_de_consulta_nulo():
+    with pytest.raises(ValueError):
+        estimar_estatisticas(mean_service_time=0)
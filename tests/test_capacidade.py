@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+import capacidade
+from analitico import min_servidores_sla
+from capacidade import OtimizadorCapacidade
+from simulacao import ArmazemPacientes
+
+# λ = 30/h e consultas de 5 min: 2,5 erlangs. p95 da espera (M/M/c): c=4 -> 6,2 min, c=5 -> 1,9 min
+CONFIG = {"lambda_rate": 30, "mean_service_time": 5, "simulation_time": 20_000}
+SLA = 4.0
+
+
+@pytest.fixture(scope="module")
+def pacientes():
+    # Todos de clinica_geral: uma só especialidade, em que o mínimo de Erlang-C é exato em regime estacionário
+    return ArmazemPacientes.de_registos([(0, {"nome": "A", "descrição": "gripe"})]).selecionar(np.zeros(12_000, dtype=int))
+
+
+@pytest.mark.parametrize("podar_erlang", [False, True])
+def test_otimizador_encontra_o_minimo_de_erlang(pacientes, podar_erlang):
+    otimizador = OtimizadorCapacidade(CONFIG, pacientes, sla=SLA, replicacoes=3, processos=1, podar_erlang=podar_erlang)
+    resultado = otimizador.otimizar()
+    n = min_servidores_sla(30 / 60, 1 / 5, SLA)
+    assert n == 5
+    assert resultado["viavel"] and resultado["alocacao"] == {"clinica_geral": n}
+    assert resultado["p95_espera"] <= SLA
+
+    # Com N-1 médicos o SLA falha (a descida já a avaliou, exceto se a poda a saltou)
+    if podar_erlang: assert otimizador.avaliar([{"clinica_geral": n - 1}]) == [None]
+    menos_um = otimizador.avaliar([{"clinica_geral": n - 1}], podar=False)[0]
+    assert not menos_um["viavel"] and menos_um["p95_espera"] > SLA
+
+
+def test_otimizador_inviavel_dentro_do_limite_de_iteracoes(pacientes, monkeypatch):
+    # Semente com 2 médicos (instável) e uma só iteração de subida: 3 médicos ainda falham o SLA
+    monkeypatch.setattr(capacidade, "semente_erlang", lambda *args, **kwargs: {"clinica_geral": 2})
+    resultado = OtimizadorCapacidade(CONFIG, pacientes, sla=SLA, replicacoes=2, processos=1, max_iteracoes=1).otimizar()
+    assert not resultado["viavel"] and resultado["iteracoes"] == 1
+    assert resultado["alocacao"] == {"clinica_geral": 3} and resultado["p95_espera"] > SLA
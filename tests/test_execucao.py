@@ -0,0 +1,13 @@
+from execucao import ExecutorSimulacoes
+from simulacao import Paciente
+
+
+def test_duas_configuracoes_correm_lado_a_lado():
+    pacientes = [Paciente(id=str(i), nome=f"P{i}", descrição="gripe") for i in range(400)]
+    with ExecutorSimulacoes(pacientes, processos=2) as executor:
+        a = executor.iniciar({"lambda_rate": 30, "num_doctors": 2, "doctor_specialties": {"0": "cardiologia"}}, seed=1)
+        b = executor.iniciar({"lambda_rate": 20, "num_doctors": 4}, seed=1)
+        ra, rb = a.resultado(timeout=120), b.resultado(timeout=120)
+    assert (ra.num_doctors, rb.num_doctors) == (2, 4)
+    assert ra.doctor_specialties == {"0": "cardiologia"} and rb.doctor_specialties == {}
+    assert ra.doentes_atendidos > 0 and rb.doentes_atendidos > 0
@@ -0,0 +1,74 @@
+import random
+import unicodedata
+
+import numpy as np
+import pytest
+
+from pesquisa import IndicePacientes, intervalo_idades
+from simulacao import Paciente
+
+NOMES = ["João Silva", "Joana Sousa", "JOSÉ Antunes", "Maria João", "Ana", "Zé", "Inês Gonçalves",
+         "Conceição", "Anabela Silva", "Bruno Sá"]
+DISTRITOS = ["Lisboa", "Porto", "Faro", "Évora", None]
+
+
+def _sem_acentos(texto):
+    return "".join(c for c in unicodedata.normalize("NFD", texto.lower()) if not unicodedata.combining(c))
+
+
+@pytest.fixture(scope="module")
+def pacientes():
+    rng = random.Random(7)
+    lista = []
+    for i in range(600):
+        distrito = rng.choice(DISTRITOS)
+        lista.append(Paciente(id=f"{rng.choice(['CC', 'bi', 'Cc'])}{rng.randrange(10 ** 6):06d}", nome=rng.choice(NOMES),
+                              idade=rng.choice([None, *range(0, 101)]), sexo=rng.choice(["masculino", "feminino", "outro", None]),
+                              morada={"distrito": distrito} if distrito else {}))
+    return lista
+
+
+def _bruto(pacientes, nome="", id_cc="", sexo="", idades=None, distrito=""):
+    """Varrimento linha a linha sobre a lista de Paciente, com a semântica documentada em pesquisar()."""
+    linhas = []
+    for i, p in enumerate(pacientes):
+        if nome and _sem_acentos(nome.strip()) not in _sem_acentos(p.nome): continue
+        if id_cc and id_cc.strip().lower() not in str(p.id).lower(): continue
+        if sexo and str(p.sexo).lower() != sexo: continue
+        if idades is not None and not (p.idade is not None and idades[0] <= p.idade <= idades[1]): continue
+        if distrito and str(p.morada.get("distrito")).lower() != distrito.lower(): continue
+        linhas.append(i)
+    return linhas
+
+
+CONSULTAS = [
+    {}, {"nome": "jo"}, {"nome": "joão"}, {"nome": "JOAO"}, {"nome": "silva"}, {"nome": " sá"}, {"nome": "xyz"},
+    {"nome": "conceicao"}, {"id_cc": "12"}, {"id_cc": "cc0"}, {"id_cc": "C"}, {"id_cc": "99999"}, {"id_cc": "bi1234"},
+    {"sexo": "feminino"}, {"sexo": "outro"}, {"idades": (30, 30)}, {"idades": (65, 32767)}, {"idades": (0, 12)},
+    {"distrito": "Évora"}, {"distrito": "porto"},
+    {"nome": "ana", "sexo": "feminino", "idades": (18, 64)}, {"nome": "silva", "id_cc": "3", "distrito": "Lisboa"},
+]
+
+
+@pytest.mark.parametrize("consulta", CONSULTAS, ids=repr)
+def test_pesquisa_igual_ao_varrimento_dos_pacientes(pacientes, consulta):
+    indice = IndicePacientes(pacientes)
+    assert indice.pesquisar(**consulta).tolist() == _bruto(pacientes, **consulta)
+
+
+def test_pesquisa_cc_por_substring_e_linha_exata(pacientes):
+    indice = IndicePacientes(pacientes)
+    alvo = pacientes[123].id
+    assert 123 in indice.pesquisar(id_cc=alvo[3:7]).tolist()
+    assert indice.linha(alvo.upper()) == min(i for i, p in enumerate(pacientes) if p.id.lower() == alvo.lower())
+    assert indice.linha("inexistente") is None
+
+
+def test_intervalo_idades():
+    assert intervalo_idades("") is None
+    assert intervalo_idades("30") == (30, 30)
+    assert intervalo_idades(" 30 - 40 ") == (30, 40)
+    assert intervalo_idades("65-") == (65, np.iinfo(np.int16).max)
+    assert intervalo_idades("-12") == (0, 12)
+    with pytest.raises(ValueError):
+        intervalo_idades("trinta")
@@ -0,0 +1,77 @@
+import json
+import math
+import random
+import threading
+import time
+
+import pytest
+
+import replicacoes
+from replicacoes import PoolSimulacoes, Varrimento, agregar_replicacoes, t_critico_95
+from simulacao import Paciente, carregar_pacientes_json
+
+# Quantil 0,975 da t de Student (tabelas)
+T95_TABELA = {1: 12.7062, 2: 4.3027, 5: 2.5706, 10: 2.2281, 30: 2.0423, 31: 2.0395, 40: 2.0211, 60: 2.0003,
+              100: 1.9840, 1000: 1.9623}
+
+
+@pytest.mark.parametrize("gl", sorted(T95_TABELA))
+def test_t_critico_95_igual_a_tabela(gl):
+    assert t_critico_95(gl) == pytest.approx(T95_TABELA[gl], abs=1e-3)
+
+
+def test_t_critico_95_sem_graus_de_liberdade():
+    assert math.isnan(t_critico_95(0))
+
+
+def test_agregar_replicacoes_intervalo_de_confianca():
+    agregado = agregar_replicacoes([{"espera": v, "fila": 2.0} for v in (1.0, 2.0, 3.0, 4.0, 5.0)])
+    espera = agregado["espera"]
+    assert espera["media"] == pytest.approx(3.0)
+    assert espera["desvio_padrao"] == pytest.approx(math.sqrt(2.5))
+    # meia largura = t(4) * s / sqrt(n) = 2.776 * 1.5811 / 2.2361 (t com 3 casas decimais, como na tabela)
+    assert espera["ic95"] == pytest.approx([3.0 - 1.9629, 3.0 + 1.9629], abs=1e-4)
+    assert espera["valores"] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert agregado["fila"]["desvio_padrao"] == 0.0 and agregado["fila"]["ic95"] == [2.0, 2.0]
+
+
+def test_agregar_replicacoes_uma_replicacao_sem_intervalo():
+    agregado = agregar_replicacoes([{"espera": 4.0}])
+    assert agregado["espera"]["media"] == 4.0 and agregado["espera"]["desvio_padrao"] == 0.0
+    assert all(math.isnan(x) for x in agregado["espera"]["ic95"])
+    assert agregar_replicacoes([]) == {}
+
+
+def test_varrimento_sementes_por_ponto():
+    v = Varrimento({}, [], {"num_doctors": [1, 2, 3]}, seed=5)
+    assert [v.semente(i) for i in range(len(v.pontos))] == [5, 6, 7]
+    comuns = Varrimento({}, [], {"num_doctors": [1, 2, 3]}, seed=5, sementes_comuns=True)
+    assert [comuns.semente(i) for i in range(len(comuns.pontos))] == [5, 5, 5]
+    assert Varrimento({}, [], {"num_doctors": [1, 2]}).semente(1) is None
+
+
+def test_pool_abre_a_cache_do_dataset_sem_a_regravar(tmp_path):
+    ficheiro = tmp_path / "pessoas.json"
+    ficheiro.write_text(json.dumps([{"id": str(i), "nome": f"P{i}", "descrição": "gripe"} for i in range(300)]))
+    random.seed(0); vista = carregar_pacientes_json(str(ficheiro), colunar=True, limite=200)
+    params = {"lambda_rate": 30, "simulation_time": 240}
+    with PoolSimulacoes(vista, processos=1) as pool:
+        assert pool._tmp is None
+        remoto = pool.submeter(params, 3).result()
+    replicacoes._iniciar_worker(None, vista)
+    assert remoto == replicacoes._correr_replicacao(params, 3)
+
+
+def test_varrimento_cancelado_termina_sem_esperar_pelos_pontos_a_correr():
+    pacientes = [Paciente(id=str(i), nome=f"P{i}", descrição="gripe") for i in range(50)]
+    primeiro = threading.Event()
+    # Cada ponto demora ~1 s: o cancelamento chega com um ponto a meio e outros em fila
+    v = Varrimento({"lambda_rate": 30, "simulation_time": 2_000_000}, pacientes, {"num_doctors": [3, 4, 5, 6]},
+                   seed=1, processos=1, ao_progresso=lambda *_: primeiro.set()).iniciar()
+    assert primeiro.wait(60)
+    time.sleep(0.05)
+    inicio = time.monotonic(); v.cancelar()
+    assert v.esperar(5 * Varrimento.PERIODO_CANCELAMENTO)
+    assert time.monotonic() - inicio < 5 * Varrimento.PERIODO_CANCELAMENTO
+    assert v.cancelado and v.erro is None
+    assert 1 <= v.concluidos < v.total and len(v.tabela()) == v.concluidos
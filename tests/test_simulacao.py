@@ -0,0 +1,218 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+import simulacao
+from simulacao import (ArmazemPacientes, ColunaOrdenada, ESPECIALIDADES, FALLBACK_ESP, Paciente, PoolMedicos,
+                       EstatisticaOnline, QuantilP2, SimulacaoClinica, carregar_pacientes_json, iterar_registos_json)
+
+GERAL = ESPECIALIDADES.codigo(FALLBACK_ESP)
+
+# Array JSON com null de topo, números que se partem entre blocos, escapes, aninhamento e espaços
+JSON_REGISTOS = """ \n [null, 1.5e3, -2.25E-2, 0, -0, 12345678901234567890, 7,
+  {"nome": "Jo\\u00e3o \\"Zé\\"", "idade": 41, "morada": {"distrito": null}, "desportos": []},
+  "texto, com ] e [", true, false, [1, [2.5, {}]], {}, 3.0E+2 ,9]  \n"""
+
+
+@pytest.fixture
+def ficheiro_json(tmp_path):
+    ficheiro = tmp_path / "registos.json"
+    ficheiro.write_text(JSON_REGISTOS, encoding="utf-8")
+    return ficheiro
+
+
+class SimulacaoControlada(SimulacaoClinica):
+    """SimulacaoClinica com chegadas e durações de consulta dadas (para provocar empates exatos)
+    e que regista cada médico libertado para o pool, com o instante da libertação."""
+
+    def __init__(self, chegadas, duracoes, **kwargs):
+        self.chegadas_dadas = list(chegadas); self.duracoes_dadas = list(duracoes)
+        pacientes = [Paciente(id=str(i), nome=f"P{i}", descrição="gripe") for i in range(len(self.chegadas_dadas))]
+        super().__init__(pacientes=pacientes, stats_mode="exact", **kwargs)
+
+    def reset(self):
+        super().reset()
+        self._amostrador.proximo = iter(self.duracoes_dadas).__next__
+        self.libertados = []
+        libertar = self._pool.libertar
+        def libertar_registado(idx):
+            self.libertados.append(idx); libertar(idx)
+        self._pool.libertar = libertar_registado
+
+    def _gera_chegadas_homogeneo(self):
+        self._carregar_chegadas(np.array(self.chegadas_dadas, dtype=float))
+
+
+def livres(pool: PoolMedicos):
+    return sorted(i for heap in pool._livres for i in heap)
+
+
+def test_saidas_simultaneas_libertam_o_medico_do_evento():
+    # 8 médicos ocupados em t=0 terminam todos em t=5; em t=5 chegam 2 pacientes (antes das saídas)
+    sim = SimulacaoControlada([0.0] * 8 + [5.0, 5.0, 6.0], [5.0] * 8 + [3.0, 3.0, 2.0], num_doctors=8, simulation_time=60)
+    sim.run()
+
+    # Os empates no heap desempatam pela ordem de início: as saídas do médico 0 e 1 atendem a fila,
+    # os restantes voltam ao pool; em t=8 saem 0, 1 e 2 (este atendeu a chegada de t=6)
+    assert sim.libertados == [2, 3, 4, 5, 6, 7, 0, 1, 2]
+    assert [ev["medico"] for ev in sim.eventos] == list(range(8)) + [None, None, 0, 1, 2]
+    assert sim.doentes_atendidos == 11
+    assert sim.tempos_espera == [0.0] * 11
+    assert livres(sim._pool) == list(range(8))
+    # Cada médico libertado aparece uma só vez no pool
+    assert sim._pool.num_livres() == 8
+
+
+def test_chegada_ganha_empate_com_saida():
+    # O único médico termina em t=10, quando chega o segundo paciente: a chegada é tratada primeiro
+    # (vai para a fila) e a saída passa-lhe o médico sem o devolver ao pool
+    sim = SimulacaoControlada([0.0, 10.0], [10.0, 4.0], num_doctors=1, simulation_time=60)
+    sim.run()
+    assert [ev["medico"] for ev in sim.eventos] == [0, None, 0]
+    assert sim.libertados == [0]
+    assert sim.tempos_espera == [0.0, 0.0]
+    assert [ev["minuto_inicio"] for ev in sim.eventos] == [0, 10, 10]
+
+
+def test_pool_medicos_por_especialidade():
+    cardio = ESPECIALIDADES.codigo("cardiologia"); orto = ESPECIALIDADES.codigo("ortopedia")
+    pool = PoolMedicos([cardio, GERAL, cardio, GERAL])
+    assert pool.obter_livre(orto) == 1
+    assert pool.obter_livre(cardio) == 0
+    assert pool.obter_livre(cardio) == 2
+    assert pool.obter_livre(cardio) == 3
+    assert pool.obter_livre(cardio) is None
+    for idx in (3, 0, 2, 1): pool.libertar(idx)
+    assert livres(pool) == [0, 1, 2, 3]
+    assert pool.num_livres(cardio) == 2 and pool.num_livres(GERAL) == 2
+
+
+@pytest.mark.parametrize("stats_mode, record_events, esperado", [
+    ("exact", None, True), ("online", None, False), ("online", True, True), ("exact", False, False)])
+def test_eventos_por_omissao_so_com_estatisticas_exatas(stats_mode, record_events, esperado):
+    pacientes = [Paciente(id=str(i), nome=f"P{i}", descrição="gripe") for i in range(50)]
+    kwargs = {} if record_events is None else {"record_events": record_events}
+    sim = SimulacaoClinica(pacientes=pacientes, seed=1, lambda_rate=60, stats_mode=stats_mode, **kwargs)
+    sim.run()
+    assert bool(sim.eventos) is esperado
+
+
+def test_eventos_desligados_quando_auto_passa_a_online(monkeypatch):
+    monkeypatch.setattr(simulacao, "LIMITE_ESTATISTICAS_EXATAS", 10)
+    pacientes = [Paciente(id=str(i), nome=f"P{i}", descrição="gripe") for i in range(50)]
+    sim = SimulacaoClinica(pacientes=pacientes, seed=1, lambda_rate=60)
+    sim.run()
+    assert not sim.estatisticas_exatas and sim.eventos == []
+
+
+def test_tabelas_de_triagem_pertencem_ao_dataset(tmp_path):
+    a = ArmazemPacientes.de_registos([(0, {"nome": "A", "descrição": "Sinusite aguda X1"})])
+    b = ArmazemPacientes.de_registos([(0, {"nome": "B", "descrição": "Queda Y2", "religiao": "Testemunhas de Jeová"})])
+    assert a.tabelas_triagem.doencas.valores == ["sinusite aguda x1"]
+    assert b.tabelas_triagem.doencas.valores == ["queda y2"]
+    assert ESPECIALIDADES.valor(int(b.triagens[0, 1])) == "ortopedia"
+    assert b.nota_clinica(0) == "Restrição de Transfusão de Sangue"
+
+    b.guardar(str(tmp_path / "b"))
+    aberto = ArmazemPacientes.abrir(str(tmp_path / "b"))
+    assert np.array_equal(aberto.triagens, b.triagens)
+    assert aberto.nota_clinica(0) == b.nota_clinica(0) and aberto.paciente(0).nota_clinica() == b.nota_clinica(0)
+
+
+def test_cache_devolve_vista_sobre_as_colunas_mapeadas(tmp_path):
+    ficheiro = tmp_path / "pessoas.json"
+    ficheiro.write_text(json.dumps([{"id": str(i), "nome": f"P{i}", "idade": i, "descrição": "gripe"} for i in range(50)]))
+    random.seed(0); carregar_pacientes_json(str(ficheiro), colunar=True)  # grava a cache
+    random.seed(0); vista = carregar_pacientes_json(str(ficheiro), colunar=True, limite=10)
+    assert isinstance(vista.nomes, ColunaOrdenada) and vista.diretorio == str(ficheiro) + ".cache"
+    assert len(vista) == 10 and len(np.unique(vista.ordem)) == 10
+    assert [vista.paciente(i).nome for i in range(10)] == [f"P{k}" for k in vista.ordem]
+    assert np.array_equal(np.asarray(vista.idades), vista.ordem)
+    # Vista de uma vista: as linhas compõem-se sobre as mesmas colunas
+    sub = vista[2:5]
+    assert isinstance(sub.ids, ColunaOrdenada) and sub.ids.dados is vista.ids.dados
+    assert list(sub.ids[:]) == [str(k) for k in vista.ordem[2:5]]
+    random.seed(0); outra = carregar_pacientes_json(str(ficheiro), colunar=True, limite=10)
+    assert np.array_equal(outra.ordem, vista.ordem)
+
+
+def test_gravar_registos_em_blocos_igual_ao_armazem_em_memoria(tmp_path):
+    registos = [(i, {"id": f"ID{i}", "nome": "N" * (i + 1), "idade": 20 + i, "descrição": d, "morada": {"distrito": f"D{i % 3}"}})
+                for i, d in enumerate(["gripe", "queda", "asma", "gripe", "diabetes"] * 2)]
+    memoria = ArmazemPacientes.de_registos(registos)
+    assert ArmazemPacientes.gravar_registos(iter(registos), str(tmp_path / "c"), bloco=3) == 10
+    disco = ArmazemPacientes.abrir(str(tmp_path / "c"))
+    assert sorted(p.name for p in (tmp_path / "c").iterdir()) == sorted([f"{c}.npy" for c in ArmazemPacientes.COLUNAS] + ["meta.json"])
+    for col in ArmazemPacientes.COLUNAS:
+        assert np.array_equal(np.asarray(getattr(disco, col)), np.asarray(getattr(memoria, col))), col
+    campos = lambda p: (p.id, p.nome, p.idade, p.morada, p.descrição, p.triagem(), p.nota_clinica())
+    assert [campos(disco.paciente(i)) for i in range(10)] == [campos(memoria.paciente(i)) for i in range(10)]
+
+
+@pytest.mark.parametrize("tamanho_bloco", [1, 2, 3, 4, 5, 6, 7, 1 << 20])
+def test_iterar_registos_json_igual_a_json_load(ficheiro_json, tamanho_bloco):
+    with open(ficheiro_json, encoding="utf-8") as f:
+        esperado = json.load(f)
+    assert list(iterar_registos_json(str(ficheiro_json), tamanho_bloco=tamanho_bloco)) == esperado
+
+
+@pytest.mark.parametrize("texto", ["[1, 2", "[null, {\"a\": 1}", "{\"a\": 1}", "", "[1.5e"])
+@pytest.mark.parametrize("tamanho_bloco", [1, 3, 1 << 20])
+def test_iterar_registos_json_rejeita_arrays_incompletos(tmp_path, texto, tamanho_bloco):
+    ficheiro = tmp_path / "mau.json"
+    ficheiro.write_text(texto, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iterar_registos_json(str(ficheiro), tamanho_bloco=tamanho_bloco))
+
+
+AMOSTRAS = {
+    "exponencial": lambda rng, n: rng.exponential(15.0, n),
+    "uniforme": lambda rng, n: rng.uniform(5.0, 25.0, n),
+    "normal": lambda rng, n: rng.normal(15.0, 4.0, n),
+    "lognormal": lambda rng, n: rng.lognormal(2.0, 0.8, n),
+}
+
+
+@pytest.mark.parametrize("distribuicao", sorted(AMOSTRAS))
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 50_000])
+def test_estatistica_online_igual_a_numpy(distribuicao, n):
+    valores = AMOSTRAS[distribuicao](np.random.default_rng(7), n)
+    est = EstatisticaOnline()
+    for x in valores.tolist(): est.adicionar(x)
+    assert est.n == n and est.minimo == valores.min() and est.maximo == valores.max()
+    assert est.media == pytest.approx(np.mean(valores), rel=1e-12)
+    assert est.variancia == pytest.approx(np.var(valores) if n > 1 else 0.0, rel=1e-9, abs=1e-12)
+    assert est.variancia_amostral == pytest.approx(np.var(valores, ddof=1) if n > 1 else 0.0, rel=1e-9, abs=1e-12)
+
+    # Combinar partes dá o mesmo que acumular tudo (fórmula de Chan)
+    partes = [EstatisticaOnline() for _ in range(3)]
+    for k, x in enumerate(valores.tolist()): partes[k % 3].adicionar(x)
+    total = EstatisticaOnline.combinar(partes)
+    assert total.n == n and total.media == pytest.approx(est.media, rel=1e-12)
+    assert total.variancia == pytest.approx(est.variancia, rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("distribuicao", sorted(AMOSTRAS))
+@pytest.mark.parametrize("p", [0.5, 0.9, 0.95])
+def test_quantil_p2_exato_com_poucos_valores(distribuicao, p):
+    # Abaixo de 5 valores (o mínimo de `exatos`) os marcadores não existem: o quantil é o exato
+    valores = AMOSTRAS[distribuicao](np.random.default_rng(3), 4)
+    q = QuantilP2(p, exatos=0)
+    assert q.valor() == 0.0
+    for n, x in enumerate(valores.tolist(), start=1):
+        q.adicionar(x)
+        assert q.valor() == pytest.approx(np.percentile(valores[:n], 100 * p))
+
+
+@pytest.mark.parametrize("distribuicao", sorted(AMOSTRAS))
+@pytest.mark.parametrize("p", [0.5, 0.9, 0.95])
+@pytest.mark.parametrize("exatos", [5, 256])
+def test_quantil_p2_aproxima_np_percentile(distribuicao, p, exatos):
+    valores = AMOSTRAS[distribuicao](np.random.default_rng(11), 50_000)
+    q = QuantilP2(p, exatos=exatos)
+    for x in valores.tolist(): q.adicionar(x)
+    # Erro relativo à dispersão da amostra (interquartil), para ser comparável entre distribuições
+    iqr = np.subtract(*np.percentile(valores, [75, 25]))
+    assert abs(q.valor() - np.percentile(valores, 100 * p)) < 0.02 * iqr